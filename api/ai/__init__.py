@@ -1,5 +1,5 @@
 # AI Providers module
-from api.ai.base_provider import BaseAIProvider
+from api.ai.base_provider import BaseAIProvider, CancelToken, GenerationCancelled
 from api.ai.ollama_provider import OllamaProvider
 
 def get_ai_provider(provider_name: str = "ollama") -> BaseAIProvider:
@@ -15,4 +15,4 @@ def get_ai_provider(provider_name: str = "ollama") -> BaseAIProvider:
         raise ValueError(f"Неизвестный AI провайдер: {provider_name}")
     return provider_class()
 
-__all__ = ['BaseAIProvider', 'OllamaProvider', 'get_ai_provider']
+__all__ = ['BaseAIProvider', 'CancelToken', 'GenerationCancelled', 'OllamaProvider', 'get_ai_provider']
@@ -4,9 +4,37 @@
 Определяет интерфейс, который должны реализовать все провайдеры.
 """
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 from dataclasses import dataclass
 import re
+import json
+import threading
+
+from api.ai.translation_cache import translation_cache, make_key
+
+
+# Пакетный промпт: инструкция пользователя + список фраз + требование JSON-ответа
+PACKED_PROMPT_TEMPLATE = """{instructions}
+
+Выполни инструкцию выше для КАЖДОЙ фразы из списка ниже. Ответь только JSON-массивом, без пояснений и markdown:
+[{{"id": 1, {fields}}}, ...]
+Фразы:
+{phrases}"""
+
+# Структурированный ответ: JSON по схеме (Ollama "format", OpenRouter "response_format")
+TRANSLATION_SCHEMA = {
+    "type": "object",
+    "properties": {"translation": {"type": "string"}},
+    "required": ["translation"],
+    "additionalProperties": False,
+}
+CONTEXT_SCHEMA = {
+    "type": "object",
+    "properties": {"translation": {"type": "string"}, "context": {"type": "string"}},
+    "required": ["translation", "context"],
+    "additionalProperties": False,
+}
+STRUCTURED_PROMPT_SUFFIX = "\n\nОтветь только JSON-объектом, без markdown: {fields}"
 
 
 @dataclass
@@ -18,12 +46,85 @@ class GenerationResult:
     model_used: str = ""
 
 
+class GenerationCancelled(Exception):
+    """Генерация отменена через CancelToken"""
+    
+    def __init__(self, message: str = "Генерация прервана"):
+        super().__init__(message)
+
+
+class ProviderBusyError(Exception):
+    """
+    Провайдер перегружен или ограничивает частоту запросов (HTTP 429/5xx).
+    Запрос можно повторить после паузы retry_after (секунды, если сервер ее сообщил).
+    """
+    
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def is_busy_status(status_code: int) -> bool:
+    """HTTP-статусы, при которых нужно подождать и повторить запрос"""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+class CancelToken:
+    """
+    Токен отмены запроса генерации.
+    Провайдер регистрирует закрытие HTTP-ответа через on_cancel — cancel() рвет
+    соединение, и сервер (Ollama) прекращает генерацию.
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self):
+        """Отменяет запрос и вызывает зарегистрированные обработчики"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+    
+    def on_cancel(self, callback):
+        """Регистрирует обработчик отмены (вызывается сразу, если уже отменено)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled()
+
+
 class BaseAIProvider(ABC):
     """
     Абстрактный базовый класс для AI провайдеров.
     Наследники: OllamaProvider, OpenRouterProvider, GoogleProvider
     """
     
+    # Время (epoch), раньше которого по данным провайдера не стоит слать запросы (лимит исчерпан)
+    rate_limit_reset: float = 0.0
+    # Провайдер умеет отвечать JSON по схеме (параметр json_schema в generate)
+    supports_structured_output: bool = False
+    # Запрашивать перевод и контекст JSON-объектом вместо разбора текста
+    structured_output: bool = False
+    
     @property
     @abstractmethod
     def name(self) -> str:
@@ -53,7 +154,8 @@ class BaseAIProvider(ABC):
     
     @abstractmethod
     def generate(self, prompt: str, model: str = None, 
-                 timeout: float = 45) -> str:
+                 timeout: float = 45, cancel: CancelToken = None,
+                 json_schema: dict = None) -> str:
         """
         Генерирует ответ на промпт.
         
@@ -61,17 +163,147 @@ class BaseAIProvider(ABC):
             prompt: Текст промпта
             model: Имя модели (если None, используется дефолтная)
             timeout: Таймаут в секундах
+            cancel: Токен отмены (закрывает HTTP-запрос)
+            json_schema: JSON-схема ответа (если supports_structured_output)
             
         Returns:
             Сгенерированный текст
             
         Raises:
+            GenerationCancelled: Если запрос отменен
             Exception: При ошибке генерации
         """
         pass
     
+    def generate_stream(self, prompt: str, model: str = None,
+                        timeout: float = 45, cancel: CancelToken = None,
+                        json_schema: dict = None) -> Iterator[str]:
+        """
+        Генерирует ответ по частям (токенам) по мере готовности.
+        Провайдеры без потоковой генерации отдают весь ответ одним куском.
+        
+        Args:
+            prompt: Текст промпта
+            model: Имя модели (если None, используется дефолтная)
+            timeout: Таймаут ожидания очередной части в секундах
+            cancel: Токен отмены
+            json_schema: JSON-схема ответа (если supports_structured_output)
+            
+        Yields:
+            Очередной фрагмент текста
+        """
+        yield self.generate(prompt, model, timeout, cancel=cancel, json_schema=json_schema)
+    
+    def translate_stream(self, phrase: str, prompt_template: str, model: str = None,
+                         with_context: bool = False, delimiter: str = "КОНТЕКСТ",
+                         cancel: CancelToken = None, use_cache: bool = True) -> Iterator[Tuple[str, str]]:
+        """
+        Потоковый вариант translate / translate_with_context.
+        
+        Yields:
+            Tuple[перевод, контекст] для накопленного на данный момент текста;
+            последний элемент — окончательный результат
+        """
+        key = self._cache_key(phrase, prompt_template, model, delimiter if with_context else "")
+        cached = translation_cache.get(key) if use_cache else None
+        if cached:
+            yield cached
+            return
+        
+        prompt, schema = self._build_prompt(prompt_template, phrase, with_context)
+        text = ""
+        for chunk in self.generate_stream(prompt, model, cancel=cancel, json_schema=schema):
+            text += chunk
+            if schema:
+                yield self._parse_partial_structured(text, with_context)
+                continue
+            visible = self._hold_back_delimiter(text, delimiter) if with_context else text
+            yield self._parse_result(visible, with_context, delimiter)
+        
+        if not text.strip():
+            raise Exception(f"{self.name} вернул пустой ответ")
+        result = self._parse_response(text.strip(), with_context, delimiter, schema)
+        translation_cache.put(key, *result)
+        yield result
+    
+    def _cache_key(self, phrase: str, prompt_template: str, model: str, delimiter: str) -> str:
+        """Ключ кэша переводов для фразы с данным промптом и моделью"""
+        model_name = model or getattr(self, "default_model", None) or getattr(self, "model", "")
+        return make_key(self.name, model_name, prompt_template, delimiter, phrase)
+    
+    def _context_patterns(self, delimiter: str) -> List[str]:
+        """Варианты разделителя контекста (пользовательский + стандартные)"""
+        return list(set([p for p in [delimiter, 'КОНТЕКСТ', 'CONTEXT'] if p]))
+    
+    def _hold_back_delimiter(self, text: str, delimiter: str) -> str:
+        """
+        Отрезает хвост, который может оказаться началом разделителя ("КОНТ..."),
+        чтобы при потоковой генерации он не мелькал в поле перевода.
+        """
+        stripped = text.rstrip("*_ \t")
+        upper = stripped.upper()
+        for pattern in self._context_patterns(delimiter):
+            for k in range(len(pattern) - 1, 0, -1):
+                if upper.endswith(pattern[:k].upper()):
+                    start = len(stripped) - k
+                    # Совпадение должно начинаться с начала слова
+                    if start == 0 or not stripped[start - 1].isalnum():
+                        return stripped[:start].rstrip("*_ \t")
+                    break
+        return text
+    
+    def _parse_result(self, text: str, with_context: bool, delimiter: str) -> Tuple[str, str]:
+        """Разбирает ответ AI на (перевод, контекст) так же, как translate*"""
+        if not with_context:
+            return self._clean_markdown(text), ""
+        translation, context = self._extract_translation_and_context(text, delimiter)
+        return self._clean_markdown(translation), self._clean_markdown(context)
+    
+    def _build_prompt(self, prompt_template: str, phrase: str, with_context: bool) -> Tuple[str, Optional[dict]]:
+        """
+        Промпт для фразы и JSON-схема ответа.
+        Схема None — структурированный режим выключен или не поддерживается провайдером.
+        """
+        prompt = prompt_template.format(phrase=phrase)
+        if not (self.structured_output and self.supports_structured_output):
+            return prompt, None
+        fields = '{"translation": "..."' + (', "context": "..."}' if with_context else "}")
+        return prompt + STRUCTURED_PROMPT_SUFFIX.format(fields=fields), (
+            CONTEXT_SCHEMA if with_context else TRANSLATION_SCHEMA
+        )
+    
+    def _parse_response(self, text: str, with_context: bool, delimiter: str,
+                        schema: dict = None) -> Tuple[str, str]:
+        """Ответ по схеме разбирается одним json.loads; если модель схему нарушила — как текст"""
+        if schema:
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and str(data.get("translation") or "").strip():
+                context = str(data.get("context") or "").strip() if with_context else ""
+                return str(data["translation"]).strip(), context
+        return self._parse_result(text, with_context, delimiter)
+    
+    @staticmethod
+    def _parse_partial_structured(text: str, with_context: bool) -> Tuple[str, str]:
+        """Поля из недописанного JSON при потоковой генерации: {"translation": "Guten T..."""
+        values = []
+        for name in ("translation", "context") if with_context else ("translation",):
+            match = re.search(r'"' + name + r'"\s*:\s*"((?:[^"\\]|\\.)*)', text)
+            value = match.group(1) if match else ""
+            # Обрываем незаконченную escape-последовательность в конце
+            value = re.sub(r'\\(u[0-9a-fA-F]{0,3})?$', '', value)
+            try:
+                value = json.loads(f'"{value}"')
+            except ValueError:
+                pass
+            values.append(value)
+        return values[0], values[1] if with_context else ""
+    
     def translate(self, phrase: str, translate_prompt: str, 
-                  model: str = None) -> Tuple[str, str]:
+                  model: str = None, cancel: CancelToken = None,
+                  use_cache: bool = True) -> Tuple[str, str]:
         """
         Переводит фразу (только перевод, без контекста).
         
@@ -79,16 +311,26 @@ class BaseAIProvider(ABC):
             phrase: Фраза для перевода
             translate_prompt: Шаблон промпта с {phrase}
             model: Имя модели
+            cancel: Токен отмены
+            use_cache: False — не брать ответ из кэша (принудительная перегенерация)
             
         Returns:
             Tuple[перевод, пустой контекст]
         """
-        prompt = translate_prompt.format(phrase=phrase)
-        result = self.generate(prompt, model)
-        return self._clean_markdown(result), ""
+        key = self._cache_key(phrase, translate_prompt, model, "")
+        cached = translation_cache.get(key) if use_cache else None
+        if cached:
+            return cached
+        
+        prompt, schema = self._build_prompt(translate_prompt, phrase, with_context=False)
+        result = self.generate(prompt, model, cancel=cancel, json_schema=schema)
+        translation, _ = self._parse_response(result, False, "", schema)
+        translation_cache.put(key, translation, "")
+        return translation, ""
     
     def translate_with_context(self, phrase: str, context_prompt: str,
-                               model: str = None, delimiter: str = "КОНТЕКСТ") -> Tuple[str, str]:
+                               model: str = None, delimiter: str = "КОНТЕКСТ",
+                               cancel: CancelToken = None, use_cache: bool = True) -> Tuple[str, str]:
         """
         Переводит фразу с контекстом.
         
@@ -97,25 +339,112 @@ class BaseAIProvider(ABC):
             context_prompt: Шаблон промпта с {phrase}
             model: Имя модели
             delimiter: Разделитель между переводом и контекстом
+            cancel: Токен отмены
+            use_cache: False — не брать ответ из кэша (принудительная перегенерация)
             
         Returns:
             Tuple[перевод, контекст]
         """
-        prompt = context_prompt.format(phrase=phrase)
-        result = self.generate(prompt, model)
+        key = self._cache_key(phrase, context_prompt, model, delimiter)
+        cached = translation_cache.get(key) if use_cache else None
+        if cached:
+            return cached
+        
+        prompt, schema = self._build_prompt(context_prompt, phrase, with_context=True)
+        result = self.generate(prompt, model, cancel=cancel, json_schema=schema)
         
         # Парсим результат
-        translation, context = self._extract_translation_and_context(result, delimiter)
-        return self._clean_markdown(translation), self._clean_markdown(context)
+        result = self._parse_response(result, True, delimiter, schema)
+        translation_cache.put(key, *result)
+        return result
+    
+    def translate_batch(self, phrases: List[str], prompt_template: str, model: str = None,
+                        with_context: bool = False, delimiter: str = "КОНТЕКСТ",
+                        use_cache: bool = True) -> List[Optional[Tuple[str, str]]]:
+        """
+        Переводит несколько фраз одним запросом (пакетный промпт с JSON-ответом).
+        
+        Args:
+            phrases: Фразы для перевода
+            prompt_template: Шаблон промпта для одной фразы с {phrase}
+            model: Имя модели
+            with_context: Требовать контекст для каждой фразы
+            delimiter: Разделитель контекста (для ключа кэша)
+            
+        Returns:
+            Список в порядке фраз: (перевод, контекст) или None, если ответ для фразы
+            не удалось разобрать — такие фразы нужно перевести по одной
+        """
+        delimiter = delimiter if with_context else ""
+        keys = [self._cache_key(p, prompt_template, model, delimiter) for p in phrases]
+        results: List[Optional[Tuple[str, str]]] = [
+            translation_cache.get(key) if use_cache else None for key in keys
+        ]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if not missing:
+            return results
+        if len(missing) == 1:
+            # Одна фраза — обычный промпт надежнее пакетного
+            i = missing[0]
+            translate = self.translate_with_context if with_context else self.translate
+            kwargs = {"delimiter": delimiter} if with_context else {}
+            results[i] = translate(phrases[i], prompt_template, model, use_cache=False, **kwargs)
+            return results
+        
+        fields = '"translation": "..."' + (', "context": "..."' if with_context else "")
+        prompt = PACKED_PROMPT_TEMPLATE.format(
+            instructions=prompt_template.format(phrase="(см. список фраз ниже)"),
+            fields=fields,
+            phrases="\n".join(f"{n}. {phrases[i]}" for n, i in enumerate(missing, 1))
+        )
+        response = self.generate(prompt, model, timeout=45 + 10 * len(missing))
+        parsed = self._parse_packed_response(response, with_context)
+        
+        for n, i in enumerate(missing, 1):
+            if n in parsed:
+                results[i] = parsed[n]
+                translation_cache.put(keys[i], *parsed[n])
+        return results
+    
+    def _parse_packed_response(self, text: str, with_context: bool) -> Dict[int, Tuple[str, str]]:
+        """
+        Разбирает ответ на пакетный промпт: JSON-массив объектов с id,
+        а если JSON не получился — нумерованный список "N. перевод" (только без контекста).
+        """
+        parsed = {}
+        start, end = text.find("["), text.rfind("]")
+        if start != -1 and end > start:
+            try:
+                items = json.loads(text[start:end + 1])
+            except ValueError:
+                items = []
+            for item in items if isinstance(items, list) else []:
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    number = int(item.get("id"))
+                except (TypeError, ValueError):
+                    continue
+                translation = self._clean_markdown(str(item.get("translation") or ""))
+                context = self._clean_markdown(str(item.get("context") or ""))
+                if translation and (context or not with_context):
+                    parsed[number] = (translation, context)
+            if parsed:
+                return parsed
+        
+        if not with_context:
+            for match in re.finditer(r'^\s*(\d+)[.)]\s+(.+)$', text, flags=re.MULTILINE):
+                translation = self._clean_markdown(match.group(2))
+                if translation:
+                    parsed[int(match.group(1))] = (translation, "")
+        return parsed
     
     def _extract_translation_and_context(self, text: str, delimiter: str = "КОНТЕКСТ") -> Tuple[str, str]:
         """Извлекает перевод и контекст из ответа AI"""
         
         # Формируем паттерн для разделителя контекста
-        # Добавляем стандартные варианты для надежности + пользовательский delimiter
-        context_patterns = [delimiter, 'КОНТЕКСТ', 'CONTEXT']
-        # Убираем дубликаты и пустые строки, экранируем для regex
-        unique_patterns = list(set([p for p in context_patterns if p]))
+        # Стандартные варианты для надежности + пользовательский delimiter, экранируем для regex
+        unique_patterns = self._context_patterns(delimiter)
         escaped_patterns = [re.escape(p) for p in unique_patterns]
         
         context_regex = r'[*_]*(' + '|'.join(escaped_patterns) + r')[:*_]*'
@@ -3,10 +3,16 @@
 Ollama AI провайдер.
 Локальный AI через Ollama API.
 """
+import json
+import time
+import threading
 import requests
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 
-from api.ai.base_provider import BaseAIProvider
+from core.logger import debug_log
+from api.ai.base_provider import BaseAIProvider, CancelToken, GenerationCancelled, ProviderBusyError, is_busy_status
+
+TAGS_CACHE_TTL = 5.0  # Сек: повторные проверки /api/tags подряд отвечаются из кэша
 
 
 class OllamaProvider(BaseAIProvider):
@@ -14,10 +20,20 @@ class OllamaProvider(BaseAIProvider):
     
     DEFAULT_MODEL = "gemma3:1b"
     API_URL = "http://localhost:11434"
+    supports_structured_output = True  # "format": JSON-схема (Ollama 0.5+)
     
     def __init__(self, api_url: str = None):
         self.api_url = api_url or self.API_URL
         self.default_model = self.DEFAULT_MODEL
+        # Keep-alive соединения: генерация не тратит время на установку TCP-соединения
+        self.session = requests.Session()
+        self._tags_cache = (0.0, None)  # (время, модели из /api/tags или None — еще не запрашивались)
+        self._tags_lock = threading.Lock()
+        # Сколько Ollama держит модель в памяти после запроса ("30m"); None — значение сервера
+        self.keep_alive = None
+        self.last_used = 0.0  # Время последнего успешного обращения к модели
+        self._warming = set()  # Модели, которые сейчас загружаются в фоне
+        self._warm_lock = threading.Lock()
     
     @property
     def name(self) -> str:
@@ -29,11 +45,7 @@ class OllamaProvider(BaseAIProvider):
     
     def is_available(self) -> bool:
         """Проверяет доступность Ollama"""
-        try:
-            response = requests.get(f"{self.api_url}/api/tags", timeout=2.0)
-            return response.status_code == 200
-        except Exception:
-            return False
+        return self._fetch_tags() is not None
     
     def get_models(self) -> List[str]:
         """
@@ -42,19 +54,33 @@ class OllamaProvider(BaseAIProvider):
         Returns:
             Отсортированный список имен моделей или пустой список
         """
+        models = self._fetch_tags()
+        return sorted([model["name"] for model in models]) if models else []
+    
+    def _fetch_tags(self) -> Optional[List[dict]]:
+        """
+        Модели из /api/tags; None — Ollama недоступен.
+        Успешный ответ кэшируется на TAGS_CACHE_TTL секунд; недоступность не кэшируется,
+        чтобы запущенный Ollama был виден сразу.
+        """
+        with self._tags_lock:
+            cached_at, models = self._tags_cache
+            if models is not None and time.time() - cached_at < TAGS_CACHE_TTL:
+                return models
         try:
-            response = requests.get(f"{self.api_url}/api/tags", timeout=2.0)
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                return sorted([model["name"] for model in models]) if models else []
-            return []
-        except requests.exceptions.ConnectionError:
-            return []
+            response = self.session.get(f"{self.api_url}/api/tags", timeout=2.0)
+            if response.status_code != 200:
+                return None
+            models = response.json().get("models", [])
         except Exception:
-            return []
+            return None
+        with self._tags_lock:
+            self._tags_cache = (time.time(), models)
+        return models
     
     def generate(self, prompt: str, model: str = None, 
-                 timeout: float = 45) -> str:
+                 timeout: float = 45, cancel: CancelToken = None,
+                 json_schema: dict = None) -> str:
         """
         Генерирует ответ через Ollama.
         
@@ -62,29 +88,32 @@ class OllamaProvider(BaseAIProvider):
             prompt: Текст промпта
             model: Имя модели (если None, используется default)
             timeout: Таймаут в секундах
+            cancel: Токен отмены. С ним запрос идет потоком, чтобы отмена
+                закрыла соединение и остановила генерацию в Ollama
+            json_schema: Схема JSON-ответа (параметр format)
             
         Returns:
             Сгенерированный текст
         """
-        model_to_use = model or self.default_model
+        if cancel is not None:
+            result = "".join(self.generate_stream(prompt, model, timeout, cancel, json_schema)).strip()
+            if not result:
+                raise Exception("Ollama вернул пустой ответ")
+            return result
         
-        payload = {
-            "model": model_to_use,
-            "prompt": prompt,
-            "stream": False
-        }
+        payload = self._payload(model, prompt, stream=False, json_schema=json_schema)
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_url}/api/generate",
                 json=payload,
                 timeout=timeout
             )
             
             if response.status_code != 200:
-                error = response.json().get('error', response.text)
-                raise Exception(f"Ollama Error: {error}")
+                self._raise_response_error(response)
             
+            self.last_used = time.time()
             result = response.json().get("response", "").strip()
             if not result:
                 raise Exception("Ollama вернул пустой ответ")
@@ -99,6 +128,142 @@ class OllamaProvider(BaseAIProvider):
             if "canceled" in str(e).lower():
                 raise Exception("Генерация прервана")
             raise
+    
+    def generate_stream(self, prompt: str, model: str = None,
+                        timeout: float = 45, cancel: CancelToken = None,
+                        json_schema: dict = None) -> Iterator[str]:
+        """
+        Генерирует ответ через Ollama потоком NDJSON ("stream": True).
+        Закрытие генератора (break/close) или cancel.cancel() прерывает запрос —
+        Ollama останавливает генерацию.
+        
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        payload = self._payload(model, prompt, stream=True, json_schema=json_schema)
+        
+        try:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            with self.session.post(
+                f"{self.api_url}/api/generate",
+                json=payload,
+                timeout=timeout,
+                stream=True
+            ) as response:
+                if cancel is not None:
+                    cancel.on_cancel(response.close)
+                if response.status_code != 200:
+                    self._raise_response_error(response)
+                
+                for line in response.iter_lines():
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise Exception(f"Ollama Error: {data['error']}")
+                    chunk = data.get("response", "")
+                    if chunk:
+                        yield chunk
+                    if data.get("done"):
+                        self.last_used = time.time()
+                        break
+            
+        except Exception as e:
+            # Закрытое из другого потока соединение дает разные ошибки чтения
+            if cancel is not None and cancel.cancelled:
+                raise GenerationCancelled() from None
+            if isinstance(e, requests.exceptions.Timeout):
+                raise Exception(f"Ollama: превышено время ожидания ({timeout}с)")
+            if isinstance(e, requests.exceptions.ConnectionError):
+                raise Exception("OLLAMA_CONNECT_ERROR")
+            raise
+    
+    def embed(self, texts: List[str], model: str, timeout: float = 60) -> List[List[float]]:
+        """
+        Эмбеддинги текстов одним запросом /api/embed.
+        
+        Returns:
+            Векторы в порядке texts
+        """
+        payload = {"model": model, "input": texts}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            response = self.session.post(f"{self.api_url}/api/embed", json=payload, timeout=timeout)
+        except requests.exceptions.Timeout:
+            raise Exception(f"Ollama: превышено время ожидания ({timeout}с)")
+        except requests.exceptions.ConnectionError:
+            raise Exception("OLLAMA_CONNECT_ERROR")
+        if response.status_code != 200:
+            self._raise_response_error(response)
+        embeddings = response.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise Exception(f"Ollama вернул {len(embeddings)} эмбеддингов вместо {len(texts)}")
+        return embeddings
+    
+    def _payload(self, model: str, prompt: str, stream: bool, json_schema: dict = None) -> dict:
+        """Тело запроса /api/generate (с keep_alive и схемой ответа, если заданы)"""
+        payload = {
+            "model": model or self.default_model,
+            "prompt": prompt,
+            "stream": stream
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if json_schema:
+            payload["format"] = json_schema
+        return payload
+    
+    def warm_up(self, model: str = None, timeout: float = 120) -> bool:
+        """
+        Загружает модель в память Ollama запросом с пустым промптом
+        и продлевает ее keep_alive. Возвращает True при успехе.
+        """
+        try:
+            response = self.session.post(
+                f"{self.api_url}/api/generate",
+                json=self._payload(model, "", stream=False),
+                timeout=timeout
+            )
+        except Exception:
+            return False
+        if response.status_code != 200:
+            return False
+        self.last_used = time.time()
+        return True
+    
+    def warm_up_async(self, model: str = None):
+        """warm_up в фоновом потоке; повторный вызов для той же модели во время загрузки игнорируется"""
+        model = model or self.default_model
+        with self._warm_lock:
+            if model in self._warming:
+                return
+            self._warming.add(model)
+        
+        def run():
+            started = time.time()
+            try:
+                if self.warm_up(model):
+                    debug_log(f"🔥 Модель {model} в памяти ({time.time() - started:.1f} сек)", prefix="[OLLAMA]")
+            finally:
+                with self._warm_lock:
+                    self._warming.discard(model)
+        
+        threading.Thread(target=run, name="ollama-warm-up", daemon=True).start()
+    
+    @staticmethod
+    def _raise_response_error(response):
+        """Ошибка Ollama по ответу; 429/503 (очередь OLLAMA_MAX_QUEUE заполнена) — ProviderBusyError"""
+        try:
+            error = response.json().get('error', response.text)
+        except ValueError:
+            error = response.text
+        if is_busy_status(response.status_code):
+            raise ProviderBusyError(f"Ollama Error: {error}", status=response.status_code)
+        raise Exception(f"Ollama Error: {error}")
 
 
 # Синглтон для удобства
@@ -5,19 +5,23 @@ OpenRouter AI провайдер.
 """
 import requests
 import json
-from typing import List, Tuple
+import time
+from typing import Iterator, List, Tuple
 
-from api.ai.base_provider import BaseAIProvider
+from api.ai.base_provider import BaseAIProvider, CancelToken, GenerationCancelled, ProviderBusyError, is_busy_status
 
 
 class OpenRouterProvider(BaseAIProvider):
     """Провайдер для OpenRouter (OpenAI-compatible)"""
     
     API_URL = "https://openrouter.ai/api/v1"
+    supports_structured_output = True  # response_format: json_schema
     
-    def __init__(self, api_key: str, model: str = "openai/gpt-4o-mini"):
+    def __init__(self, api_key: str, model: str = "openai/gpt-4o-mini", api_url: str = None):
         self.api_key = api_key
         self.model = model
+        # Можно указать другой OpenAI-совместимый адрес (например, локальный сервер для проверки)
+        self.api_url = (api_url or self.API_URL).rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "HTTP-Referer": "https://github.com/your-repo/anki-german-helper", # Required by OpenRouter
@@ -42,7 +46,7 @@ class OpenRouterProvider(BaseAIProvider):
     def get_models(self) -> List[str]:
         """Возвращает список моделей (требует запрос к API)"""
         try:
-            response = requests.get(f"{self.API_URL}/models", timeout=5)
+            response = requests.get(f"{self.api_url}/models", timeout=5)
             if response.status_code == 200:
                 data = response.json().get("data", [])
                 return sorted([m["id"] for m in data])
@@ -50,12 +54,20 @@ class OpenRouterProvider(BaseAIProvider):
         except Exception:
             return []
     
-    def generate(self, prompt: str, model: str = None, timeout: float = 60) -> str:
+    def generate(self, prompt: str, model: str = None, timeout: float = 60,
+                 cancel: CancelToken = None, json_schema: dict = None) -> str:
         """
         Генерирует ответ через OpenRouter.
+        С токеном отмены запрос идет потоком SSE, чтобы отмена закрыла соединение.
         """
         if not self.api_key:
             raise Exception("API ключ OpenRouter не задан")
+        
+        if cancel is not None:
+            content = "".join(self.generate_stream(prompt, model, timeout, cancel, json_schema)).strip()
+            if not content:
+                raise Exception("OpenRouter вернул пустой ответ")
+            return content
             
         model_to_use = model or self.model
         
@@ -66,24 +78,17 @@ class OpenRouterProvider(BaseAIProvider):
             ],
             "temperature": 0.7
         }
+        self._add_response_format(payload, json_schema)
         
         try:
             # Используем сессию для переиспользования соединения
             response = self.session.post(
-                f"{self.API_URL}/chat/completions",
+                f"{self.api_url}/chat/completions",
                 data=json.dumps(payload),
                 timeout=timeout
             )
             
-            if response.status_code != 200:
-                error_msg = response.text
-                try:
-                    error_json = response.json()
-                    if "error" in error_json:
-                        error_msg = error_json["error"].get("message", error_msg)
-                except Exception:
-                    pass
-                raise Exception(f"OpenRouter Error {response.status_code}: {error_msg}")
+            self._check_response(response)
             
             result = response.json()
             choices = result.get("choices", [])
@@ -97,5 +102,133 @@ class OpenRouterProvider(BaseAIProvider):
             raise Exception(f"OpenRouter: превышено время ожидания ({timeout}с)")
         except requests.exceptions.ConnectionError:
             raise Exception("Ошибка подключения к OpenRouter")
+        except ProviderBusyError:
+            raise
         except Exception as e:
             raise Exception(f"Ошибка генерации OpenRouter: {e}")
+    
+    def generate_stream(self, prompt: str, model: str = None, timeout: float = 60,
+                        cancel: CancelToken = None, json_schema: dict = None) -> Iterator[str]:
+        """
+        Генерирует ответ через OpenRouter потоком SSE ("stream": true).
+        Закрытие генератора или cancel.cancel() закрывает соединение и прекращает генерацию.
+        
+        Yields:
+            Фрагменты ответа (delta.content) по мере генерации
+        """
+        if not self.api_key:
+            raise Exception("API ключ OpenRouter не задан")
+        
+        payload = {
+            "model": model or self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "stream": True
+        }
+        self._add_response_format(payload, json_schema)
+        
+        try:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            with self.session.post(
+                f"{self.api_url}/chat/completions",
+                data=json.dumps(payload),
+                timeout=timeout,
+                stream=True
+            ) as response:
+                if cancel is not None:
+                    cancel.on_cancel(response.close)
+                self._check_response(response)
+                for event in self._iter_sse_data(response):
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    if event.get("error"):
+                        error = event["error"]
+                        raise Exception(error.get("message", error) if isinstance(error, dict) else error)
+                    for choice in event.get("choices", []):
+                        chunk = (choice.get("delta") or {}).get("content")
+                        if chunk:
+                            yield chunk
+        
+        except Exception as e:
+            if cancel is not None and cancel.cancelled:
+                raise GenerationCancelled() from None
+            if isinstance(e, requests.exceptions.Timeout):
+                raise Exception(f"OpenRouter: превышено время ожидания ({timeout}с)")
+            if isinstance(e, requests.exceptions.ConnectionError):
+                raise Exception("Ошибка подключения к OpenRouter")
+            raise
+    
+    @staticmethod
+    def _add_response_format(payload: dict, json_schema: dict = None):
+        """Структурированный ответ: модель обязана вернуть JSON по схеме"""
+        if json_schema:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "translation", "strict": True, "schema": json_schema}
+            }
+    
+    @staticmethod
+    def _iter_sse_data(response) -> Iterator[dict]:
+        """
+        Разбирает поток Server-Sent Events: возвращает JSON из строк "data: ...".
+        Комментарии (": OPENROUTER PROCESSING") пропускаются, "data: [DONE]" завершает поток.
+        """
+        for line in response.iter_lines(decode_unicode=False):
+            if not line:
+                continue
+            line = line.decode("utf-8") if isinstance(line, bytes) else line
+            if line.startswith(":") or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                yield json.loads(data)
+            except ValueError:
+                continue
+    
+    def _check_response(self, response):
+        """
+        Бросает исключение с сообщением OpenRouter, если статус ответа не 200
+        (ProviderBusyError для 429/5xx). Запоминает заголовки лимита частоты.
+        """
+        self._note_rate_limit(response)
+        if response.status_code == 200:
+            return
+        error_msg = response.text
+        try:
+            error_json = response.json()
+            if "error" in error_json:
+                error_msg = error_json["error"].get("message", error_msg)
+        except Exception:
+            pass
+        message = f"OpenRouter Error {response.status_code}: {error_msg}"
+        if is_busy_status(response.status_code):
+            raise ProviderBusyError(message, status=response.status_code,
+                                    retry_after=self._retry_after(response))
+        raise Exception(message)
+    
+    @staticmethod
+    def _retry_after(response):
+        """Пауза из заголовков Retry-After / X-RateLimit-Reset (секунды) или None"""
+        headers = response.headers or {}
+        try:
+            if headers.get("Retry-After"):
+                return max(0.0, float(headers["Retry-After"]))
+            if headers.get("X-RateLimit-Reset"):
+                # OpenRouter отдает время сброса в миллисекундах epoch
+                return max(0.0, float(headers["X-RateLimit-Reset"]) / 1000 - time.time())
+        except ValueError:
+            pass
+        return None
+    
+    def _note_rate_limit(self, response):
+        """Если лимит запросов исчерпан (X-RateLimit-Remaining: 0), запоминает время сброса"""
+        headers = response.headers or {}
+        if headers.get("X-RateLimit-Remaining") == "0":
+            wait = self._retry_after(response)
+            if wait:
+                self.rate_limit_reset = time.time() + wait
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Постоянный кэш переводов AI.
+Ключ — хэш (провайдер, модель, хэш шаблона промпта, разделитель, фраза), значение —
+(перевод, контекст). Повторная фраза возвращается мгновенно, без обращения к модели.
+Хранится в SQLite, старые записи вытесняются по времени последнего использования (LRU).
+"""
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Optional, Tuple
+
+from core.logger import debug_log
+from core.sqlite_store import SQLiteStore
+
+CACHE_DB_NAME = "translation_cache.sqlite3"
+MAX_ENTRIES = 20000  # Максимум записей в кэше
+MAX_BYTES = 20 * 1024 * 1024  # Максимальный суммарный размер переводов
+
+
+def make_key(provider: str, model: str, prompt_template: str, delimiter: str, phrase: str) -> str:
+    """Адрес записи в кэше: любое изменение промпта или модели дает новый ключ"""
+    template_hash = hashlib.sha1((prompt_template or "").encode("utf-8")).hexdigest()
+    raw = json.dumps([provider, model or "", template_hash, delimiter or "", phrase.strip()],
+                     ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache(SQLiteStore):
+    """Кэш переводов в SQLite с LRU-вытеснением по числу записей и размеру"""
+
+    DB_NAME = CACHE_DB_NAME
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS translations (
+            key TEXT PRIMARY KEY,
+            translation TEXT NOT NULL,
+            context TEXT NOT NULL DEFAULT '',
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_translations_last_used ON translations (last_used);
+    """
+
+    def __init__(self, db_path: str = None, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        super().__init__(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = True
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Возвращает (перевод, контекст) или None"""
+        if not self.enabled:
+            return None
+        try:
+            with self._db() as conn:
+                row = conn.execute(
+                    "SELECT translation, context FROM translations WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    conn.execute("UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key))
+                return (row[0], row[1]) if row else None
+        except sqlite3.Error as e:
+            debug_log(f"⚠️ Ошибка чтения кэша переводов: {e}", prefix="[CACHE]")
+            return None
+
+    def put(self, key: str, translation: str, context: str = ""):
+        """Сохраняет перевод и вытесняет самые давно использованные записи сверх лимитов"""
+        if not self.enabled or not translation:
+            return
+        now = time.time()
+        size = len(translation.encode("utf-8")) + len((context or "").encode("utf-8"))
+        try:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, translation, context or "", size, now, now)
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            debug_log(f"⚠️ Ошибка записи кэша переводов: {e}", prefix="[CACHE]")
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute(
+            "DELETE FROM translations WHERE key IN "
+            "(SELECT key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Удаляем старейшие записи, пока суммарный размер не уложится в лимит
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM translations ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM translations WHERE key = ?", stale)
+
+    def clear(self):
+        """Очищает кэш"""
+        with self._db() as conn:
+            conn.execute("DELETE FROM translations")
+
+
+# Глобальный экземпляр кэша
+translation_cache = TranslationCache()
@@ -3,15 +3,84 @@
 Модуль для работы с Anki через AnkiConnect API.
 """
 import os
+import re
+import json
+import time
+import hashlib
 import requests
-import base64
-from typing import List, Optional, Dict, Any, Union
+import threading
+import concurrent.futures
+from typing import Callable, List, Optional, Dict, Any, Union
 from core.logger import debug_log
+from api.phrase_index import PhraseIndex
 
 # Константы
 MODEL_NAME = "YouTube"
 ANKI_CONNECT_URL = "http://localhost:8765"
 DEFAULT_TIMEOUT = 5
+MULTI_CHUNK_SIZE = 100  # Максимум действий в одном запросе multi
+MODEL_STATE_FILE = "anki_model_state.json"  # Отпечатки примененных стилей/шаблонов
+DECK_STATS_TTL = 300  # Секунд, в течение которых количество карточек в колодах считается актуальным
+MAX_CONNECTIONS = 4  # Одновременных фоновых запросов к AnkiConnect (потоки пула и keep-alive соединения)
+
+# Ответы AnkiConnect, после которых кэш схемы модели устарел
+SCHEMA_ERROR_RE = re.compile(
+    r"model was not found|field\b[^.]*\bnot found|no such field|not a field|keyerror", re.IGNORECASE
+)
+
+# Поля, стили и шаблоны типа записи (используются в setup_model)
+MODEL_FIELDS = ["Phrase", "Translation", "Context", "Sound"]
+MODEL_CSS = """
+    .card {
+        font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
+        font-size: 20px;
+        text-align: center;
+    }
+    .phrase {
+        font-size: 32px;
+        font-weight: bold;
+        margin-bottom: 20px;
+        color: #ffffff;
+    }
+    .translation {
+        font-size: 24px;
+        margin-top: 20px;
+    }
+    .context {
+        font-size: 16px;
+        font-style: italic;
+        margin-top: 15px;
+        text-align: left;
+        display: inline-block;
+        max-width: 90%;
+        background-color: #333333;
+        color: #ffffff;
+        padding: 12px;
+        border-radius: 8px;
+        border: 1px solid #444;
+    }
+    .sound { margin-top: 10px; }
+    """
+
+MODEL_TEMPLATES = [
+    {
+        "name": "Card 1",
+        "Front": '<div class="phrase">{{Phrase}}</div><div class="sound">{{Sound}}</div>',
+        "Back": '<div class="phrase">{{Phrase}}</div><hr id="answer"><div class="translation">{{Translation}}</div><div class="context">{{Context}}<div class="watermark" style="font-size: 10px; margin-top: 10px; text-align: right;"><a href="https://LanguageSage.github.io/Anki-card-andder/" style="color: #666; text-decoration: none;">Generated by Lerne Assistant</a></div></div>'
+    }
+]
+
+
+def _model_fingerprint() -> str:
+    """Отпечаток полей, CSS и шаблонов модели, которые поставляет приложение"""
+    data = json.dumps({"fields": MODEL_FIELDS, "css": MODEL_CSS, "templates": MODEL_TEMPLATES},
+                      ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def _normalize_css(css: str) -> str:
+    """Убирает различия в пробелах/отступах при сравнении CSS"""
+    return " ".join(css.split())
 
 
 class AnkiAPI:
@@ -21,6 +90,23 @@ class AnkiAPI:
         self.url = url
         self.model_name = MODEL_NAME
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS)
+        self.session.mount("http://", adapter)
+        # Фоновые вызовы (колоды, дубликаты, добавление) идут через общий пул, а не поток на вызов
+        self._executor = concurrent.futures.ThreadPoolExecutor(MAX_CONNECTIONS, thread_name_prefix="anki")
+        self.phrase_index = PhraseIndex(self)
+        
+        # Кэш схемы моделей: сбрасывается только при изменении модели или ошибке поля
+        self._model_names_cache: Optional[List[str]] = None
+        self._field_names_cache: Dict[str, List[str]] = {}
+        self._audio_field_cache: Optional[str] = None
+        
+        # Кэш колод: имена отдаются сразу, количество карточек обновляется в фоне по TTL
+        self._deck_lock = threading.Lock()
+        self._deck_names_cache: Optional[List[str]] = None
+        self._deck_counts: Dict[str, int] = {}
+        self._deck_stats_time = 0.0
+        self._deck_stats_refreshing = False
     
     def _request(self, action: str, params: Dict = None, timeout: float = DEFAULT_TIMEOUT) -> Any:
         """
@@ -55,6 +141,48 @@ class AnkiAPI:
         except requests.exceptions.Timeout:
             raise Exception("ANKI_TIMEOUT_ERROR")
     
+    def submit(self, fn: Callable, *args, callback: Callable[[concurrent.futures.Future], None] = None,
+               **kwargs) -> concurrent.futures.Future:
+        """
+        Выполняет вызов к Anki в фоновом пуле (соединения сессии переиспользуются).
+        
+        Args:
+            fn: Функция, например anki_api.get_deck_names или add_to_anki_worker
+            callback: Вызывается с future по завершении (в потоке пула —
+                для UI используйте root.after)
+            
+        Returns:
+            concurrent.futures.Future; future.cancel() снимает еще не начатый вызов
+        """
+        future = self._executor.submit(fn, *args, **kwargs)
+        if callback:
+            future.add_done_callback(callback)
+        return future
+    
+    def multi(self, actions: List[Dict], timeout: float = 15) -> List[Any]:
+        """
+        Выполняет несколько действий AnkiConnect одним HTTP-запросом.
+        
+        Args:
+            actions: Список словарей {"action": ..., "params": {...}}
+            timeout: Таймаут в секундах
+            
+        Returns:
+            Список результатов в порядке действий. Если отдельное действие
+            завершилось ошибкой, на его месте стоит экземпляр Exception.
+        """
+        results = []
+        for start in range(0, len(actions), MULTI_CHUNK_SIZE):
+            chunk = [{**a, "version": 6} for a in actions[start:start + MULTI_CHUNK_SIZE]]
+            responses = self._request("multi", {"actions": chunk}, timeout=timeout) or []
+            for resp in responses:
+                # С version=6 каждое действие возвращает {"result": ..., "error": ...}
+                if isinstance(resp, dict) and "error" in resp:
+                    results.append(Exception(resp["error"]) if resp["error"] else resp.get("result"))
+                else:
+                    results.append(resp)
+        return results
+    
     def is_available(self) -> bool:
         """Проверяет доступность AnkiConnect"""
         try:
@@ -65,9 +193,37 @@ class AnkiAPI:
     
     # === Модели ===
     
-    def get_model_names(self) -> List[str]:
-        """Получает список имен моделей"""
-        return self._request("modelNames", timeout=1) or []
+    def invalidate_schema_cache(self):
+        """Сбрасывает кэш имен моделей, полей и поля для аудио"""
+        self._model_names_cache = None
+        self._field_names_cache.clear()
+        self._audio_field_cache = None
+    
+    @staticmethod
+    def _is_schema_error(error: Exception) -> bool:
+        """
+        True, если ошибка Anki указывает на несуществующее поле/модель.
+        Другие ошибки со словом "field" (например, "...it is empty: first field") схему не сбрасывают.
+        """
+        return bool(SCHEMA_ERROR_RE.search(str(error)))
+    
+    def _load_schema(self):
+        """Загружает имена моделей и поля текущей модели одним запросом multi"""
+        model_names, field_names = self.multi([
+            {"action": "modelNames"},
+            {"action": "modelFieldNames", "params": {"modelName": self.model_name}},
+        ], timeout=2)
+        if isinstance(model_names, Exception):
+            raise model_names
+        self._model_names_cache = model_names or []
+        if not isinstance(field_names, Exception) and field_names:
+            self._field_names_cache[self.model_name] = field_names
+    
+    def get_model_names(self, refresh: bool = False) -> List[str]:
+        """Получает список имен моделей (из кэша, если он есть)"""
+        if self._model_names_cache is None or refresh:
+            self._model_names_cache = self._request("modelNames", timeout=1) or []
+        return list(self._model_names_cache)
     
     def model_exists(self, model_name: str = None) -> bool:
         """Проверяет существование модели (регистронезависимо)"""
@@ -75,13 +231,26 @@ class AnkiAPI:
         existing_models = [m.strip().lower() for m in self.get_model_names()]
         return name in existing_models
     
-    def get_model_field_names(self, model_name: str = None) -> List[str]:
-        """Получает список полей модели"""
+    def get_model_id(self, model_name: str = None) -> Optional[int]:
+        """Возвращает ID модели в коллекции (нужен, например, для экспорта .apkg)"""
+        try:
+            models = self._request("findModelsByName", {"modelNames": [model_name or self.model_name]}, timeout=2) or []
+            return models[0].get("id") if models else None
+        except Exception:
+            return None
+    
+    def get_model_field_names(self, model_name: str = None, refresh: bool = False) -> List[str]:
+        """Получает список полей модели (из кэша, если он есть)"""
         name = model_name or self.model_name
+        if name in self._field_names_cache and not refresh:
+            return list(self._field_names_cache[name])
         try:
-            return self._request("modelFieldNames", {"modelName": name}, timeout=1) or []
+            fields = self._request("modelFieldNames", {"modelName": name}, timeout=1) or []
         except Exception:
             return []
+        if fields:
+            self._field_names_cache[name] = fields
+        return list(fields)
 
     def setup_model(self) -> bool:
         """
@@ -91,47 +260,11 @@ class AnkiAPI:
         Returns:
             True если модель создана или уже существует
         """
-        required_fields = ["Phrase", "Translation", "Context", "Sound"]
-        css = """
-        .card {
-            font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
-            font-size: 20px;
-            text-align: center;
-        }
-        .phrase {
-            font-size: 32px;
-            font-weight: bold;
-            margin-bottom: 20px;
-            color: #ffffff;
-        }
-        .translation {
-            font-size: 24px;
-            margin-top: 20px;
-        }
-        .context {
-            font-size: 16px;
-            font-style: italic;
-            margin-top: 15px;
-            text-align: left;
-            display: inline-block;
-            max-width: 90%;
-            background-color: #333333;
-            color: #ffffff;
-            padding: 12px;
-            border-radius: 8px;
-            border: 1px solid #444;
-        }
-        .sound { margin-top: 10px; }
-        """
-        
-        card_templates = [
-            {
-                "name": "Card 1",
-                "Front": '<div class="phrase">{{Phrase}}</div><div class="sound">{{Sound}}</div>',
-                "Back": '<div class="phrase">{{Phrase}}</div><hr id="answer"><div class="translation">{{Translation}}</div><div class="context">{{Context}}<div class="watermark" style="font-size: 10px; margin-top: 10px; text-align: right;"><a href="https://LanguageSage.github.io/Anki-card-andder/" style="color: #666; text-decoration: none;">Generated by Lerne Assistant</a></div></div>'
-            }
-        ]
-
+        try:
+            # modelNames и modelFieldNames одним запросом — дальше читаем из кэша
+            self._load_schema()
+        except Exception:
+            pass
         existing_models = self.get_model_names()
         existing_models_lower = [m.lower().strip() for m in existing_models]
         target_lower = self.model_name.lower().strip()
@@ -140,13 +273,16 @@ class AnkiAPI:
             # Находим оригинальное имя модели (которое в Anki)
             original_index = existing_models_lower.index(target_lower)
             actual_model_name = existing_models[original_index]
+            if self.model_name != actual_model_name:
+                self._audio_field_cache = None
             self.model_name = actual_model_name # Принимаем имя из Anki
             
             # Если модель существует, проверяем поля
             current_fields = self.get_model_field_names(actual_model_name)
-            missing_fields = [f for f in required_fields if f not in current_fields]
+            missing_fields = [f for f in MODEL_FIELDS if f not in current_fields]
             
             if missing_fields:
+                self.invalidate_schema_cache()
                 print(f"⚠️ В модели '{self.model_name}' отсутствуют поля: {missing_fields}. Попытка добавить...")
                 for field in missing_fields:
                     try:
@@ -158,28 +294,8 @@ class AnkiAPI:
                     except Exception as e:
                         print(f"❌ Ошибка добавления поля '{field}': {e}")
             
-            # Также обновляем CSS и шаблоны на всякий случай
-            try:
-                self._request("updateModelStyling", {
-                    "model": {
-                        "name": self.model_name,
-                        "css": css
-                    }
-                })
-                self._request("updateModelTemplates", {
-                    "model": {
-                        "name": self.model_name,
-                        "templates": {
-                            "Card 1": {
-                                "Front": card_templates[0]["Front"],
-                                "Back": card_templates[0]["Back"]
-                            }
-                        }
-                    }
-                })
-                print(f"✅ Стили и шаблоны модели '{self.model_name}' обновлены.")
-            except Exception as e:
-                print(f"⚠️ Не удалось обновить стили/шаблоны: {e}")
+            # Также обновляем CSS и шаблоны, если наша версия еще не применялась
+            self._sync_model_styling()
                 
             return True
         
@@ -188,47 +304,108 @@ class AnkiAPI:
         try:
             self._request("createModel", {
                 "modelName": self.model_name,
-                "inOrderFields": required_fields,
-                "css": css,
-                "cardTemplates": card_templates
+                "inOrderFields": MODEL_FIELDS,
+                "css": MODEL_CSS,
+                "cardTemplates": MODEL_TEMPLATES
             })
+            self.invalidate_schema_cache()
+            self._save_model_fingerprint(_model_fingerprint())
             print(f"✅ Тип записи '{self.model_name}' успешно создан!")
             return True
         except Exception as e:
             print(f"❌ Ошибка создания модели: {e}")
             return False
     
+    def _get_model_state_path(self) -> str:
+        from core.settings_manager import get_data_dir
+        return os.path.join(get_data_dir(), MODEL_STATE_FILE)
+    
+    def _load_model_fingerprint(self) -> Optional[str]:
+        """Отпечаток стилей/шаблонов, который уже применен к модели"""
+        try:
+            with open(self._get_model_state_path(), "r", encoding="utf-8") as f:
+                return json.load(f).get(self.model_name)
+        except Exception:
+            return None
+    
+    def _save_model_fingerprint(self, fingerprint: str):
+        path = self._get_model_state_path()
+        try:
+            state = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            state[self.model_name] = fingerprint
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить состояние модели: {e}")
+    
+    def _sync_model_styling(self):
+        """
+        Отправляет CSS и шаблоны только если они реально отличаются.
+        Каждое обновление модели переписывает ее в Anki и может вызвать полную синхронизацию,
+        поэтому при совпадении локального отпечатка запросы не отправляются вовсе.
+        """
+        fingerprint = _model_fingerprint()
+        if self._load_model_fingerprint() == fingerprint:
+            return
+        
+        try:
+            styling, templates = self.multi([
+                {"action": "modelStyling", "params": {"modelName": self.model_name}},
+                {"action": "modelTemplates", "params": {"modelName": self.model_name}},
+            ])
+            
+            current_css = "" if isinstance(styling, Exception) else (styling or {}).get("css", "")
+            if _normalize_css(current_css) != _normalize_css(MODEL_CSS):
+                self._request("updateModelStyling", {
+                    "model": {
+                        "name": self.model_name,
+                        "css": MODEL_CSS
+                    }
+                })
+                print(f"✅ Стили модели '{self.model_name}' обновлены.")
+            
+            current_templates = {} if isinstance(templates, Exception) else (templates or {})
+            wanted_templates = {t["name"]: {"Front": t["Front"], "Back": t["Back"]} for t in MODEL_TEMPLATES}
+            if any(current_templates.get(name) != tmpl for name, tmpl in wanted_templates.items()):
+                self._request("updateModelTemplates", {
+                    "model": {
+                        "name": self.model_name,
+                        "templates": wanted_templates
+                    }
+                })
+                print(f"✅ Шаблоны модели '{self.model_name}' обновлены.")
+            
+            self._save_model_fingerprint(fingerprint)
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить стили/шаблоны: {e}")
+    
     # === Колоды ===
     
-    def get_deck_names(self, with_counts: bool = True) -> Union[List[str], str]:
+    def get_deck_names(self, with_counts: bool = True, refresh: bool = False,
+                       on_update: Callable[[List[str]], None] = None) -> Union[List[str], str]:
         """
         Получает список колод.
+        Имена берутся из кэша (или одним быстрым deckNames), количество карточек —
+        из кэша статистики. Если статистика старше DECK_STATS_TTL, она обновляется
+        в фоне, а результат передается в on_update.
         
         Args:
             with_counts: Если True, добавляет количество карточек
+            refresh: Перечитать список имен из Anki
+            on_update: Вызывается из фонового потока со свежим списком после обновления статистики
             
         Returns:
             Список колод или "ANKI_CONNECT_ERROR"
         """
         try:
-            deck_names = self._request("deckNames", timeout=0.5) or []
-            
-            if not with_counts:
-                return sorted(deck_names)
-            
-            # Получаем статистику
-            stats = self._request("getDeckStats", {"decks": deck_names}, timeout=1.0) or {}
-            
-            deck_counts = {}
-            for deck_id, stat in stats.items():
-                name = stat.get("name")
-                count = stat.get("total_in_deck", 0)
-                if name:
-                    deck_counts[name] = count
-            
-            # Формируем список "Имя (Количество)"
-            formatted = [f"{name} ({deck_counts.get(name, 0)})" for name in deck_names]
-            return sorted(formatted)
+            deck_names = self._deck_names_cache
+            if deck_names is None or refresh:
+                deck_names = self._request("deckNames", timeout=0.5) or []
+            return self.deck_list(deck_names, with_counts, on_update)
             
         except Exception as e:
             if "ANKI_CONNECT_ERROR" in str(e):
@@ -236,6 +413,88 @@ class AnkiAPI:
             print(f"Ошибка получения колод: {e}")
             return []
     
+    def deck_list(self, deck_names: List[str], with_counts: bool = True,
+                  on_update: Callable[[List[str]], None] = None) -> List[str]:
+        """
+        Запоминает полученные от Anki имена колод и возвращает список для UI.
+        Количество карточек — из кэша; устаревшая статистика обновляется в фоне (on_update).
+        """
+        self._deck_names_cache = list(deck_names)
+        if not with_counts:
+            return sorted(deck_names)
+        if not self._deck_stats_fresh():
+            self.refresh_deck_stats_async(on_update)
+        return self._format_cached_decks()
+    
+    def _deck_stats_fresh(self) -> bool:
+        return bool(self._deck_counts) and time.time() - self._deck_stats_time < DECK_STATS_TTL
+    
+    def _format_cached_decks(self) -> List[str]:
+        """Список "Имя (Количество)" из кэша; колоды без статистики — без суффикса"""
+        with self._deck_lock:
+            return sorted(
+                f"{name} ({self._deck_counts[name]})" if name in self._deck_counts else name
+                for name in self._deck_names_cache or []
+            )
+    
+    def store_deck_stats(self, deck_names: List[str], stats: Dict):
+        """Сохраняет имена колод и ответ getDeckStats в кэш"""
+        with self._deck_lock:
+            self._deck_names_cache = list(deck_names)
+            self._deck_counts = {
+                stat["name"]: stat.get("total_in_deck", 0)
+                for stat in stats.values() if stat.get("name")
+            }
+            self._deck_stats_time = time.time()
+    
+    def refresh_deck_stats(self) -> Union[List[str], str]:
+        """Синхронно перечитывает колоды и статистику, возвращает новый список"""
+        try:
+            deck_names = self._request("deckNames", timeout=0.5) or []
+            stats = self._request("getDeckStats", {"decks": deck_names}, timeout=10) or {}
+            self.store_deck_stats(deck_names, stats)
+            return self._format_cached_decks()
+        except Exception as e:
+            if "ANKI_CONNECT_ERROR" in str(e):
+                return "ANKI_CONNECT_ERROR"
+            print(f"Ошибка получения статистики колод: {e}")
+            return []
+    
+    def refresh_deck_stats_async(self, on_update: Callable[[List[str]], None] = None):
+        """Обновляет статистику колод в фоновом пуле (не более одного обновления одновременно)"""
+        with self._deck_lock:
+            if self._deck_stats_refreshing:
+                return
+            self._deck_stats_refreshing = True
+        
+        def run():
+            try:
+                decks = self.refresh_deck_stats()
+            finally:
+                self._deck_stats_refreshing = False
+            if on_update and isinstance(decks, list) and decks:
+                on_update(decks)
+        
+        self.submit(run)
+    
+    def invalidate_deck_stats(self):
+        """Помечает статистику устаревшей (например, после удаления заметок)"""
+        self._deck_stats_time = 0.0
+    
+    def _remember_deck(self, deck_name: str):
+        """Добавляет только что созданную (пустую) колоду в кэш"""
+        with self._deck_lock:
+            if self._deck_names_cache is not None and deck_name not in self._deck_names_cache:
+                self._deck_names_cache.append(deck_name)
+            self._deck_counts.setdefault(deck_name, 0)
+    
+    def _bump_deck_count(self, deck_name: str, notes: int = 1):
+        """Локально увеличивает количество карточек после добавления заметок"""
+        deck_name = self.clean_deck_name(deck_name)
+        with self._deck_lock:
+            if deck_name in self._deck_counts:
+                self._deck_counts[deck_name] += notes * len(MODEL_TEMPLATES)
+    
     def create_deck(self, deck_name: str) -> bool:
         """Создает новую колоду"""
         if not deck_name or not deck_name.strip():
@@ -243,6 +502,7 @@ class AnkiAPI:
         
         try:
             self._request("createDeck", {"deck": deck_name.strip()}, timeout=8)
+            self._remember_deck(deck_name.strip())
             return True
         except Exception as e:
             print(f"❌ Ошибка создания колоды: {e}")
@@ -266,16 +526,70 @@ class AnkiAPI:
     
     # === Заметки ===
     
+    @staticmethod
+    def phrase_query(phrase: str) -> str:
+        """Запрос findNotes по полю Phrase"""
+        escaped_phrase = phrase.replace('"', '\\"')
+        return f'Phrase:"{escaped_phrase}"'
+    
+    def deck_query(self, deck_name: str) -> str:
+        """Условие поиска по колоде (кавычки и подстановочные символы экранируются)"""
+        escaped = self.clean_deck_name(deck_name)
+        for char in ('\\', '"', '*', '_'):
+            escaped = escaped.replace(char, '\\' + char)
+        return f'deck:"{escaped}"'
+    
+    def find_notes_local(self, phrase: str) -> Optional[List[int]]:
+        """ID заметок с такой же фразой по индексу фраз; None — индекс еще не загружен"""
+        if not self.phrase_index.loaded:
+            return None
+        self.phrase_index.sync_if_stale()
+        return self.phrase_index.find(phrase)
+    
     def find_notes(self, phrase: str) -> List[int]:
-        """Ищет ID заметок с такой же фразой"""
+        """Ищет ID заметок с такой же фразой (локально, если индекс загружен)"""
+        local = self.find_notes_local(phrase)
+        if local is not None:
+            return local
+        
         try:
-            escaped_phrase = phrase.replace('"', '\\"')
-            query = f'Phrase:"{escaped_phrase}"'
-            return self._request("findNotes", {"query": query}, timeout=3) or []
+            return self._request("findNotes", {"query": self.phrase_query(phrase)}, timeout=3) or []
         except Exception as e:
             print(f"⚠️ Ошибка поиска заметок: {e}")
             return []
     
+    def find_notes_bulk(self, phrases: List[str]) -> Dict[str, List[int]]:
+        """
+        Ищет дубликаты сразу для списка фраз (через multi).
+        
+        Returns:
+            Словарь {фраза: [ID заметок]} только для найденных фраз
+        """
+        unique = list(dict.fromkeys(p for p in phrases if p))
+        if not unique:
+            return {}
+        
+        if self.phrase_index.loaded:
+            self.phrase_index.sync_if_stale()
+            found = {phrase: self.phrase_index.find(phrase) for phrase in unique}
+            return {phrase: ids for phrase, ids in found.items() if ids}
+        
+        actions = [{"action": "findNotes", "params": {"query": self.phrase_query(phrase)}} for phrase in unique]
+        
+        try:
+            results = self.multi(actions)
+        except Exception as e:
+            print(f"⚠️ Ошибка пакетного поиска заметок: {e}")
+            return {}
+        
+        found = {}
+        for phrase, ids in zip(unique, results):
+            if isinstance(ids, Exception):
+                print(f"⚠️ Ошибка поиска '{phrase[:30]}': {ids}")
+            elif ids:
+                found[phrase] = ids
+        return found
+    
     def delete_notes(self, note_ids: List[int]) -> bool:
         """Удаляет заметки по их ID"""
         if not note_ids:
@@ -283,26 +597,61 @@ class AnkiAPI:
         
         try:
             self._request("deleteNotes", {"notes": note_ids})
+            self.phrase_index.remove(note_ids)
+            # Колоды удаленных заметок неизвестны — статистика перечитается при следующем запросе
+            self.invalidate_deck_stats()
             return True
         except Exception as e:
             print(f"❌ Ошибка удаления заметок: {e}")
             return False
     
-    def add_note(self, phrase: str, translation: str, context: str, 
-                 deck_name: str, audio_path: str = None, allow_duplicate: bool = False) -> bool:
+    # === Медиа ===
+    
+    @staticmethod
+    def _pick_audio_field(actual_fields: List[str]) -> str:
+        """Выбирает поле для аудио из списка полей модели"""
+        if "Sound" in actual_fields:
+            return "Sound"
+        # Try to find a case-insensitive match or fallback to the first likely field
+        for gf in actual_fields:
+            if gf.lower() == "sound" or gf.lower() == "audio":
+                debug_log(f"🔍 Found matching field: '{gf}'", prefix="[API]")
+                return gf
+        return "Sound"
+    
+    def resolve_audio_field(self) -> str:
+        """Определяет имя поля для аудио в модели (с учетом регистра, кэшируется)"""
+        if self._audio_field_cache:
+            return self._audio_field_cache
+        
+        actual_fields = self.get_model_field_names()
+        debug_log(f"📋 Actual fields in model: {actual_fields}", prefix="[API]")
+        target_field = self._pick_audio_field(actual_fields)
+        
+        # Кэшируем только подтвержденный список полей (иначе повторим попытку позже)
+        if actual_fields:
+            self._audio_field_cache = target_field
+        return target_field
+    
+    @staticmethod
+    def _format_fields(phrase: str, translation: str, context: str) -> Dict[str, str]:
+        """Текстовые поля заметки в HTML-виде Anki"""
+        return {
+            "Phrase": phrase.replace('\n', '<br>'),
+            "Translation": translation.replace('\n', '<br>'),
+            "Context": context.replace('\n', '<br>'),
+        }
+    
+    def build_note(self, phrase: str, translation: str, context: str,
+                   deck_name: str, audio_path: str = None, allow_duplicate: bool = False,
+                   audio_field: str = None) -> Dict:
         """
-        Добавляет заметку в Anki.
+        Формирует объект заметки для addNote/addNotes.
+        Аудио прикладывается к самой заметке ("audio" с путем к файлу): AnkiConnect
+        копирует файл в медиатеку и дописывает [sound:...] в поле в том же запросе.
         
         Args:
-            phrase: Немецкая фраза
-            translation: Перевод
-            context: Контекст
-            deck_name: Имя колоды
-            audio_path: Путь к аудиофайлу (опционально)
-            allow_duplicate: Разрешить добавление дубликатов (по умолчанию False)
-            
-        Returns:
-            True при успехе
+            audio_field: Имя поля для аудио. Если None и есть аудио — определяется запросом к Anki
         """
         clean_name = self.clean_deck_name(deck_name)
         
@@ -313,9 +662,7 @@ class AnkiAPI:
             "deckName": clean_name,
             "modelName": self.model_name,
             "fields": {
-                "Phrase": phrase.replace('\n', '<br>'),
-                "Translation": translation.replace('\n', '<br>'),
-                "Context": context.replace('\n', '<br>'),
+                **self._format_fields(phrase, translation, context),
                 "Sound": ""  # Explicitly include the Sound field
             },
             "options": {
@@ -325,35 +672,140 @@ class AnkiAPI:
         }
         
         if audio_path and os.path.exists(audio_path):
-            try:
-                with open(audio_path, "rb") as f:
-                    audio_data = base64.b64encode(f.read()).decode("utf-8")
-                
-                # Check for correct field name casing
-                actual_fields = self.get_model_field_names()
-                _log(f"📋 Actual fields in model: {actual_fields}")
-                target_field = "Sound"
-                if "Sound" not in actual_fields:
-                    # Try to find a case-insensitive match or fallback to the first likely field
-                    for gf in actual_fields:
-                        if gf.lower() == "sound" or gf.lower() == "audio":
-                            target_field = gf
-                            _log(f"🔍 Found matching field: '{target_field}'")
-                            break
-                
-                _log(f"🔊 Attaching audio to field '{target_field}'. File: {os.path.basename(audio_path)}")
-                
-                note["audio"] = [{
-                    "data": audio_data,
-                    "filename": os.path.basename(audio_path),
-                    "fields": [target_field]
-                }]
-            except Exception as e:
-                _log(f"⚠️ Ошибка кодирования аудио в Base64: {e}")
-        
-        result = self._request("addNote", {"note": note})
-        _log(f"🎯 Anki response: {result}")
+            # Check for correct field name casing
+            target_field = audio_field or self.resolve_audio_field()
+            audio_filename = os.path.basename(audio_path)
+            
+            _log(f"🔊 Attaching audio to field '{target_field}'. File: {audio_filename}")
+            
+            note["audio"] = [{
+                "path": os.path.abspath(audio_path),
+                "filename": audio_filename,
+                "fields": [target_field]
+            }]
+        
+        return note
+    
+    def add_note(self, phrase: str, translation: str, context: str, 
+                 deck_name: str, audio_path: str = None, allow_duplicate: bool = False) -> bool:
+        """
+        Добавляет заметку в Anki.
+        
+        Args:
+            phrase: Немецкая фраза
+            translation: Перевод
+            context: Контекст
+            deck_name: Имя колоды
+            audio_path: Путь к аудиофайлу (опционально)
+            allow_duplicate: Разрешить добавление дубликатов (по умолчанию False)
+            
+        Returns:
+            True при успехе
+        """
+        note = self.build_note(phrase, translation, context, deck_name,
+                               audio_path=audio_path, allow_duplicate=allow_duplicate)
+        try:
+            result = self._request("addNote", {"note": note})
+        except Exception as e:
+            if not self._is_schema_error(e):
+                raise
+            # Схема модели изменилась в Anki — сбрасываем кэш и пробуем еще раз
+            debug_log(f"⚠️ Ошибка поля ({e}), сброс кэша схемы и повтор", prefix="[API]")
+            self.invalidate_schema_cache()
+            note = self.build_note(phrase, translation, context, deck_name,
+                                   audio_path=audio_path, allow_duplicate=allow_duplicate)
+            result = self._request("addNote", {"note": note})
+        debug_log(f"🎯 Anki response: {result}", prefix="[API]")
+        self.phrase_index.add(result, note["fields"]["Phrase"])
+        self._bump_deck_count(note["deckName"])
         return True
+    
+    def update_note(self, note_id: int, phrase: str, translation: str, context: str,
+                    audio_path: str = None, deck_name: str = None) -> bool:
+        """
+        Заменяет содержимое существующей заметки (updateNoteFields).
+        В отличие от удаления и повторного добавления, сохраняет историю повторений
+        и расписание карточки. Аудио прикладывается в том же запросе, как в addNote.
+        
+        Args:
+            note_id: ID заменяемой заметки
+            audio_path: Путь к новому аудиофайлу (если None — старое аудио остается)
+            deck_name: Колода, в которую переносятся карточки заметки (если None — не меняется)
+            
+        Returns:
+            True при успехе
+        """
+        note = {"id": note_id, "fields": self._format_fields(phrase, translation, context)}
+        if audio_path and os.path.exists(audio_path):
+            audio_field = self.resolve_audio_field()
+            note["fields"][audio_field] = ""  # AnkiConnect допишет новый [sound:...]
+            note["audio"] = [{
+                "path": os.path.abspath(audio_path),
+                "filename": os.path.basename(audio_path),
+                "fields": [audio_field]
+            }]
+        
+        actions = [{"action": "updateNoteFields", "params": {"note": note}}]
+        if deck_name:
+            # Карточки заметки вне выбранной колоды ищем в том же запросе
+            actions.append({"action": "findCards", "params": {"query": f"nid:{note_id} -{self.deck_query(deck_name)}"}})
+        
+        try:
+            results = self.multi(actions)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        except Exception as e:
+            if self._is_schema_error(e):
+                self.invalidate_schema_cache()
+            raise
+        debug_log(f"🔄 Заметка {note_id} обновлена на месте", prefix="[API]")
+        self.phrase_index.add(note_id, note["fields"]["Phrase"])
+        
+        moved_cards = results[1] if deck_name else None
+        if moved_cards:
+            clean_name = self.clean_deck_name(deck_name)
+            self._request("changeDeck", {"cards": moved_cards, "deck": clean_name})
+            self.invalidate_deck_stats()
+            debug_log(f"📂 Карточки заметки {note_id} перенесены в колоду {clean_name}", prefix="[API]")
+        return True
+    
+    def add_notes(self, notes: List[Dict]) -> List[Union[int, Exception]]:
+        """
+        Добавляет пачку заметок одним запросом addNotes.
+        
+        Args:
+            notes: Заметки, подготовленные через build_note
+            
+        Returns:
+            Список в порядке заметок: ID новой заметки или Exception с причиной отказа
+        """
+        if not notes:
+            return []
+        
+        results = None
+        try:
+            ids = self._request("addNotes", {"notes": notes}, timeout=30) or []
+            if len(ids) == len(notes):
+                results = [nid if nid else Exception("cannot create note") for nid in ids]
+        except Exception as e:
+            if "ANKI_CONNECT_ERROR" in str(e) or "ANKI_TIMEOUT_ERROR" in str(e):
+                raise
+            if self._is_schema_error(e):
+                self.invalidate_schema_cache()
+            debug_log(f"⚠️ addNotes отклонен ({e}), повтор по одной через multi", prefix="[API]")
+        
+        # Новые версии AnkiConnect отклоняют весь addNotes при ошибке одной заметки —
+        # повторяем через multi, чтобы получить ID/ошибку по каждой заметке
+        if results is None:
+            results = self.multi([{"action": "addNote", "params": {"note": n}} for n in notes], timeout=30)
+            results = [r if isinstance(r, Exception) or r else Exception("cannot create note") for r in results]
+        
+        for note, result in zip(notes, results):
+            if not isinstance(result, Exception):
+                self.phrase_index.add(result, note["fields"]["Phrase"])
+                self._bump_deck_count(note["deckName"])
+        return results
 
 
 # Глобальный экземпляр API
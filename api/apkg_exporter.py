@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Экспорт заметок напрямую в пакет Anki (.apkg) без AnkiConnect.
+Для больших корпусов фраз: тип записи 'YouTube' (поля, CSS и шаблоны из anki_api),
+заметки и аудио записываются в один файл, который Anki импортирует за одну операцию.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import zipfile
+import hashlib
+import sqlite3
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+from api.anki_api import MODEL_NAME, MODEL_FIELDS, MODEL_CSS, MODEL_TEMPLATES, AnkiAPI
+
+# Схема коллекции Anki 2.1 (legacy collection.anki2, версия 11) — ее импортирует любая версия Anki
+APKG_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+DEFAULT_DECK_CONF = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True,
+    "timer": 0, "replayq": True, "dyn": False,
+    "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "separate": True,
+            "order": 1, "perDay": 20, "bury": True},
+    "rev": {"perDay": 200, "ease4": 1.3, "fuzz": 0.05, "minSpace": 1, "ivlFct": 1,
+            "maxIvl": 36500, "bury": True, "hardFactor": 1.2},
+    "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+}
+
+NOTE_TAGS = ["youtube", "german", "local-ai"]
+
+
+def _stable_id(*parts: str) -> int:
+    """Стабильный положительный ID (мс-подобный) из строк — повторный экспорт дает те же ID"""
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return 1_000_000_000_000 + int(digest[:12], 16) % 1_000_000_000_000
+
+
+def _strip_html(text: str) -> str:
+    return re.sub(r"<[^>]+>", "", text.replace("<br>", " ")).strip()
+
+
+def _field_checksum(text: str) -> int:
+    """csum как в Anki: первые 8 hex-символов sha1 от первого поля без HTML"""
+    return int(hashlib.sha1(_strip_html(text).encode("utf-8")).hexdigest()[:8], 16)
+
+
+@dataclass
+class ApkgNote:
+    """Заметка для экспорта в .apkg"""
+    phrase: str
+    translation: str
+    context: str = ""
+    audio_path: Optional[str] = None
+
+
+class ApkgExporter:
+    """
+    Сборщик .apkg файла для типа записи приложения.
+
+    Пример:
+        exporter = ApkgExporter("Deutsch")
+        exporter.add_note("Guten Tag", "Добрый день", audio_path="...mp3")
+        exporter.write("deutsch.apkg")
+    """
+
+    def __init__(self, deck_name: str, model_name: str = MODEL_NAME,
+                 model_id: int = None, deck_id: int = None):
+        """
+        Args:
+            deck_name: Имя колоды (можно с '::' для вложенных)
+            model_name: Имя типа записи
+            model_id: ID типа записи в коллекции пользователя (AnkiAPI.get_model_id) —
+                тогда Anki при импорте использует существующую модель, а не создает вторую.
+                По умолчанию стабильный ID из имени: экспорт не обращается к AnkiConnect
+            deck_id: ID колоды (по умолчанию стабильный из имени)
+        """
+        self.deck_name = AnkiAPI.clean_deck_name(deck_name)
+        self.model_name = model_name
+        self.model_id = model_id or _stable_id("model", model_name)
+        self.deck_id = deck_id or _stable_id("deck", self.deck_name)
+        self.notes: List[ApkgNote] = []
+
+    def add_note(self, phrase: str, translation: str, context: str = "", audio_path: str = None):
+        """Добавляет заметку в пакет"""
+        self.notes.append(ApkgNote(phrase, translation, context or "", audio_path))
+
+    def _model_json(self, now: int) -> dict:
+        return {
+            "id": self.model_id,
+            "name": self.model_name,
+            "type": 0,
+            "mod": now,
+            "usn": -1,
+            "sortf": 0,
+            "did": self.deck_id,
+            "tmpls": [
+                {"name": t["name"], "ord": i, "qfmt": t["Front"], "afmt": t["Back"],
+                 "did": None, "bqfmt": "", "bafmt": ""}
+                for i, t in enumerate(MODEL_TEMPLATES)
+            ],
+            "flds": [
+                {"name": name, "ord": i, "sticky": False, "rtl": False,
+                 "font": "Arial", "size": 20, "media": []}
+                for i, name in enumerate(MODEL_FIELDS)
+            ],
+            "css": MODEL_CSS,
+            "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n"
+                        "\\usepackage[utf8]{inputenc}\n\\usepackage{amssymb,amsmath}\n"
+                        "\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+            "latexPost": "\\end{document}",
+            "tags": [],
+            "vers": [],
+            # Карточка создается, если заполнено поле Phrase
+            "req": [[i, "any", [0]] for i in range(len(MODEL_TEMPLATES))],
+        }
+
+    def _deck_json(self, deck_id: int, name: str, now: int) -> dict:
+        return {
+            "id": deck_id, "name": name, "mod": now, "usn": -1, "desc": "", "dyn": 0,
+            "conf": 1, "collapsed": False, "extendNew": 10, "extendRev": 50,
+            "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0],
+        }
+
+    def _write_collection(self, db_path: str, media_names: dict):
+        now = int(time.time())
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.executescript(APKG_SCHEMA)
+            conf = {
+                "activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200,
+                "timeLim": 0, "estTimes": True, "dueCounts": True, "curModel": None,
+                "nextPos": len(self.notes) + 1, "sortType": "noteFld", "sortBackwards": False,
+                "addToCur": True,
+            }
+            decks = {
+                "1": self._deck_json(1, "Default", now),
+                str(self.deck_id): self._deck_json(self.deck_id, self.deck_name, now),
+            }
+            conn.execute(
+                "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                (now, now * 1000, now * 1000, json.dumps(conf),
+                 json.dumps({str(self.model_id): self._model_json(now)}),
+                 json.dumps(decks), json.dumps({"1": DEFAULT_DECK_CONF}))
+            )
+
+            tags = " " + " ".join(NOTE_TAGS) + " "
+            for pos, note in enumerate(self.notes):
+                phrase = note.phrase.replace('\n', '<br>')
+                sound = f"[sound:{media_names[note.audio_path]}]" if note.audio_path in media_names else ""
+                fields = {
+                    "Phrase": phrase,
+                    "Translation": note.translation.replace('\n', '<br>'),
+                    "Context": note.context.replace('\n', '<br>'),
+                    "Sound": sound,
+                }
+                note_id = _stable_id("note", self.model_name, phrase)
+                # guid от фразы: повторный импорт обновит заметку, а не создаст дубликат
+                guid = hashlib.sha1(f"{self.model_name}\x1f{phrase}".encode("utf-8")).hexdigest()[:10]
+                conn.execute(
+                    "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, '')",
+                    (note_id, guid, self.model_id, now, tags,
+                     "\x1f".join(fields[name] for name in MODEL_FIELDS),
+                     _strip_html(phrase), _field_checksum(phrase))
+                )
+                for ord_ in range(len(MODEL_TEMPLATES)):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+                        (note_id + ord_, note_id, self.deck_id, ord_, now, pos + 1)
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def write(self, path: str) -> str:
+        """
+        Записывает .apkg файл. Файл заменяется целиком только после успешной записи,
+        прерванная запись не портит предыдущий пакет.
+
+        Returns:
+            Путь к созданному файлу
+        """
+        media_names = {}
+        for note in self.notes:
+            if note.audio_path and os.path.exists(note.audio_path):
+                media_names[note.audio_path] = os.path.basename(note.audio_path)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "collection.anki2")
+            self._write_collection(db_path, media_names)
+
+            tmp_path = os.path.join(tmp_dir, "package.apkg")
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as apkg:
+                apkg.write(db_path, "collection.anki2")
+                media_map = {}
+                for index, (audio_path, name) in enumerate(media_names.items()):
+                    # MP3 уже сжат — храним без повторного сжатия
+                    apkg.write(audio_path, str(index), compress_type=zipfile.ZIP_STORED)
+                    media_map[str(index)] = name
+                apkg.writestr("media", json.dumps(media_map))
+            # shutil.move: временная папка может быть на другом диске
+            shutil.move(tmp_path, path)
+        return path
+
+
+def export_apkg(notes: List[ApkgNote], deck_name: str, path: str, model_id: int = None) -> str:
+    """Экспортирует список ApkgNote в .apkg файл"""
+    exporter = ApkgExporter(deck_name, model_id=model_id)
+    exporter.notes.extend(notes)
+    return exporter.write(path)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Индекс эмбеддингов фраз для поиска почти-дубликатов.
+Точное сравнение Phrase не видит отличий в пунктуации, регистре или разбиении
+строки субтитров. Здесь поле Phrase каждой заметки превращается в вектор
+локальной моделью Ollama (/api/embed); векторы лежат в матрице NumPy,
+поиск — косинусная близость top-k. Индекс подписан на PhraseIndex и
+обновляет только строки добавленных, измененных и удаленных заметок.
+Векторы кэшируются в SQLite, поэтому при запуске пересчитываются только новые фразы.
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.logger import debug_log
+from core.sqlite_store import SQLiteStore
+from api.anki_api import anki_api
+from api.ai.ollama_provider import ollama_provider
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy поиск почти-дубликатов недоступен
+    np = None
+
+EMBEDDINGS_DB_NAME = "embeddings.sqlite3"
+DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+EMBED_BATCH_SIZE = 64  # Фраз в одном запросе /api/embed
+SIMILARITY_THRESHOLD = 0.92  # Косинусная близость, начиная с которой фраза считается почти-дубликатом
+TOP_K = 3
+
+
+class EmbeddingCache(SQLiteStore):
+    """Кэш векторов в SQLite: (модель, нормализованная фраза) -> float32"""
+
+    DB_NAME = EMBEDDINGS_DB_NAME
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, text)
+        );
+    """
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, "np.ndarray"]:
+        """Векторы из кэша для тех фраз, что уже считались"""
+        found = {}
+        try:
+            with self._db() as conn:
+                for start in range(0, len(texts), 500):
+                    chunk = texts[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({','.join('?' * len(chunk))})",
+                        [model, *chunk]
+                    )
+                    for text, blob in rows:
+                        found[text] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            debug_log(f"⚠️ Ошибка чтения кэша эмбеддингов: {e}", prefix="[EMBED]")
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, "np.ndarray"]):
+        try:
+            with self._db() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    [(model, text, vec.astype(np.float32).tobytes()) for text, vec in vectors.items()]
+                )
+        except sqlite3.Error as e:
+            debug_log(f"⚠️ Ошибка записи кэша эмбеддингов: {e}", prefix="[EMBED]")
+
+
+class EmbeddingIndex:
+    """
+    Матрица нормированных векторов фраз коллекции (строка = заметка).
+    Удаление — перестановкой последней строки на место удаленной,
+    добавление — в конец с удвоением емкости, без пересборки всей матрицы.
+    """
+
+    def __init__(self, phrase_index, provider, cache: EmbeddingCache = None):
+        self.phrase_index = phrase_index
+        self.provider = provider
+        self.cache = cache or EmbeddingCache()
+        self.model = DEFAULT_EMBEDDING_MODEL
+        self.enabled = False
+        self.threshold = SIMILARITY_THRESHOLD
+        self._lock = threading.Lock()
+        self._matrix = None  # np.ndarray (емкость, размерность)
+        self._size = 0
+        self._row_note: List[int] = []  # note_id каждой строки
+        self._row_text: List[str] = []  # Нормализованная фраза каждой строки
+        self._row_of: Dict[int, int] = {}  # note_id -> строка
+        self._sync_thread: Optional[threading.Thread] = None
+        self._pending: Dict[int, Optional[str]] = {}  # Изменения для фоновой синхронизации: None — удалена
+        self._full_sync = False  # Сверить матрицу с индексом фраз целиком
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    @property
+    def ready(self) -> bool:
+        """Индекс включен и в нем есть векторы"""
+        return self.enabled and self._size > 0
+
+    def configure(self, enabled: bool, model: str = None):
+        """Включает/выключает индекс; смена модели сбрасывает векторы"""
+        if enabled and not self.available:
+            debug_log("⚠️ NumPy не установлен — поиск почти-дубликатов отключен", prefix="[EMBED]")
+            enabled = False
+        model = model or DEFAULT_EMBEDDING_MODEL
+        with self._lock:
+            if model != self.model:
+                self._reset()
+                self.model = model
+            self.enabled = enabled
+        if enabled:
+            self.phrase_index.add_listener(self._on_index_change)
+            with self._lock:
+                self._full_sync = True
+            self.sync_async()
+        else:
+            self.phrase_index.remove_listener(self._on_index_change)
+
+    def _reset(self):
+        self._matrix = None
+        self._size = 0
+        self._row_note, self._row_text, self._row_of = [], [], {}
+
+    # === Векторы ===
+
+    @staticmethod
+    def _normalized(vectors) -> "np.ndarray":
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _embed_texts(self, texts: List[str]) -> Dict[str, "np.ndarray"]:
+        """Векторы фраз: из кэша, остальные — пачками через Ollama"""
+        vectors = self.cache.get_many(self.model, texts)
+        missing = [t for t in texts if t not in vectors]
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            chunk = missing[start:start + EMBED_BATCH_SIZE]
+            fresh = dict(zip(chunk, self._normalized(self.provider.embed(chunk, self.model))))
+            self.cache.put_many(self.model, fresh)
+            vectors.update(fresh)
+        return vectors
+
+    def _append(self, note_id: int, text: str, vector: "np.ndarray"):
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            self._reset()
+            self._matrix = np.empty((64, vector.shape[0]), dtype=np.float32)
+        elif self._size == self._matrix.shape[0]:
+            grown = np.empty((self._size * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vector
+        self._row_of[note_id] = self._size
+        self._row_note.append(note_id)
+        self._row_text.append(text)
+        self._size += 1
+
+    def _delete(self, note_id: int):
+        row = self._row_of.pop(note_id)
+        last = self._size - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._row_note[row] = self._row_note[last]
+            self._row_text[row] = self._row_text[last]
+            self._row_of[self._row_note[row]] = row
+        self._row_note.pop()
+        self._row_text.pop()
+        self._size = last
+
+    # === Синхронизация с PhraseIndex ===
+
+    def _on_index_change(self, changed: Optional[Dict[int, str]], removed: List[int]):
+        """Подписка на PhraseIndex: копит изменения и запускает фоновую синхронизацию"""
+        with self._lock:
+            if changed is None:
+                self._full_sync = True
+            else:
+                self._pending.update(dict.fromkeys(removed))
+                self._pending.update(changed)
+        self.sync_async()
+
+    def _apply_changes(self, changes: Dict[int, Optional[str]]) -> bool:
+        """
+        Обновляет строки матрицы: changes — {ID заметки: фраза или None (удалена)}.
+        Эмбеддинги считаются только для новых фраз.
+        """
+        started = time.time()
+        model = self.model
+        with self._lock:
+            for note_id, text in changes.items():
+                row = self._row_of.get(note_id)
+                if row is not None and self._row_text[row] != text:
+                    self._delete(note_id)
+            missing = {n: text for n, text in changes.items() if text and n not in self._row_of}
+        if not missing:
+            return True
+        try:
+            vectors = self._embed_texts(sorted(set(missing.values())))
+        except Exception as e:
+            debug_log(f"⚠️ Не удалось получить эмбеддинги ({model}): {e}", prefix="[EMBED]")
+            return False
+        with self._lock:
+            if model != self.model:
+                return False
+            for note_id, text in missing.items():
+                if note_id not in self._row_of and text in vectors:
+                    self._append(note_id, text, vectors[text])
+        debug_log(f"🧭 Индекс эмбеддингов: +{len(missing)}, всего {self._size} за {time.time() - started:.1f}с",
+                  prefix="[EMBED]")
+        return True
+
+    def sync(self) -> bool:
+        """Приводит матрицу к текущему содержимому PhraseIndex целиком (считает только новые фразы)"""
+        if not self.enabled or not self.phrase_index.loaded:
+            return False
+        notes = self.phrase_index.snapshot()
+        with self._lock:
+            changes: Dict[int, Optional[str]] = {n: None for n in self._row_of if n not in notes}
+        changes.update(notes)
+        return self._apply_changes(changes)
+
+    def sync_async(self):
+        """Применяет накопленные изменения в фоне; пришедшие во время работы — следующим проходом"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._sync_thread and self._sync_thread.is_alive():
+                return
+
+            def run():
+                while True:
+                    with self._lock:
+                        full, changes = self._full_sync, self._pending
+                        self._full_sync, self._pending = False, {}
+                        if not full and not changes:
+                            self._sync_thread = None
+                            return
+                    if self.sync() if full else self._apply_changes(changes):
+                        continue
+                    # Ollama недоступна: изменения применятся при следующем изменении индекса
+                    with self._lock:
+                        self._full_sync = self._full_sync or full
+                        self._pending = {**changes, **self._pending}
+                        self._sync_thread = None
+                    return
+
+            self._sync_thread = threading.Thread(target=run, name="embedding-sync", daemon=True)
+            self._sync_thread.start()
+
+    # === Поиск ===
+
+    def find_similar_bulk(self, phrases: List[str], top_k: int = TOP_K,
+                          threshold: float = None) -> Dict[str, List[Tuple[int, str, float]]]:
+        """
+        Почти-дубликаты сразу для списка фраз (один запрос эмбеддингов).
+
+        Returns:
+            {фраза: [(note_id, фраза заметки, близость), ...]} только для фраз с совпадениями,
+            совпадения по убыванию близости
+        """
+        if not self.ready or not phrases:
+            return {}
+        threshold = self.threshold if threshold is None else threshold
+        keys = {phrase: self.phrase_index.normalize(phrase) for phrase in phrases}
+        try:
+            vectors = self._embed_texts(sorted(set(k for k in keys.values() if k)))
+        except Exception as e:
+            debug_log(f"⚠️ Поиск почти-дубликатов недоступен: {e}", prefix="[EMBED]")
+            return {}
+
+        found = {}
+        with self._lock:
+            if not self._size:
+                return {}
+            matrix = self._matrix[:self._size]
+            for phrase, key in keys.items():
+                if key not in vectors or vectors[key].shape[0] != matrix.shape[1]:
+                    continue
+                scores = matrix @ vectors[key]
+                k = min(top_k, self._size)
+                top = np.argpartition(-scores, k - 1)[:k]
+                matches = [(self._row_note[i], self._row_text[i], float(scores[i]))
+                           for i in top[np.argsort(-scores[top])] if scores[i] >= threshold]
+                if matches:
+                    found[phrase] = matches
+        return found
+
+    def find_similar(self, phrase: str, top_k: int = TOP_K,
+                     threshold: float = None) -> List[Tuple[int, str, float]]:
+        """Почти-дубликаты одной фразы: [(note_id, фраза заметки, близость), ...]"""
+        return self.find_similar_bulk([phrase], top_k, threshold).get(phrase, [])
+
+
+# Глобальный индекс эмбеддингов (следует за индексом фраз anki_api)
+embedding_index = EmbeddingIndex(anki_api.phrase_index, ollama_provider)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный индекс фраз для проверки дубликатов без запросов к Anki.
+Загружается один раз через findNotes/notesInfo и затем синхронизируется
+инкрементально по времени изменения заметок.
+"""
+import html
+import math
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Iterable, Optional, Set
+
+from core.logger import debug_log
+
+NOTES_INFO_CHUNK = 500  # Заметок в одном запросе notesInfo
+SYNC_INTERVAL = 60  # Секунд между фоновыми досинхронизациями
+
+
+class PhraseIndex:
+    """Индекс нормализованных значений поля Phrase для модели AnkiAPI"""
+
+    def __init__(self, api):
+        self.api = api
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._by_phrase: Dict[str, Set[int]] = {}
+        self._by_note: Dict[int, str] = {}
+        self._max_mod = 0  # Максимальное время изменения (сек) среди известных заметок
+        self._last_sync = 0.0
+        # Подписчики на изменения: listener(changed, removed), см. _notify
+        self._listeners: List[Callable[[Optional[Dict[int, str]], List[int]], None]] = []
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Приводит фразу к виду для сравнения: без HTML, регистра и лишних пробелов"""
+        if not text:
+            return ""
+        text = re.sub(r'<br\s*/?>', ' ', text, flags=re.IGNORECASE)
+        text = re.sub(r'<[^>]+>', '', text)
+        text = html.unescape(text)
+        return " ".join(text.split()).casefold()
+
+    def add_listener(self, listener: Callable[[Optional[Dict[int, str]], List[int]], None]):
+        """Подписывает на изменения индекса (повторная подписка игнорируется)"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Optional[Dict[int, str]], List[int]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, changed: Optional[Dict[int, str]] = None, removed: Iterable[int] = ()):
+        """
+        Сообщает подписчикам об изменении.
+        changed: {ID заметки: нормализованная фраза} добавленных и измененных заметок;
+        None — индекс перезагружен целиком. removed: ID удаленных заметок.
+        """
+        removed = list(removed)
+        for listener in list(self._listeners):
+            try:
+                listener(changed, removed)
+            except Exception as e:
+                debug_log(f"⚠️ Ошибка обработчика изменения индекса: {e}", prefix="[INDEX]")
+
+    def _model_query(self) -> str:
+        return f'"note:{self.api.model_name}"'
+
+    def _fetch_phrases(self, note_ids: Iterable[int]) -> List[Dict]:
+        """Получает поле Phrase и mod для заметок (пачками)"""
+        note_ids = list(note_ids)
+        infos = []
+        for start in range(0, len(note_ids), NOTES_INFO_CHUNK):
+            chunk = note_ids[start:start + NOTES_INFO_CHUNK]
+            infos.extend(self.api._request("notesInfo", {"notes": chunk}, timeout=30) or [])
+        return infos
+
+    def _apply_infos(self, infos: List[Dict]):
+        for info in infos:
+            note_id = info.get("noteId")
+            if not note_id:
+                continue
+            phrase = info.get("fields", {}).get("Phrase", {}).get("value", "")
+            self._set(note_id, phrase)
+            self._max_mod = max(self._max_mod, info.get("mod", 0))
+
+    def _set(self, note_id: int, phrase: str):
+        self._discard(note_id)
+        key = self.normalize(phrase)
+        if key:
+            self._by_note[note_id] = key
+            self._by_phrase.setdefault(key, set()).add(note_id)
+
+    def _discard(self, note_id: int):
+        key = self._by_note.pop(note_id, None)
+        if key is not None:
+            ids = self._by_phrase.get(key)
+            if ids:
+                ids.discard(note_id)
+                if not ids:
+                    del self._by_phrase[key]
+
+    def load(self) -> bool:
+        """Полная загрузка индекса. Возвращает True при успехе"""
+        with self._sync_lock:
+            try:
+                started = time.time()
+                note_ids = self.api._request("findNotes", {"query": self._model_query()}, timeout=30) or []
+                infos = self._fetch_phrases(note_ids)
+                with self._lock:
+                    self._by_phrase.clear()
+                    self._by_note.clear()
+                    self._max_mod = 0
+                    self._apply_infos(infos)
+                    self._last_sync = started
+                    self.loaded = True
+                debug_log(f"📚 Индекс фраз загружен: {len(note_ids)} заметок за {time.time() - started:.1f}с", prefix="[INDEX]")
+            except Exception as e:
+                debug_log(f"⚠️ Не удалось загрузить индекс фраз: {e}", prefix="[INDEX]")
+                return False
+        self._notify()
+        return True
+
+    def sync(self) -> bool:
+        """
+        Инкрементальная синхронизация: удаленные заметки определяются по списку ID,
+        новые и измененные — по edited:N и полю mod из notesInfo.
+        """
+        if not self.loaded:
+            return self.load()
+
+        with self._sync_lock:
+            try:
+                started = time.time()
+                days = max(1, math.ceil((started - self._last_sync) / 86400))
+                all_ids, edited_ids = self.api.multi([
+                    {"action": "findNotes", "params": {"query": self._model_query()}},
+                    {"action": "findNotes", "params": {"query": f"{self._model_query()} edited:{days}"}},
+                ])
+                for result in (all_ids, edited_ids):
+                    if isinstance(result, Exception):
+                        raise result
+
+                current = set(all_ids or [])
+                with self._lock:
+                    known = set(self._by_note)
+                    removed = known - current
+                    for note_id in removed:
+                        self._discard(note_id)
+
+                candidates = (current - known) | (set(edited_ids or []) & current)
+                infos = self._fetch_phrases(candidates) if candidates else []
+                with self._lock:
+                    # edited:N работает с точностью до дня — отбрасываем уже учтенные изменения
+                    fresh = [i for i in infos
+                             if i.get("noteId") not in known or i.get("mod", 0) >= self._max_mod]
+                    self._apply_infos(fresh)
+                    self._last_sync = started
+                    changed = {}
+                    for info in fresh:
+                        note_id = info.get("noteId")
+                        if note_id in self._by_note:
+                            changed[note_id] = self._by_note[note_id]
+                        elif note_id:
+                            removed.add(note_id)  # Фразу стерли — заметки в индексе больше нет
+            except Exception as e:
+                debug_log(f"⚠️ Ошибка синхронизации индекса фраз: {e}", prefix="[INDEX]")
+                return False
+        if changed or removed:
+            self._notify(changed, removed)
+        return True
+
+    def sync_if_stale(self):
+        """Запускает фоновую досинхронизацию, если индекс давно не обновлялся"""
+        if not self.loaded or time.time() - self._last_sync < SYNC_INTERVAL:
+            return
+        if self._sync_lock.locked():
+            return
+        threading.Thread(target=self.sync, daemon=True).start()
+
+    def find(self, phrase: str) -> List[int]:
+        """Возвращает ID заметок с такой же фразой"""
+        with self._lock:
+            return sorted(self._by_phrase.get(self.normalize(phrase), ()))
+
+    def snapshot(self) -> Dict[int, str]:
+        """Копия {ID заметки: нормализованная фраза}"""
+        with self._lock:
+            return dict(self._by_note)
+
+    def add(self, note_id: int, phrase: str):
+        """Регистрирует только что добавленную заметку"""
+        if not note_id:
+            return
+        with self._lock:
+            self._set(note_id, phrase)
+            key = self._by_note.get(note_id)
+        if key:
+            self._notify({note_id: key})
+        else:
+            self._notify({}, [note_id])
+
+    def remove(self, note_ids: Iterable[int]):
+        """Убирает удаленные заметки из индекса"""
+        note_ids = list(note_ids)
+        with self._lock:
+            for note_id in note_ids:
+                self._discard(note_id)
+        self._notify({}, note_ids)
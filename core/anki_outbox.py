@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь заметок для Anki (outbox).
+Если AnkiConnect недоступен, готовые заметки и их аудио сохраняются на диск
+(SQLite), а фоновый воркер отправляет их пачками, когда Anki снова запущен.
+Так сгенерированный AI перевод и озвучка не теряются.
+Заметку, которую Anki отклоняет, повторяем с растущей паузой, а после
+MAX_ATTEMPTS попыток откладываем (parked) — она остается в БД, но больше не отправляется.
+"""
+import os
+import time
+import uuid
+import sqlite3
+from typing import Dict, List, Tuple
+
+from core.logger import debug_log
+from core.sqlite_store import SQLiteStore
+
+OUTBOX_DB_NAME = "anki_outbox.sqlite3"
+OUTBOX_MEDIA_DIR = "outbox_media"
+FLUSH_BATCH_SIZE = 50
+RETRY_BASE_DELAY = 60  # Секунд до первого повтора отклоненной заметки (дальше удваивается)
+RETRY_MAX_DELAY = 6 * 3600  # Максимальная пауза между повторами
+MAX_ATTEMPTS = 8  # После стольких отказов заметка откладывается
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True, если ошибка означает, что Anki/AnkiConnect не запущен"""
+    msg = str(error)
+    return "ANKI_CONNECT_ERROR" in msg or "ANKI_TIMEOUT_ERROR" in msg
+
+
+def is_duplicate_error(error) -> bool:
+    """True, если Anki отклонил заметку, потому что такая уже есть"""
+    return "duplicate" in str(error).lower()
+
+
+class AnkiOutbox(SQLiteStore):
+    """Постоянная очередь заметок, ожидающих отправки в Anki"""
+
+    DB_NAME = OUTBOX_DB_NAME
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phrase TEXT NOT NULL,
+            translation TEXT NOT NULL DEFAULT '',
+            context TEXT NOT NULL DEFAULT '',
+            deck_name TEXT NOT NULL,
+            audio_path TEXT,
+            allow_duplicate INTEGER NOT NULL DEFAULT 0,
+            replace_existing INTEGER NOT NULL DEFAULT 0,
+            created REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            parked INTEGER NOT NULL DEFAULT 0
+        );
+    """
+    ROW_FACTORY = sqlite3.Row
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        super()._init_schema(conn)
+        # Очередь, созданная до появления повторов с паузой
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+        for name, column_type in (("next_attempt", "REAL"), ("parked", "INTEGER")):
+            if name not in columns:
+                conn.execute(f"ALTER TABLE outbox ADD COLUMN {name} {column_type} NOT NULL DEFAULT 0")
+
+    def _keep_media(self, audio_path: str) -> str:
+        """Переносит аудио в папку очереди, чтобы его не удалили до отправки"""
+        if not audio_path or not os.path.exists(audio_path):
+            return None
+        media_dir = os.path.join(os.path.dirname(self.db_path), OUTBOX_MEDIA_DIR)
+        os.makedirs(media_dir, exist_ok=True)
+        # Одинаковые имена файлов из разных источников не должны перезаписывать друг друга
+        target = os.path.join(media_dir, f"{uuid.uuid4().hex[:12]}_{os.path.basename(audio_path)}")
+        try:
+            os.replace(audio_path, target)
+        except OSError:
+            return audio_path
+        return target
+
+    def enqueue(self, phrase: str, translation: str, context: str, deck_name: str,
+                audio_path: str = None, allow_duplicate: bool = False,
+                replace_existing: bool = False) -> int:
+        """
+        Сохраняет заметку в очередь.
+
+        Returns:
+            ID записи в очереди
+        """
+        stored_audio = self._keep_media(audio_path)
+        with self._db() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (phrase, translation, context, deck_name, audio_path, "
+                "allow_duplicate, replace_existing, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (phrase, translation or "", context or "", deck_name, stored_audio,
+                 int(allow_duplicate), int(replace_existing), time.time())
+            )
+            debug_log(f"📥 Заметка в очереди outbox: {phrase[:40]}", prefix="[OUTBOX]")
+            return cursor.lastrowid
+
+    def count(self, due_only: bool = False) -> int:
+        """Количество заметок, ожидающих отправки (due_only — только тех, чья пауза истекла)"""
+        if not self._exists():
+            return 0
+        query = "SELECT COUNT(*) FROM outbox WHERE parked = 0"
+        params = ()
+        if due_only:
+            query += " AND next_attempt <= ?"
+            params = (time.time(),)
+        with self._db() as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+    def parked(self) -> List[Dict]:
+        """Отложенные заметки, которые Anki отклонил MAX_ATTEMPTS раз"""
+        if not self._exists():
+            return []
+        with self._db() as conn:
+            rows = conn.execute("SELECT * FROM outbox WHERE parked = 1 ORDER BY id").fetchall()
+            return [dict(r) for r in rows]
+
+    def _pending(self, limit: int, now: float = None) -> List[Dict]:
+        """Заметки, которые пора отправлять (не отложенные и без активной паузы)"""
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE parked = 0 AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time() if now is None else now, limit)
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> float:
+        """Пауза перед следующей попыткой после attempts отказов"""
+        return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+    def _finish(self, done_ids: List[int], failed: List[Tuple[Dict, str]]):
+        """Удаляет отправленные заметки; отклоненным назначает паузу или откладывает их"""
+        now = time.time()
+        retries, parked = [], []
+        for row, err in failed:
+            attempts = row["attempts"] + 1
+            if attempts >= MAX_ATTEMPTS:
+                parked.append((attempts, err, row["id"]))
+                print(f"⛔ Заметка отложена после {attempts} отказов Anki: {row['phrase'][:40]} ({err})")
+            else:
+                retries.append((attempts, err, now + self._retry_delay(attempts), row["id"]))
+        with self._db() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in done_ids])
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt = ? WHERE id = ?", retries
+            )
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, last_error = ?, parked = 1 WHERE id = ?", parked
+            )
+
+    def flush(self, anki_api, batch_size: int = FLUSH_BATCH_SIZE) -> Tuple[int, int]:
+        """
+        Отправляет очередь в Anki пачками через addNotes.
+        Отклоненные заметки получают паузу до следующей попытки и в этот вызов
+        уже не выбираются.
+
+        Returns:
+            (добавлено, с ошибкой)
+        """
+        added_total, failed_total = 0, 0
+        while True:
+            rows = self._pending(batch_size)
+            if not rows:
+                break
+
+            # Принудительная замена: существующую заметку обновляем на месте.
+            # Неудачную замену не отправляем в addNotes — Anki отклонит ее как дубликат,
+            # и запись пропала бы из очереди; она остается с ошибкой
+            replaced, replace_failed, connection_lost = [], [], False
+            for row in list(rows):
+                if not row["replace_existing"]:
+                    continue
+                existing_ids = anki_api.find_notes(row["phrase"])
+                if not existing_ids:
+                    continue
+                rows.remove(row)
+                try:
+                    anki_api.update_note(existing_ids[0], row["phrase"], row["translation"],
+                                         row["context"], row["audio_path"], deck_name=row["deck_name"])
+                except Exception as e:
+                    if is_connection_error(e):
+                        connection_lost = True
+                        break
+                    replace_failed.append((row, str(e)))
+                    continue
+                replaced.append(row)
+            if replaced or replace_failed:
+                for row in replaced:
+                    if row["audio_path"] and os.path.exists(row["audio_path"]):
+                        try:
+                            os.remove(row["audio_path"])
+                        except OSError:
+                            pass
+                self._finish([r["id"] for r in replaced], replace_failed)
+                added_total += len(replaced)
+                failed_total += len(replace_failed)
+            if connection_lost:
+                debug_log("⏸ Anki снова недоступен, отправка очереди отложена", prefix="[OUTBOX]")
+                break
+            if not rows:
+                continue
+
+            try:
+                # Аудио прикладывается к заметкам в самом addNotes
+                audio_field = anki_api.resolve_audio_field() if any(r["audio_path"] for r in rows) else None
+                notes = [anki_api.build_note(
+                    row["phrase"], row["translation"], row["context"], row["deck_name"],
+                    audio_path=row["audio_path"], allow_duplicate=bool(row["allow_duplicate"]),
+                    audio_field=audio_field
+                ) for row in rows]
+                results = anki_api.add_notes(notes)
+            except Exception as e:
+                if is_connection_error(e):
+                    debug_log("⏸ Anki снова недоступен, отправка очереди отложена", prefix="[OUTBOX]")
+                    break
+                results = [e] * len(rows)
+
+            done, failed = [], []
+            for row, result in zip(rows, results):
+                # Дубликат означает, что заметка уже в Anki — повторять не нужно
+                if not isinstance(result, Exception) or is_duplicate_error(result):
+                    done.append(row["id"])
+                    if row["audio_path"] and os.path.exists(row["audio_path"]):
+                        try:
+                            os.remove(row["audio_path"])
+                        except OSError:
+                            pass
+                else:
+                    failed.append((row, str(result)))
+            self._finish(done, failed)
+            added_total += len(done)
+            failed_total += len(failed)
+
+        if added_total or failed_total:
+            debug_log(f"📤 Очередь outbox: добавлено {added_total}, ошибок {failed_total}", prefix="[OUTBOX]")
+        return added_total, failed_total
+
+
+# Глобальный экземпляр очереди
+anki_outbox = AnkiOutbox()
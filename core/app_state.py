@@ -25,12 +25,16 @@ class AppState:
     # AI настройки
     ai_provider: str = "ollama"  # ollama, openrouter, google
     ollama_model: str = "model"
+    ollama_keep_alive: int = 30  # Минут держать модель Ollama в памяти при включенном мониторинге (0 — по умолчанию Ollama)
     openrouter_model: str = "openai/gpt-4o-mini"
     openrouter_api_key: str = ""
+    openrouter_api_url: str = ""  # Пусто — стандартный адрес OpenRouter
     google_api_key: str = ""
     translate_prompt: str = ""
     context_prompt: str = ""
     context_delimiter: str = "КОНТЕКСТ"
+    structured_output: bool = False  # Просить у AI JSON по схеме вместо текста с разделителем
+    speculative_generation: bool = False  # Заранее переводить захваченную фразу локальной моделью
     
     # TTS настройки
     tts: TTSSettings = field(default_factory=TTSSettings)
@@ -39,11 +43,19 @@ class AppState:
     pause_clipboard_monitoring: bool = True  # По умолчанию перехват выключен
     auto_generate_on_copy: bool = True
     generation_running: bool = False
+    generation_id: int = 0  # ID текущего запроса генерации (ответы старых запросов отбрасываются)
+    generation_cancel: Optional[Any] = None  # CancelToken текущей генерации
+    last_generated_phrase: str = ""  # Повторная генерация той же фразы идет мимо кэша переводов
     batch_running: bool = False
     batch_paused: bool = False  # Пауза пакетной обработки
+    batch_parallel: Dict[str, int] = field(default_factory=lambda: {"Ollama": 2, "OpenRouter": 4})  # Потоков на провайдера
     clipboard_running: bool = True
+    outbox_running: bool = True  # Фоновая отправка очереди outbox (до закрытия приложения)
     force_replace_flag: bool = False
     check_duplicates: bool = True  # Проверять дубликаты в Anki
+    near_duplicate_check: bool = False  # Искать почти-дубликаты по эмбеддингам Ollama
+    near_duplicate_skip: bool = False  # Пропускать почти-дубликаты, а не только помечать их
+    embedding_model: str = "nomic-embed-text"
     
     # Буфер обмена
     last_clipboard: str = ""
@@ -70,14 +82,36 @@ class AppState:
         if tld is not None:
             self.tts.tld = tld
     
+    def start_generation(self):
+        """
+        Начинает новую генерацию: отменяет предыдущую и выдает новый ID запроса.
+        
+        Returns:
+            (request_id, cancel_token)
+        """
+        from api.ai.base_provider import CancelToken
+        if self.generation_cancel is not None:
+            self.generation_cancel.cancel()
+        self.generation_id += 1
+        self.generation_cancel = CancelToken()
+        self.generation_running = True
+        return self.generation_id, self.generation_cancel
+    
     def stop_generation(self):
-        """Останавливает текущую генерацию"""
+        """Останавливает текущую генерацию и прерывает ее HTTP-запрос"""
         self.generation_running = False
+        if self.generation_cancel is not None:
+            self.generation_cancel.cancel()
+            self.generation_cancel = None
     
     def stop_clipboard_monitoring(self):
         """Останавливает мониторинг буфера обмена"""
         self.clipboard_running = False
     
+    def stop_outbox_flush(self):
+        """Останавливает фоновую отправку очереди outbox (при закрытии приложения)"""
+        self.outbox_running = False
+    
     def get_checkbox_value(self, var_name: str, default: bool = False) -> bool:
         """Безопасное чтение значения чекбокса из UI компонентов"""
         try:
@@ -4,10 +4,8 @@ import hashlib
 import time
 import subprocess
 # NOTE: gtts импортируется лениво в generate_audio() для ускорения старта
-import tkinter as tk
-from tkinter import messagebox
+# NOTE: winsound и tkinter импортируются лениво — модуль работает и без GUI/Windows (CLI)
 import threading
-import winsound  # Стандартная библиотека Windows
 import wave      # Для создания wav файла
 import math
 import struct
@@ -116,6 +114,7 @@ def play_sound(sound_type="success"):
                 wav_path = ensure_notify_sound()
                 
             if wav_path and os.path.exists(wav_path):
+                import winsound  # Стандартная библиотека Windows
                 winsound.PlaySound(wav_path, winsound.SND_FILENAME | winsound.SND_ASYNC)
             
         except Exception as e:
@@ -205,7 +204,9 @@ def play_text_audio(text, lang=None, speed_level=None, tld=None, parent=None, de
             return True
         return False
     except Exception as e:
-        if parent: messagebox.showerror("Ошибка озвучки", str(e), parent=parent)
+        if parent:
+            from tkinter import messagebox
+            messagebox.showerror("Ошибка озвучки", str(e), parent=parent)
         return False
 
 def update_tts_settings(lang=None, speed_level=None, tld=None):
@@ -64,6 +64,11 @@ TRANSLATIONS = {
         "openrouter_cloud": "OpenRouter (облачный AI)",
         "google_gemini": "Google AI (Gemini)",
         "server_url": "URL сервера:",
+        "ollama_keep_alive": "Держать модель в памяти, мин (0 — по умолчанию Ollama):",
+        "structured_output": "Структурированный ответ (JSON по схеме)",
+        "near_duplicate_check": "Искать похожие карточки (эмбеддинги Ollama)",
+        "near_duplicate_skip": "Пропускать похожие карточки в пакетном режиме",
+        "speculative_generation": "Переводить захваченную фразу заранее (Ollama)",
         "model_label": "Модель:",
         "openrouter_presets": "Пресеты:",
         "api_key_label": "API Ключ:",
@@ -104,6 +109,7 @@ TRANSLATIONS = {
         "no_api_key": "Нет ключа",
         "enter_api_key_warning": "Введите API ключ",
         "select_or_enter_manually": "💡 Выберите из списка или введите вручную. Нажмите ★ чтобы сохранить в пресеты.",
+        "openrouter_url_hint": "Пусто — https://openrouter.ai/api/v1. Подходит любой OpenAI-совместимый адрес.",
         "batch_clean_text": "🧹 Подготовить текст",
         "batch_collector_on": "📋 Собиратель: ON",
         "batch_collector_off": "📋 Собиратель: OFF",
@@ -112,6 +118,8 @@ TRANSLATIONS = {
         "batch_pause": "⏸ Пауза",
         "batch_continue": "▶ Продолжить",
         "batch_stop": "⏹ Стоп",
+        "batch_resume": "⏯ Продолжить прерванное",
+        "batch_retry_failed": "🔁 Повторить ошибки",
         "batch_log_title": "Журнал событий:",
         "batch_btn_label": "Пакет ➔",
         "batch_tooltip": "Открыть/скрыть панель пакетной обработки",
@@ -181,6 +189,11 @@ TRANSLATIONS = {
         "openrouter_cloud": "OpenRouter (cloud AI)",
         "google_gemini": "Google AI (Gemini)",
         "server_url": "Server URL:",
+        "ollama_keep_alive": "Keep model loaded, min (0 — Ollama default):",
+        "structured_output": "Structured output (JSON schema)",
+        "near_duplicate_check": "Find similar cards (Ollama embeddings)",
+        "near_duplicate_skip": "Skip similar cards in batch mode",
+        "speculative_generation": "Translate captured phrases ahead of time (Ollama)",
         "model_label": "Model:",
         "openrouter_presets": "Presets:",
         "api_key_label": "API Key:",
@@ -221,6 +234,7 @@ TRANSLATIONS = {
         "no_api_key": "No key",
         "enter_api_key_warning": "Enter API key",
         "select_or_enter_manually": "💡 Select from list or enter manually. Click ★ to save to presets.",
+        "openrouter_url_hint": "Empty — https://openrouter.ai/api/v1. Any OpenAI-compatible URL works.",
         "batch_clean_text": "🧹 Prepare text",
         "batch_collector_on": "📋 Collector: ON",
         "batch_collector_off": "📋 Collector: OFF",
@@ -229,6 +243,8 @@ TRANSLATIONS = {
         "batch_pause": "⏸ Pause",
         "batch_continue": "▶ Continue",
         "batch_stop": "⏹ Stop",
+        "batch_resume": "⏯ Resume interrupted",
+        "batch_retry_failed": "🔁 Retry failed",
         "batch_log_title": "Event log:",
         "batch_btn_label": "Batch ➔",
         "batch_tooltip": "Show/hide batch processing panel",
@@ -11,8 +11,9 @@ import os
 from core.app_state import app_state
 from core.settings_manager import load_settings, DEFAULT_DECK_NAME
 from core import audio_utils
+from core.anki_outbox import anki_outbox
 from api.anki_api import anki_api
-from core.workers import add_to_anki_worker, format_clipboard_text
+from core.workers import add_to_anki_worker, format_clipboard_text, start_speculative_generation
 from core.localization import localization_manager
 # NOTE: update_processing_indicator импортируется внутри функций чтобы избежать циклического импорта
 
@@ -91,6 +92,12 @@ def process_clipboard_queue(root):
                 app_state.main_window_components["generate_function"]()
             else:
                 print(f"⏩ Текст слишком длинный для автогенерации ({word_count} слов), только добавлено в список")
+        else:
+            # Перевод начинается в фоне, пока пользователь не нажал "Сгенерировать"
+            start_speculative_generation(
+                widgets["german_text"].get("1.0", tk.END).strip(),
+                app_state.get_checkbox_value("context_var", default=False)
+            )
     except queue.Empty:
         pass
     except Exception as e:
@@ -109,9 +116,13 @@ def process_results_queue(root):
         widgets = app_state.main_window_components["widgets"]
         tvars = app_state.main_window_components["vars"]
         
-        if message == "ollama_ok":
+        if message in ("ollama_ok", "ollama_partial", "ollama_error") and _is_stale_generation(data):
+            # Ответ отмененного или замененного запроса
+            pass
+        
+        elif message == "ollama_ok":
             app_state.generation_running = False
-            translation, context = data
+            translation, context, _ = data
             widgets["translation_text"].configure(text_color=("gray10", "gray90"))
             widgets["translation_text"].delete("1.0", tk.END)
             widgets["translation_text"].insert("1.0", translation)
@@ -141,9 +152,20 @@ def process_results_queue(root):
                 print("🤖 Авто-добавление в Anki...")
                 root.after(100, app_state.main_window_components.get("on_yes_action_func", lambda: None))
                 
+        elif message == "ollama_partial":
+            # Частичный результат потоковой генерации (пока генерация не отменена)
+            if app_state.generation_running:
+                translation, context, _ = data
+                widgets["translation_text"].configure(text_color=("gray10", "gray90"))
+                widgets["translation_text"].delete("1.0", tk.END)
+                widgets["translation_text"].insert("1.0", translation)
+                widgets["context_widget"].configure(text_color=("gray10", "gray90"))
+                widgets["context_widget"].delete("1.0", tk.END)
+                widgets["context_widget"].insert("1.0", context)
+            
         elif message == "ollama_error":
             app_state.generation_running = False
-            err_str = str(data)
+            err_str = str(data[0])
             is_conn = err_str == "OLLAMA_CONNECT_ERROR"
             update_processing_indicator(f"❌ {'Ollama недоступен' if is_conn else 'Ошибка'}", animate=False)
             if not is_conn:
@@ -161,14 +183,15 @@ def process_results_queue(root):
             raw_deck_name = tvars["deck_var"].get().strip() or DEFAULT_DECK_NAME
             deck_name = anki_api.clean_deck_name(raw_deck_name)
             
-            threading.Thread(target=add_to_anki_worker, args=(
+            anki_api.submit(
+                add_to_anki_worker,
                 app_state.results_queue,
                 widgets["german_text"].get("1.0", tk.END).strip(),
                 widgets["translation_text"].get("1.0", tk.END).strip(),
                 widgets["context_widget"].get("1.0", tk.END).strip(),
                 deck_name,
                 audio_path, False, app_state.force_replace_flag
-            ), daemon=True).start()
+            )
             
         elif message == "anki_ok":
             if data:
@@ -187,12 +210,39 @@ def process_results_queue(root):
                 root.after(1500, app_state.main_window_components["on_action_complete"])
             root.after(2000, lambda: update_processing_indicator("", animate=False))
 
+        elif message == "anki_queued":
+            update_processing_indicator(f"📥 Anki недоступен — в очереди: {data}", animate=False)
+            if "add_btn" in widgets:
+                widgets["add_btn"].configure(
+                    state="normal",
+                    text="✅ " + localization_manager.get_text("add_to_anki")
+                )
+            root.after(1500, app_state.main_window_components["on_action_complete"])
+            root.after(4000, lambda: update_processing_indicator("", animate=False))
+
+        elif message == "outbox_flushed":
+            added, remaining = data
+            print(f"📤 Из очереди outbox добавлено в Anki: {added}, осталось: {remaining}")
+            update_processing_indicator(f"📤 Из очереди добавлено: {added}", animate=False)
+            root.after(3000, lambda: update_processing_indicator("", animate=False))
+
+        elif message == "outbox_parked":
+            phrases = "\n".join(f"• {p[:60]}" for p in data[:10])
+            messagebox.showwarning(
+                "Очередь Anki",
+                f"Anki несколько раз отклонил заметки, их отправка остановлена:\n{phrases}\n\n"
+                f"Они сохранены в {anki_outbox.db_path}",
+                parent=root
+            )
+
         elif message == "batch_log":
             _handle_batch_log(widgets, data)
         elif message == "batch_log_append":
             _handle_batch_log_append(widgets, data)
         elif message == "batch_progress":
             _handle_batch_progress(widgets, data)
+        elif message == "batch_stage":
+            _handle_batch_stage(widgets, data)
         elif message == "batch_done":
             _handle_batch_done(widgets)
 
@@ -232,17 +282,15 @@ def process_results_queue(root):
                 widgets["add_btn"].configure(state="normal", text="✅ " + localization_manager.get_text("add_to_anki"))
 
             if messagebox.askyesno("Дубликат обнаружен", 
-                                   f"В Anki уже есть карточка с фразой:\n\"{phrase}\"\n\nУдалить старую версию и добавить новую?", 
+                                   f"В Anki уже есть карточка с фразой:\n\"{phrase}\"\n\nЗаменить старую версию новой?", 
                                    parent=root):
-                update_processing_indicator("🗑 Удаление...", animate=False)
+                update_processing_indicator("🔄 Замена...", animate=False)
                 
-                def delete_and_add_worker():
-                    if anki_api.delete_notes(existing_ids):
-                        add_to_anki_worker(app_state.results_queue, phrase, translation, context, deck_name, audio_path, confirm_delete=True)
-                    else:
-                        app_state.results_queue.put(("anki_error", "Не удалось удалить старую версию карточки."))
-                
-                threading.Thread(target=delete_and_add_worker, daemon=True).start()
+                # Заменяем на месте: одна операция, история повторений сохраняется
+                anki_api.submit(
+                    add_to_anki_worker, app_state.results_queue, phrase, translation, context, deck_name, audio_path,
+                    confirm_delete=True, replace_ids=existing_ids
+                )
             else:
                 if audio_path and os.path.exists(audio_path):
                     try:
@@ -290,6 +338,17 @@ def process_results_queue(root):
                 if not found and data:
                     var.set(data[0])
                             
+        elif message == "decks_counts":
+            # Фоновое обновление статистики: меняем только подписи, выбор колоды сохраняем
+            var = tvars["deck_var"]
+            combo = widgets["deck_combo"]
+            current = anki_api.clean_deck_name(var.get())
+            combo.configure(values=data)
+            for deck in data:
+                if anki_api.clean_deck_name(deck) == current:
+                    var.set(deck)
+                    break
+            
         elif message in ["models_error", "decks_error"]:
             pass
             
@@ -308,6 +367,12 @@ def process_results_queue(root):
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ДЛЯ ОБРАБОТКИ СООБЩЕНИЙ
 # =====================================================================================
 
+def _is_stale_generation(data):
+    """True, если сообщение генерации относится не к текущему запросу"""
+    request_id = data[-1]
+    return request_id is not None and request_id != app_state.generation_id
+
+
 def _handle_batch_log(widgets, data):
     """Добавляет новую строку в лог пакетной обработки."""
     if "batch_log" in widgets:
@@ -337,6 +402,15 @@ def _handle_batch_progress(widgets, data):
         widgets["batch_status_label"].configure(text=f"Обработка {current}/{total}: {phrase[:25]}...")
 
 
+def _handle_batch_stage(widgets, data):
+    """Показывает, сколько фраз прошло каждую стадию конвейера."""
+    if "batch_stage_label" in widgets:
+        total = data["total"]
+        widgets["batch_stage_label"].configure(
+            text=f"🤖 {data['ai']}/{total}   🔊 {data['tts']}/{total}   📇 {data['anki']}/{total}"
+        )
+
+
 def _handle_batch_done(widgets):
     """Обрабатывает завершение пакетной обработки."""
     app_state.batch_running = False
@@ -70,6 +70,13 @@ def get_user_dir() -> str:
     return get_base_data_dir()
 
 
+def get_user_files_dir() -> str:
+    """Возвращает папку user_files (кэши, очереди, журнал); создает ее при необходимости"""
+    path = os.path.join(get_user_dir(), "user_files")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
 def get_resource_path(relative_path: str) -> str:
     """Возвращает путь к ресурсу внутри EXE или в папке проекта"""
     if getattr(sys, 'frozen', False):
@@ -112,8 +119,23 @@ def get_default_settings() -> Dict[str, Any]:
         # AI Settings
         "AI_PROVIDER": "ollama",
         "OLLAMA_URL": "http://localhost:11434",
+        # Минут держать модель Ollama в памяти, пока включен мониторинг буфера (0 — по умолчанию Ollama)
+        "OLLAMA_KEEP_ALIVE": 30,
         "OPENROUTER_API_KEY": "",
         "OPENROUTER_MODEL": "openai/gpt-4o-mini",
+        "OPENROUTER_API_URL": "",
+        # Ответ AI JSON-объектом по схеме (Ollama format / OpenRouter response_format)
+        "STRUCTURED_OUTPUT": False,
+        # Переводить захваченную из буфера фразу в фоне до нажатия "Сгенерировать" (только Ollama)
+        "SPECULATIVE_GENERATION": False,
+        # Параллельных запросов в пакетном режиме (для Ollama нужен OLLAMA_NUM_PARALLEL на сервере)
+        "BATCH_PARALLEL_OLLAMA": 2,
+        "BATCH_PARALLEL_OPENROUTER": 4,
+        # Поиск почти-дубликатов по эмбеддингам (модель Ollama, нужен NumPy)
+        "NEAR_DUPLICATE_CHECK": False,
+        # Пропускать почти-дубликаты в пакетном режиме (иначе они только помечаются в журнале)
+        "NEAR_DUPLICATE_SKIP": False,
+        "EMBEDDING_MODEL": "nomic-embed-text",
         "GOOGLE_API_KEY": "",
         "LAST_SETTINGS_TAB": "Озвучка",
         "AI_PRESETS": [],
@@ -181,9 +203,20 @@ def load_settings(update_app_state: bool = True) -> Dict[str, Any]:
         
         # AI настройки
         app_state.ai_provider = settings.get("AI_PROVIDER", "ollama")
+        app_state.ollama_keep_alive = settings.get("OLLAMA_KEEP_ALIVE", 30)
         app_state.openrouter_api_key = settings.get("OPENROUTER_API_KEY", "")
         app_state.openrouter_model = settings.get("OPENROUTER_MODEL", "openai/gpt-4o-mini")
+        app_state.openrouter_api_url = settings.get("OPENROUTER_API_URL", "")
+        app_state.structured_output = settings.get("STRUCTURED_OUTPUT", False)
+        app_state.speculative_generation = settings.get("SPECULATIVE_GENERATION", False)
+        app_state.batch_parallel = {
+            "Ollama": max(1, settings.get("BATCH_PARALLEL_OLLAMA", 2)),
+            "OpenRouter": max(1, settings.get("BATCH_PARALLEL_OPENROUTER", 4)),
+        }
         app_state.google_api_key = settings.get("GOOGLE_API_KEY", "")
+        app_state.near_duplicate_check = settings.get("NEAR_DUPLICATE_CHECK", False)
+        app_state.near_duplicate_skip = settings.get("NEAR_DUPLICATE_SKIP", False)
+        app_state.embedding_model = settings.get("EMBEDDING_MODEL", "nomic-embed-text")
         
         # Localization
         from core.localization import localization_manager
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Спекулятивная генерация.
+Пока пользователь читает захваченную из буфера фразу, локальная модель уже
+переводит ее в фоне. Результат попадает в кэш переводов, а если «Сгенерировать»
+нажато раньше окончания — ask_ai_worker подхватывает идущую генерацию вместо новой.
+Изменение текста, смена фразы или запуск пакета отменяют спекуляцию.
+"""
+import threading
+from typing import Optional, Tuple
+
+from core.logger import debug_log
+from api.ai.base_provider import CancelToken, GenerationCancelled
+
+
+class Speculation:
+    """Одна спекулятивная генерация и ее промежуточный результат"""
+
+    def __init__(self, key: Tuple, phrase: str):
+        self.key = key  # (провайдер, модель, фраза, с контекстом, шаблон промпта, разделитель)
+        self.phrase = phrase
+        self.cancel = CancelToken()
+        self.done = threading.Event()
+        self.partial: Tuple[str, str] = ("", "")
+        self.result: Optional[Tuple[str, str]] = None
+
+
+class SpeculativeGenerator:
+    """Держит не больше одной спекулятивной генерации за раз"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[Speculation] = None
+
+    @staticmethod
+    def _key(provider, model: str, phrase: str, with_context: bool,
+             prompt_template: str, delimiter: str) -> Tuple:
+        return (provider.name, model, phrase, with_context, prompt_template, delimiter)
+
+    def start(self, provider, model: str, phrase: str, with_context: bool,
+              prompt_template: str, delimiter: str) -> Speculation:
+        """Запускает генерацию в фоне, предыдущая спекуляция отменяется"""
+        speculation = Speculation(
+            self._key(provider, model, phrase, with_context, prompt_template, delimiter), phrase
+        )
+        with self._lock:
+            previous, self._current = self._current, speculation
+        if previous:
+            previous.cancel.cancel()
+
+        def run():
+            parts = provider.translate_stream(
+                phrase, prompt_template, model,
+                with_context=with_context, delimiter=delimiter,
+                cancel=speculation.cancel, use_cache=True
+            )
+            try:
+                for result in parts:
+                    speculation.partial = result
+                # translate_stream уже положил ответ в кэш переводов
+                speculation.result = speculation.partial
+                debug_log(f"🔮 Спекулятивный перевод готов: {phrase[:40]}")
+            except GenerationCancelled:
+                debug_log(f"🔮 Спекулятивная генерация отменена: {phrase[:40]}")
+            except Exception as e:
+                debug_log(f"⚠️ Спекулятивная генерация не удалась: {e}")
+            finally:
+                parts.close()
+                speculation.done.set()
+
+        threading.Thread(target=run, name="speculative-generation", daemon=True).start()
+        return speculation
+
+    def cancel(self, phrase: str = None):
+        """
+        Отменяет текущую спекуляцию.
+        phrase: текущий текст поля — спекуляция для той же фразы не отменяется.
+        """
+        with self._lock:
+            speculation = self._current
+            if not speculation or (phrase is not None and phrase.strip() == speculation.phrase):
+                return
+            self._current = None
+        speculation.cancel.cancel()
+
+    def adopt(self, provider, model: str, phrase: str, with_context: bool,
+              prompt_template: str, delimiter: str) -> Optional[Speculation]:
+        """
+        Забирает идущую спекуляцию для той же фразы, модели и промпта.
+        Промпт, измененный после захвата фразы, дает другой ключ.
+        Несовпадающая спекуляция отменяется (уступает место настоящему запросу);
+        завершенная не возвращается — ее результат уже в кэше переводов.
+        """
+        with self._lock:
+            speculation, self._current = self._current, None
+        if not speculation or speculation.done.is_set():
+            return None
+        if speculation.key != self._key(provider, model, phrase, with_context, prompt_template, delimiter):
+            speculation.cancel.cancel()
+            return None
+        return speculation
+
+
+# Глобальный экземпляр спекулятивной генерации
+speculative_generator = SpeculativeGenerator()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Основа для хранилищ приложения в SQLite (очередь outbox, кэши, журнал заданий).
+БД лежит в папке user_files, схема создается при первом соединении,
+а все обращения идут через _db() — транзакция с commit и закрытием под блокировкой.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from core.settings_manager import get_user_files_dir
+
+
+class SQLiteStore:
+    """
+    Хранилище в одном файле SQLite.
+    Наследник задает DB_NAME и SCHEMA (SQL для executescript) и при необходимости
+    переопределяет _init_schema (например, для добавления новых колонок).
+    """
+
+    DB_NAME = ""
+    SCHEMA = ""
+    ROW_FACTORY = None  # Например, sqlite3.Row — строки с доступом по имени колонки
+
+    def __init__(self, db_path: str = None):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def db_path(self) -> str:
+        if not self._db_path:
+            self._db_path = os.path.join(get_user_files_dir(), self.DB_NAME)
+        return self._db_path
+
+    def _exists(self) -> bool:
+        """True, если БД уже создана (чтение без создания пустого файла)"""
+        return self._initialized or os.path.exists(self.db_path)
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            self._init_schema(conn)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def _db(self):
+        """Соединение с БД: транзакция с commit и закрытием"""
+        with self._lock:
+            conn = self._connect()
+            if self.ROW_FACTORY is not None:
+                conn.row_factory = self.ROW_FACTORY
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
@@ -10,7 +10,11 @@ import re
 
 from core.app_state import app_state
 from core.logger import debug_log
+from core.anki_outbox import anki_outbox, is_connection_error
+from core.speculation import speculative_generator
 from api.anki_api import anki_api
+from api.embedding_index import embedding_index
+from api.ai.base_provider import GenerationCancelled
 from api.ai.ollama_provider import ollama_provider
 from api.ai.openrouter_provider import OpenRouterProvider
 
@@ -31,7 +35,9 @@ def get_current_ai_provider():
     current_settings = {
         "type": provider_type,
         "key": app_state.openrouter_api_key if provider_type == "openrouter" else app_state.google_api_key,
-        "model": app_state.openrouter_model if provider_type == "openrouter" else None
+        "model": app_state.openrouter_model if provider_type == "openrouter" else None,
+        "url": app_state.openrouter_api_url if provider_type == "openrouter" else None,
+        "structured": app_state.structured_output
     }
     
     settings_hash = str(current_settings)
@@ -43,13 +49,15 @@ def get_current_ai_provider():
     if provider_type == "openrouter":
         new_provider = OpenRouterProvider(
             api_key=app_state.openrouter_api_key,
-            model=app_state.openrouter_model
+            model=app_state.openrouter_model,
+            api_url=app_state.openrouter_api_url or None
         )
     elif provider_type == "google":
         new_provider = ollama_provider  # Placeholder
     else:
         new_provider = ollama_provider
-        
+    
+    new_provider.structured_output = app_state.structured_output
     _cached_provider = new_provider
     _cached_settings_hash = settings_hash
     return new_provider
@@ -58,34 +66,135 @@ def get_current_ai_provider():
 # =============================================================================
 # AI WORKER
 # =============================================================================
-def ask_ai_worker(q, phrase, with_context):
-    """Воркер для генерации перевода через выбранный AI"""
+STREAM_UPDATE_INTERVAL = 0.1  # Не чаще чем раз в N секунд отправляем частичный текст в UI
+SPECULATIVE_MAX_WORDS = 100  # Длиннее фразы заранее не переводим
+
+
+def get_generation_model(provider):
+    """Модель для интерактивной генерации: выбранная в главном окне или из настроек (Ollama)"""
+    if provider.name != "Ollama":
+        return None
+    model = None
+    if app_state.main_window_components and "vars" in app_state.main_window_components:
+        try:
+            model = app_state.main_window_components["vars"].get("ollama_var").get()
+        except Exception:
+            model = app_state.ollama_model
+    return model or app_state.ollama_model
+
+
+def start_speculative_generation(phrase, with_context):
+    """
+    Заранее переводит только что захваченную фразу, пока AI простаивает.
+    Только для локального провайдера (без расхода платных токенов) и только когда
+    нет интерактивной генерации и пакетной обработки.
+    """
+    if not app_state.speculative_generation or not phrase:
+        return
+    if app_state.generation_running or app_state.batch_running:
+        return
+    if len(phrase.split()) > SPECULATIVE_MAX_WORDS:
+        return
+    provider = get_current_ai_provider()
+    if not provider.is_local:
+        return
+    speculative_generator.start(
+        provider, get_generation_model(provider), phrase, with_context, *_speculation_prompt(with_context)
+    )
+
+
+def _speculation_prompt(with_context):
+    """Шаблон промпта и разделитель, с которыми сравнивается спекуляция"""
+    if with_context:
+        return app_state.context_prompt, app_state.context_delimiter
+    return app_state.translate_prompt, app_state.context_delimiter
+
+
+def ask_ai_worker(q, phrase, with_context, stream=False, request_id=None, cancel=None, use_cache=True):
+    """
+    Воркер для генерации перевода через выбранный AI.
+    При stream=True частичный перевод/контекст отправляются сообщениями "ollama_partial"
+    по мере генерации, итог — как обычно "ollama_ok".
+    Все сообщения несут request_id (последним элементом), чтобы UI отбросил ответы
+    отмененных запросов; cancel прерывает HTTP-запрос к провайдеру.
+    use_cache=False пропускает кэш переводов (повторная генерация той же фразы).
+    """
     try:
         provider = get_current_ai_provider()
-        
-        model = None
-        if provider.name == "Ollama":
-            if app_state.main_window_components and "vars" in app_state.main_window_components:
-                try:
-                    model = app_state.main_window_components["vars"].get("ollama_var").get()
-                except Exception:
-                    model = app_state.ollama_model
-            if not model:
-                model = app_state.ollama_model
+        model = get_generation_model(provider)
+
+        if stream:
+            # Фраза уже переводится спекулятивно — догоняем ту генерацию вместо новой
+            speculation = speculative_generator.adopt(
+                provider, model, phrase, with_context, *_speculation_prompt(with_context)
+            ) if use_cache else None
+            if speculation and _follow_speculation(q, speculation, request_id, cancel):
+                return
+            if not use_cache:
+                speculative_generator.cancel()
+            _stream_ai_result(q, provider, phrase, with_context, model, request_id, cancel, use_cache)
+            return
 
         if with_context:
             translation, context = provider.translate_with_context(
                 phrase, app_state.context_prompt, model,
-                delimiter=app_state.context_delimiter
+                delimiter=app_state.context_delimiter, cancel=cancel, use_cache=use_cache
             )
         else:
             translation, context = provider.translate(
-                phrase, app_state.translate_prompt, model
+                phrase, app_state.translate_prompt, model, cancel=cancel, use_cache=use_cache
             )
         
-        q.put(("ollama_ok", (translation, context)))
+        q.put(("ollama_ok", (translation, context, request_id)))
+    except GenerationCancelled:
+        debug_log(f"🛑 Генерация #{request_id} отменена")
     except Exception as e:
-        q.put(("ollama_error", e))
+        q.put(("ollama_error", (e, request_id)))
+
+
+def _follow_speculation(q, speculation, request_id=None, cancel=None):
+    """
+    Показывает идущую спекулятивную генерацию как обычную потоковую.
+    
+    Returns:
+        True, если спекуляция дала результат; False — нужно генерировать заново
+    """
+    if cancel:
+        cancel.on_cancel(speculation.cancel.cancel)
+    debug_log(f"🔮 Генерация #{request_id} подхватывает спекулятивный перевод")
+    last_partial = None
+    while not speculation.done.wait(STREAM_UPDATE_INTERVAL):
+        if speculation.partial != last_partial:
+            last_partial = speculation.partial
+            q.put(("ollama_partial", (*last_partial, request_id)))
+    if cancel and cancel.cancelled:
+        raise GenerationCancelled()
+    if speculation.result is None:
+        return False
+    q.put(("ollama_ok", (*speculation.result, request_id)))
+    return True
+
+
+def _stream_ai_result(q, provider, phrase, with_context, model, request_id=None, cancel=None, use_cache=True):
+    """Потоковая генерация: промежуточные результаты с ограничением частоты обновлений UI"""
+    prompt = app_state.context_prompt if with_context else app_state.translate_prompt
+    parts = provider.translate_stream(
+        phrase, prompt, model,
+        with_context=with_context, delimiter=app_state.context_delimiter,
+        cancel=cancel, use_cache=use_cache
+    )
+    result = ("", "")
+    last_update = 0.0
+    try:
+        for result in parts:
+            now = time.time()
+            if now - last_update >= STREAM_UPDATE_INTERVAL:
+                q.put(("ollama_partial", (*result, request_id)))
+                last_update = now
+    finally:
+        parts.close()
+    
+    q.put(("ollama_ok", (*result, request_id)))
 
 
 def get_ollama_models():
@@ -100,15 +209,17 @@ def get_ollama_models():
 # ANKI WORKER
 # =============================================================================
 def add_to_anki_worker(q, phrase, translation, context, deck_name, audio_path, 
-                       confirm_delete=False, force_replace=False):
-    """Воркер для добавления в Anki"""
+                       confirm_delete=False, force_replace=False, replace_ids=None):
+    """
+    Воркер для добавления в Anki.
+    При замене (force_replace или replace_ids) существующая заметка обновляется на месте
+    одним updateNoteFields — история повторений карточки сохраняется, а карточки
+    переносятся в выбранную колоду.
+    """
     
     try:
-        if force_replace:
-            existing_ids = anki_api.find_notes(phrase)
-            if existing_ids:
-                debug_log(f"🔄 Force replace: удаление {len(existing_ids)} старых заметок.")
-                anki_api.delete_notes(existing_ids)
+        if force_replace and not replace_ids:
+            replace_ids = anki_api.find_notes(phrase)
         
         # Ensure absolute path
         if audio_path and not os.path.isabs(audio_path):
@@ -120,8 +231,16 @@ def add_to_anki_worker(q, phrase, translation, context, deck_name, audio_path,
         if audio_path and os.path.exists(audio_path):
             debug_log(f"   audio file size: {os.path.getsize(audio_path)} bytes")
         
-        anki_api.add_note(phrase, translation, context, deck_name, audio_path)
-        debug_log("✅ Нота успешно добавлена в Anki.")
+        if replace_ids:
+            debug_log(f"🔄 Замена: обновление заметки {replace_ids[0]} на месте.")
+            anki_api.update_note(replace_ids[0], phrase, translation, context, audio_path, deck_name=deck_name)
+            if len(replace_ids) > 1:
+                # Лишние копии той же фразы удаляем, чтобы осталась одна карточка
+                anki_api.delete_notes(replace_ids[1:])
+            debug_log("✅ Нота успешно обновлена в Anki.")
+        else:
+            anki_api.add_note(phrase, translation, context, deck_name, audio_path)
+            debug_log("✅ Нота успешно добавлена в Anki.")
         
         if audio_path and os.path.exists(audio_path):
             try:
@@ -133,8 +252,18 @@ def add_to_anki_worker(q, phrase, translation, context, deck_name, audio_path,
         q.put(("anki_ok", True))
     except Exception as e:
         debug_log(f"❌ Ошибка добавления в Anki: {e}")
+        if is_connection_error(e):
+            # Anki закрыт — сохраняем заметку в очередь, чтобы не генерировать повторно
+            try:
+                anki_outbox.enqueue(phrase, translation, context, deck_name, audio_path,
+                                    replace_existing=bool(force_replace or replace_ids))
+                q.put(("anki_queued", anki_outbox.count()))
+                return
+            except Exception as outbox_error:
+                debug_log(f"❌ Ошибка записи в очередь outbox: {outbox_error}")
+        
         err_msg = str(e).lower()
-        if "duplicate" in err_msg and not confirm_delete and not force_replace:
+        if "duplicate" in err_msg and not confirm_delete and not force_replace and not replace_ids:
             existing_ids = anki_api.find_notes(phrase)
             if existing_ids:
                 q.put(("anki_duplicate", (phrase, translation, context, deck_name, audio_path, existing_ids)))
@@ -149,26 +278,103 @@ def add_to_anki_worker(q, phrase, translation, context, deck_name, audio_path,
 
 
 def load_background_data_worker(q):
-    """Загружает данные в фоне (модели и колоды)"""
+    """Загружает данные в фоне (модели, колоды и индекс фраз)"""
     anki_api.setup_model()
     
+    # Колоды запрашиваются параллельно с загрузкой моделей Ollama
+    # Список приходит сразу, количество карточек — отдельным сообщением после getDeckStats
+    decks_future = anki_api.submit(
+        anki_api.get_deck_names, on_update=lambda decks: q.put(("decks_counts", decks))
+    )
+    
     try:
         models = get_ollama_models()
         if models == "OLLAMA_CONNECT_ERROR":
             q.put(("models_error", models))
         else:
             q.put(("models_ok", models))
+            # Выбранная модель загружается в память сразу, а не при первой генерации
+            if app_state.ai_provider == "ollama" and models:
+                _apply_ollama_keep_alive()
+                model = get_generation_model(ollama_provider)
+                ollama_provider.warm_up_async(model if model in models else models[0])
     except Exception as e:
         q.put(("models_error", e))
     
     try:
-        decks = anki_api.get_deck_names()
+        decks = decks_future.result(timeout=10)
         if decks == "ANKI_CONNECT_ERROR":
             q.put(("decks_error", decks))
         else:
             q.put(("decks_ok", decks))
     except Exception as e:
         q.put(("decks_error", e))
+    
+    # Индекс фраз для локальной проверки дубликатов (после колод, чтобы не задерживать UI)
+    anki_api.phrase_index.load()
+    # Эмбеддинги фраз для поиска почти-дубликатов строятся в фоне после индекса
+    if app_state.near_duplicate_check:
+        embedding_index.configure(True, app_state.embedding_model)
+
+
+def _apply_ollama_keep_alive() -> bool:
+    """
+    Передает Ollama keep_alive из настроек, пока включен мониторинг буфера;
+    на паузе — значение сервера. Возвращает True, если модель нужно держать в памяти.
+    """
+    active = (app_state.ollama_keep_alive > 0 and app_state.ai_provider == "ollama"
+              and _clipboard_monitoring_active())
+    ollama_provider.keep_alive = f"{app_state.ollama_keep_alive}m" if active else None
+    return active
+
+
+def ollama_keep_alive_worker(interval: float = 30.0):
+    """
+    Держит выбранную модель Ollama в памяти, пока включен мониторинг буфера:
+    при простое дольше половины окна keep_alive модель прогревается заново,
+    и первая генерация после паузы не ждет ее загрузки.
+    """
+    while app_state.clipboard_running:
+        # Спим короткими шагами, чтобы быстро завершиться при закрытии
+        for _ in range(int(interval / 0.5)):
+            if not app_state.clipboard_running:
+                return
+            time.sleep(0.5)
+        
+        try:
+            # Та же модель, что и для генерации: выбранная в главном окне
+            model = get_generation_model(ollama_provider)
+            if not _apply_ollama_keep_alive() or not model:
+                continue
+            if time.time() - ollama_provider.last_used > app_state.ollama_keep_alive * 60 / 2:
+                ollama_provider.warm_up_async(model)
+        except Exception as e:
+            debug_log(f"❌ Ошибка в ollama_keep_alive_worker: {e}")
+
+
+def outbox_flush_worker(q, interval: float = 15.0):
+    """
+    Фоновая отправка очереди outbox, как только Anki снова доступен.
+    Работает до закрытия приложения (app_state.outbox_running), независимо от мониторинга буфера.
+    """
+    while app_state.outbox_running:
+        try:
+            if anki_outbox.count(due_only=True) and anki_api.is_available():
+                parked_before = {row["id"] for row in anki_outbox.parked()}
+                added, failed = anki_outbox.flush(anki_api)
+                if added:
+                    q.put(("outbox_flushed", (added, anki_outbox.count())))
+                parked = [row["phrase"] for row in anki_outbox.parked() if row["id"] not in parked_before]
+                if parked:
+                    q.put(("outbox_parked", parked))
+        except Exception as e:
+            debug_log(f"❌ Ошибка в outbox_flush_worker: {e}")
+        
+        # Спим короткими шагами, чтобы быстро завершиться при закрытии
+        for _ in range(int(interval / 0.5)):
+            if not app_state.outbox_running:
+                break
+            time.sleep(0.5)
 
 
 # =============================================================================
@@ -179,6 +385,18 @@ def format_clipboard_text(text):
     return re.sub(r'(?<![.!?,;:])\s*[\r\n]+\s*', ' ', text)
 
 
+def _clipboard_monitoring_active() -> bool:
+    """True, если мониторинг буфера включен в UI"""
+    try:
+        if app_state.main_window_components and "vars" in app_state.main_window_components:
+            var = app_state.main_window_components["vars"].get("pause_monitoring_var")
+            if var is not None:
+                return bool(var.get())
+    except Exception:
+        pass
+    return False
+
+
 def clipboard_worker(q):
     """Воркер для мониторинга буфера обмена"""
     import pyperclip
@@ -195,16 +413,7 @@ def clipboard_worker(q):
             if not app_state.clipboard_running:
                 break
             
-            pause_from_ui = True
-            try:
-                if app_state.main_window_components and "vars" in app_state.main_window_components:
-                    var = app_state.main_window_components["vars"].get("pause_monitoring_var")
-                    if var is not None:
-                        pause_from_ui = not var.get()
-            except Exception:
-                pass
-            
-            if pause_from_ui:
+            if not _clipboard_monitoring_active():
                 time.sleep(0.5)
                 continue
             
@@ -18,16 +18,19 @@ import shutil
 from core.app_state import app_state
 from core.settings_manager import load_settings, save_settings, get_user_dir, get_data_dir, get_resource_path, DEFAULT_DECK_NAME
 from core.prompts_manager import prompts_manager, update_active_prompts, rename_prompt_preset
-from core.workers import ask_ai_worker, get_ollama_models, add_to_anki_worker, load_background_data_worker, clipboard_worker, get_current_ai_provider
+from core.speculation import speculative_generator
+from core.workers import ask_ai_worker, get_ollama_models, add_to_anki_worker, load_background_data_worker, clipboard_worker, outbox_flush_worker, ollama_keep_alive_worker, get_current_ai_provider
 from core.processing import process_clipboard_queue, process_results_queue
 from core.ui_callbacks import update_auto_generate_flag, update_pause_monitoring_flag, update_processing_indicator
 from core import audio_utils
 from api.anki_api import anki_api
+from api.embedding_index import embedding_index
 from api.ai.ollama_provider import ollama_provider
 from ui.main_window import build_main_window
 from ui.settings_window import open_settings_window, apply_font_settings
 from core.localization import localization_manager
 from modules.batch_generator.logic import batch_processing_worker
+from modules.batch_generator.journal import batch_journal, FAILED
 from modules.batch_generator.ui import create_batch_panel
 
 
@@ -120,6 +123,7 @@ def main():
     dependencies = types.SimpleNamespace()
     dependencies.main_window_components = app_state.main_window_components
     dependencies.stop_clipboard_monitoring = app_state.stop_clipboard_monitoring
+    dependencies.stop_outbox_flush = app_state.stop_outbox_flush
     dependencies.load_settings = load_settings
     dependencies.save_settings = save_settings
     dependencies.update_auto_generate_flag = update_auto_generate_flag
@@ -127,6 +131,13 @@ def main():
     dependencies.stop_generation = app_state.stop_generation
     dependencies.get_ollama_models = get_ollama_models
     dependencies.get_deck_names = anki_api.get_deck_names
+    def _refresh_deck_names(on_update=None):
+        """Перечитывает имена колод, количество карточек обновляется в фоне (on_update)"""
+        anki_api.invalidate_deck_stats()
+        return anki_api.get_deck_names(refresh=True, on_update=on_update)
+    dependencies.get_deck_names_async = lambda callback, on_update=None: anki_api.submit(
+        _refresh_deck_names, on_update, callback=callback
+    )
     dependencies.create_deck = anki_api.create_deck
     dependencies.clean_deck_name = anki_api.clean_deck_name
     dependencies.open_settings_window = lambda parent, deps, **kwargs: open_settings_window(parent, deps, settings, **kwargs)
@@ -150,6 +161,11 @@ def main():
         audio_enabled = app_state.main_window_components["vars"]["audio_enabled_var"].get()
         context_enabled = app_state.main_window_components["vars"]["context_var"].get()
         
+        _run_batch_thread(phrase_list, deck_name, audio_enabled, context_enabled)
+
+    def _run_batch_thread(phrase_list, deck_name, audio_enabled, context_enabled, job_id=None, retry_failed=False):
+        # Пакет важнее спекулятивного перевода — модель освобождается для него
+        speculative_generator.cancel()
         # Запускаем поток
         thread = threading.Thread(
             target=batch_processing_worker,
@@ -160,16 +176,32 @@ def main():
                 audio_enabled,
                 context_enabled,
                 get_current_ai_provider,
-                audio_utils
+                audio_utils,
+                job_id,
+                retry_failed
             ),
             daemon=True
         )
         thread.start()
 
+    def resume_batch_processing(retry_failed=False):
+        """Продолжает последнее незавершенное задание из журнала. Возвращает False, если продолжать нечего"""
+        if app_state.batch_running:
+            return False
+        job = batch_journal.latest_unfinished()
+        if not job or (retry_failed and not job["counts"].get(FAILED)):
+            app_state.results_queue.put(("batch_log", "ℹ️ Нет незавершенных пакетных заданий"))
+            return False
+        phrase_list = [item["phrase"] for item in batch_journal.items(job["id"])]
+        _run_batch_thread(phrase_list, job["deck_name"], bool(job["audio_enabled"]),
+                          bool(job["context_enabled"]), job["id"], retry_failed)
+        return True
+
     def stop_batch_processing():
         app_state.batch_running = False
 
     dependencies.start_batch_processing = start_batch_processing
+    dependencies.resume_batch_processing = resume_batch_processing
     dependencies.stop_batch_processing = stop_batch_processing
     
     # Generate action wrapper
@@ -203,8 +235,8 @@ def main():
         if not phrase or phrase == german_placeholder:
             return
 
-        # Запуск таймера сразу
-        app_state.generation_running = True
+        # Запуск таймера сразу (предыдущая генерация, если есть, отменяется)
+        request_id, cancel = app_state.start_generation()
         widgets["generate_btn"].configure(text="Отмена... 0s", state="normal", fg_color="#ff5555", hover_color="#d63c3c", text_color="white")
         
         start_time = time.time()
@@ -220,17 +252,35 @@ def main():
                 pass
         update_timer()
         
-        def _pre_generation_worker():
-            app_state.force_replace_flag = False
+        def _pre_generation_check():
+            """Точный дубликат в Anki, а если его нет — почти-дубликат по эмбеддингам"""
             existing_ids = anki_api.find_notes(phrase)
+            if existing_ids or not embedding_index.ready:
+                return existing_ids, []
+            return existing_ids, embedding_index.find_similar(phrase)
+        
+        def _pre_generation_done(future):
+            try:
+                existing_ids, similar = future.result()
+            except Exception:
+                existing_ids, similar = [], []
             
             def _continue_generation_on_main():
+                if cancel.cancelled:
+                    return
                 if existing_ids:
                     audio_utils.play_sound("notify")
                     if messagebox.askyesno("Дубликат", "Такая карточка уже есть в Anki.\nСгенерировать новую версию для замены?", parent=root):
                         app_state.force_replace_flag = True
                     else:
-                        app_state.generation_running = False
+                        app_state.stop_generation()
+                        widgets["generate_btn"].configure(text=localization_manager.get_text("generate"), state="normal", fg_color="#2CC985", hover_color="#26AD72", text_color="white")
+                        return
+                elif similar:
+                    _, similar_text, score = similar[0]
+                    audio_utils.play_sound("notify")
+                    if not messagebox.askyesno("Похожая карточка", f"В Anki уже есть похожая карточка ({score:.2f}):\n«{similar_text}»\n\nВсе равно сгенерировать?", parent=root):
+                        app_state.stop_generation()
                         widgets["generate_btn"].configure(text=localization_manager.get_text("generate"), state="normal", fg_color="#2CC985", hover_color="#26AD72", text_color="white")
                         return
 
@@ -239,11 +289,17 @@ def main():
                 with_context = app_state.get_checkbox_value("context_var", default=False)
                 print(f"🔄 Генерация: phrase={len(phrase)} chars, контекст={'☑ ВКЛ' if with_context else '☐ ВЫКЛ'}")
                 
-                threading.Thread(target=ask_ai_worker, args=(app_state.results_queue, phrase, with_context), daemon=True).start()
+                # Нажатие "Сгенерировать" для той же фразы — просьба о новом варианте, кэш не используем
+                use_cache = phrase != app_state.last_generated_phrase
+                app_state.last_generated_phrase = phrase
+                threading.Thread(target=ask_ai_worker, args=(app_state.results_queue, phrase, with_context, True, request_id, cancel, use_cache), daemon=True).start()
 
             root.after(0, _continue_generation_on_main)
 
-        threading.Thread(target=_pre_generation_worker, daemon=True).start()
+        # Проверка дубликата идет в общем пуле запросов к Anki (без отдельного потока)
+        app_state.force_replace_flag = False
+        pre_check = anki_api.submit(_pre_generation_check, callback=_pre_generation_done)
+        cancel.on_cancel(pre_check.cancel)
         
     dependencies.generate_action = generate_action_wrapper
     
@@ -298,6 +354,8 @@ def main():
     
     # Запускаем потоки
     threading.Thread(target=clipboard_worker, args=(app_state.clipboard_queue,), daemon=True).start()
+    threading.Thread(target=outbox_flush_worker, args=(app_state.results_queue,), daemon=True).start()
+    threading.Thread(target=ollama_keep_alive_worker, daemon=True).start()
     
     # Запускаем обработку очередей
     root.after(100, process_clipboard_queue, root)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетная обработка без графического интерфейса.
+Читает фразы из файла или stdin, берет настройки из anki_settings.txt
+и выводит ход работы в stdout строками JSON (по одному событию на строку).
+Прочий вывод приложения уходит в stderr.
+
+Примеры:
+    python -m modules.batch_generator.cli phrases.txt --deck "Deutsch"
+    cat phrases.txt | python -m modules.batch_generator.cli - --no-audio
+    python -m modules.batch_generator.cli --resume
+    python -m modules.batch_generator.cli --retry-failed
+    python -m modules.batch_generator.cli phrases.txt --apkg deutsch.apkg
+
+Коды выхода: 0 — все фразы обработаны, 1 — остались необработанные или
+с ошибкой (задание можно продолжить через --resume), 2 — неверные аргументы.
+"""
+import sys
+import json
+import queue
+import argparse
+import threading
+import contextlib
+
+# События конвейера -> имена событий в JSON
+EVENT_NAMES = {
+    "batch_log": "log",
+    "batch_log_append": "log_append",
+    "batch_progress": "progress",
+    "batch_stage": "stage",
+    "batch_apkg": "apkg",
+    "batch_done": "done",
+}
+
+
+def _read_phrases(source: str):
+    """Фразы по одной на строку из файла или stdin ('-')"""
+    if source == "-":
+        text = sys.stdin.read()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _to_event(message, data):
+    """Сообщение очереди воркера -> словарь события для JSON"""
+    event = {"event": EVENT_NAMES.get(message, message)}
+    if message == "batch_progress":
+        index, total, phrase = data
+        event.update(index=index, total=total, phrase=phrase)
+    elif message == "batch_stage":
+        event.update(data)
+    elif message in ("batch_log", "batch_log_append"):
+        event["message"] = data
+    elif message == "batch_apkg":
+        path, notes = data
+        event.update(path=path, notes=notes)
+    return event
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.batch_generator.cli",
+        description="Пакетное создание карточек Anki без графического интерфейса"
+    )
+    parser.add_argument("source", nargs="?", help="Файл с фразами (по одной на строку) или '-' для stdin")
+    parser.add_argument("--deck", help="Колода (по умолчанию — последняя выбранная в приложении)")
+    parser.add_argument("--audio", dest="audio", action="store_true", default=None, help="Озвучивать фразы")
+    parser.add_argument("--no-audio", dest="audio", action="store_false", help="Без озвучки")
+    parser.add_argument("--context", dest="context", action="store_true", default=None, help="Перевод с контекстом")
+    parser.add_argument("--no-context", dest="context", action="store_false", help="Только перевод")
+    parser.add_argument("--allow-duplicates", action="store_true", help="Не проверять дубликаты в Anki")
+    parser.add_argument("--apkg", metavar="FILE",
+                        help="Записать карточки в пакет .apkg (импорт в Anki без AnkiConnect)")
+    parser.add_argument("--model-id", type=int, metavar="ID",
+                        help="ID типа записи в вашей коллекции Anki для .apkg "
+                             "(иначе при импорте может появиться второй тип записи)")
+    parser.add_argument("--resume", action="store_true", help="Продолжить последнее незавершенное задание")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Повторить фразы с ошибкой из последнего незавершенного задания")
+    args = parser.parse_args(argv)
+    if not args.source and not (args.resume or args.retry_failed):
+        parser.error("укажите файл с фразами, '-' или --resume / --retry-failed")
+    return args
+
+
+def run(argv=None) -> int:
+    """Точка входа CLI. Возвращает код выхода"""
+    args = _parse_args(argv)
+    out = sys.stdout
+
+    def emit(event):
+        out.write(json.dumps(event, ensure_ascii=False) + "\n")
+        out.flush()
+
+    # Все print/debug_log приложения — в stderr, в stdout только JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        from core.settings_manager import load_settings
+        from core.app_state import app_state
+        from core.workers import get_current_ai_provider
+        from core import audio_utils
+        from api.anki_api import anki_api
+        from modules.batch_generator.logic import batch_processing_worker
+        from api.apkg_exporter import ApkgExporter
+        from modules.batch_generator.journal import batch_journal, DONE_STATES, FAILED
+
+        settings = load_settings(update_app_state=True)
+        app_state.check_duplicates = not args.allow_duplicates
+
+        retry_failed = args.retry_failed
+        if args.resume or retry_failed:
+            job = batch_journal.latest_unfinished()
+            if not job or (retry_failed and not job["counts"].get(FAILED)):
+                emit({"event": "error", "message": "Нет незавершенных пакетных заданий"})
+                return 1
+            phrase_list = [item["phrase"] for item in batch_journal.items(job["id"])]
+            deck_name = job["deck_name"]
+            audio_enabled = bool(job["audio_enabled"])
+            context_enabled = bool(job["context_enabled"])
+        else:
+            try:
+                phrase_list = _read_phrases(args.source)
+            except OSError as e:
+                emit({"event": "error", "message": str(e)})
+                return 2
+            if not phrase_list:
+                emit({"event": "error", "message": "Нет фраз для обработки"})
+                return 2
+            deck_name = anki_api.clean_deck_name(args.deck or settings["LAST_DECK"])
+            audio_enabled = settings["AUDIO_ENABLED"] if args.audio is None else args.audio
+            context_enabled = settings["CONTEXT_ENABLED"] if args.context is None else args.context
+            job = {"id": batch_journal.create_job(phrase_list, deck_name, audio_enabled, context_enabled)}
+
+        # Тип записи создается, как при запуске приложения (для .apkg Anki не нужен)
+        if not args.apkg:
+            anki_api.setup_model()
+
+        emit({"event": "start", "job_id": job["id"], "total": len(phrase_list), "deck": deck_name,
+              "audio": audio_enabled, "context": context_enabled, "retry_failed": retry_failed})
+
+        exporter = ApkgExporter(deck_name, model_id=args.model_id) if args.apkg else None
+        q = queue.Queue()
+        worker = threading.Thread(
+            target=batch_processing_worker,
+            args=(q, phrase_list, deck_name, audio_enabled, context_enabled,
+                  get_current_ai_provider, audio_utils, job["id"], retry_failed, exporter, args.apkg),
+            daemon=True
+        )
+        worker.start()
+
+        try:
+            while True:
+                try:
+                    message, data = q.get(timeout=0.5)
+                    if message == "batch_done":
+                        break
+                    if message in EVENT_NAMES:
+                        emit(_to_event(message, data))
+                except queue.Empty:
+                    continue
+                except KeyboardInterrupt:
+                    # Первый Ctrl-C — мягкая остановка: воркер отправит готовые заметки,
+                    # задание останется в журнале. Повторный — выход без ожидания
+                    if not app_state.batch_running:
+                        raise
+                    app_state.batch_running = False
+                    emit({"event": "interrupted"})
+            worker.join()
+        finally:
+            app_state.batch_running = False
+
+        counts = batch_journal.get_job(job["id"])["counts"]
+        remaining = sum(n for state, n in counts.items() if state not in DONE_STATES)
+        emit({"event": "done", "job_id": job["id"], "counts": counts})
+        return 1 if remaining else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
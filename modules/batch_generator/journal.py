@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал пакетных заданий (checkpoint).
+Каждый запуск пакетной обработки — задание на диске (SQLite) с состоянием
+каждой фразы. После сбоя, закрытия Anki или остановки задание можно продолжить:
+готовые фразы не генерируются и не отправляются в AnkiConnect повторно.
+"""
+import time
+import sqlite3
+from typing import Dict, List, Optional
+
+from core.logger import debug_log
+from core.sqlite_store import SQLiteStore
+
+JOURNAL_DB_NAME = "batch_jobs.sqlite3"
+MAX_JOBS = 20  # Сколько последних заданий хранить
+
+# Состояния фразы
+PENDING = "pending"      # Еще не обработана
+GENERATED = "generated"  # Есть перевод от AI
+AUDIO = "audio"          # Есть перевод и озвучка
+ADDED = "added"          # Добавлена в Anki
+QUEUED = "queued"        # Anki был недоступен, заметка сохранена в outbox и уйдет туда позже
+EXPORTED = "exported"    # Записана в пакет .apkg
+FAILED = "failed"        # Ошибка на одной из стадий
+DUPLICATE = "duplicate"  # Уже была в Anki
+
+# Фразы в этих состояниях при продолжении задания пропускаются
+# (QUEUED тоже: заметку отправит outbox, повторная генерация дала бы дубликат)
+DONE_STATES = (ADDED, QUEUED, EXPORTED, DUPLICATE)
+
+
+class BatchJournal(SQLiteStore):
+    """Постоянный журнал пакетных заданий и состояний их фраз"""
+
+    DB_NAME = JOURNAL_DB_NAME
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            deck_name TEXT NOT NULL,
+            audio_enabled INTEGER NOT NULL DEFAULT 0,
+            context_enabled INTEGER NOT NULL DEFAULT 0,
+            duplicates_checked INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running',
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            job_id INTEGER NOT NULL,
+            idx INTEGER NOT NULL,
+            phrase TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            translation TEXT,
+            context TEXT,
+            audio_path TEXT,
+            error TEXT,
+            PRIMARY KEY (job_id, idx)
+        );
+    """
+    ROW_FACTORY = sqlite3.Row
+
+    def create_job(self, phrases: List[str], deck_name: str,
+                   audio_enabled: bool, context_enabled: bool) -> int:
+        """
+        Создает задание со всеми фразами в состоянии pending.
+
+        Returns:
+            ID задания
+        """
+        now = time.time()
+        with self._db() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (deck_name, audio_enabled, context_enabled, created, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (deck_name, int(audio_enabled), int(context_enabled), now, now)
+            )
+            job_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO items (job_id, idx, phrase) VALUES (?, ?, ?)",
+                [(job_id, i, phrase) for i, phrase in enumerate(phrases)]
+            )
+            # Старые задания удаляем, чтобы журнал не рос бесконечно
+            stale = [(r[0],) for r in conn.execute(
+                "SELECT id FROM jobs ORDER BY id DESC LIMIT -1 OFFSET ?", (MAX_JOBS,)
+            )]
+            conn.executemany("DELETE FROM items WHERE job_id = ?", stale)
+            conn.executemany("DELETE FROM jobs WHERE id = ?", stale)
+        debug_log(f"💾 Пакетное задание #{job_id}: {len(phrases)} фраз", prefix="[BATCH]")
+        return job_id
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Задание с количеством фраз по состояниям (ключ 'counts')"""
+        with self._db() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return None
+            job = dict(row)
+            job["counts"] = {state: count for state, count in conn.execute(
+                "SELECT state, COUNT(*) FROM items WHERE job_id = ? GROUP BY state", (job_id,)
+            )}
+            return job
+
+    def latest_unfinished(self) -> Optional[Dict]:
+        """Последнее задание, в котором остались необработанные или неудачные фразы"""
+        if not self._exists():
+            return None
+        with self._db() as conn:
+            row = conn.execute(
+                f"SELECT job_id FROM items WHERE state NOT IN ({', '.join('?' * len(DONE_STATES))}) "
+                "ORDER BY job_id DESC LIMIT 1",
+                DONE_STATES
+            ).fetchone()
+        return self.get_job(row[0]) if row else None
+
+    def items(self, job_id: int) -> List[Dict]:
+        """Фразы задания по порядку"""
+        with self._db() as conn:
+            rows = conn.execute("SELECT * FROM items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+            return [dict(r) for r in rows]
+
+    def record(self, job_id: int, entries: List[Dict]):
+        """
+        Сохраняет новые состояния фраз одной транзакцией.
+        entries: словари с ключами idx, state и необязательными translation,
+        context, audio_path, error (отсутствующие поля не меняются, кроме error).
+        """
+        if not entries:
+            return
+        try:
+            with self._db() as conn:
+                conn.executemany(
+                    "UPDATE items SET state = ?, translation = COALESCE(?, translation), "
+                    "context = COALESCE(?, context), audio_path = COALESCE(?, audio_path), error = ? "
+                    "WHERE job_id = ? AND idx = ?",
+                    [(e["state"], e.get("translation"), e.get("context"), e.get("audio_path"),
+                      e.get("error"), job_id, e["idx"]) for e in entries]
+                )
+                conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+        except sqlite3.Error as e:
+            # Журнал не должен останавливать конвейер: в худшем случае фраза обработается повторно
+            debug_log(f"⚠️ Ошибка записи журнала задания: {e}", prefix="[BATCH]")
+
+    def mark_duplicates_checked(self, job_id: int, duplicate_indexes: List[int]):
+        """Запоминает результат проверки дубликатов, чтобы не повторять ее при продолжении"""
+        with self._db() as conn:
+            conn.executemany(
+                "UPDATE items SET state = ? WHERE job_id = ? AND idx = ?",
+                [(DUPLICATE, job_id, i) for i in duplicate_indexes]
+            )
+            conn.execute("UPDATE jobs SET duplicates_checked = 1 WHERE id = ?", (job_id,))
+
+    def reset_failed(self, job_id: int) -> List[int]:
+        """
+        Возвращает неудачные фразы в работу: с готовым переводом — в generated
+        (AI повторно не вызывается), без него — в pending.
+
+        Returns:
+            Номера сброшенных фраз
+        """
+        with self._db() as conn:
+            indexes = [r[0] for r in conn.execute(
+                "SELECT idx FROM items WHERE job_id = ? AND state = ?", (job_id, FAILED)
+            )]
+            conn.execute(
+                "UPDATE items SET state = CASE WHEN translation IS NULL THEN ? ELSE ? END, error = NULL "
+                "WHERE job_id = ? AND state = ?",
+                (PENDING, GENERATED, job_id, FAILED)
+            )
+            return indexes
+
+    def finish(self, job_id: int, status: str):
+        """Сохраняет итоговый статус задания ('done' или 'stopped')"""
+        with self._db() as conn:
+            conn.execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ?", (status, time.time(), job_id))
+
+
+# Глобальный экземпляр журнала
+batch_journal = BatchJournal()
@@ -1,116 +1,618 @@
 # -*- coding: utf-8 -*-
 import time
 import os
+import queue
+import threading
 from core.app_state import app_state
 from api.anki_api import anki_api
+from api.ai.base_provider import ProviderBusyError
+from api.embedding_index import embedding_index
+from core.anki_outbox import anki_outbox, is_connection_error, is_duplicate_error
+from modules.batch_generator import journal
+from modules.batch_generator.journal import batch_journal
 
-def batch_processing_worker(q, phrase_list, deck_name, audio_enabled, context_enabled, get_current_ai_provider_func, audio_utils_module):
+# Сколько готовых заметок копить перед одним запросом addNotes
+ANKI_FLUSH_SIZE = 10
+# Сколько коротких фраз переводить одним запросом к AI
+AI_PACK_SIZE = 8
+PACK_MAX_PHRASE_LEN = 200  # Длинные фразы переводятся по одной
+# Темп запросов к AI подстраивает _AdaptivePacer: без ограничений, пока провайдер не попросит замедлиться
+PACER_RATE_STEP = 0.5  # Аддитивное ускорение после успешного запроса (запросов/сек)
+PACER_MAX_RATE = 20.0  # Выше этой частоты интервал не выдерживается вовсе
+PACER_MIN_RATE = 1 / 60  # Самый медленный темп: запрос в минуту
+LATENCY_SPIKE = 3.0  # Задержка в N раз выше обычной — признак перегрузки
+MIN_MEASURED_LATENCY = 0.05  # Более быстрые ответы (кэш переводов) не учитываются в средней задержке
+MAX_BUSY_RETRIES = 5  # Повторов запроса при 429/5xx
+STAGE_QUEUE_SIZE = 16  # Емкость очередей между стадиями конвейера
+STAGE_REPORT_INTERVAL = 0.5  # Как часто отправлять в UI прогресс по стадиям (сек)
+
+
+def _remove_audio(audio_path):
+    """Удаляет временный аудиофайл после добавления в Anki"""
+    if audio_path and os.path.exists(audio_path):
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+
+
+def _flush_pending_notes(q, pending, deck_name):
+    """
+    Отправляет накопленные заметки в Anki одним запросом addNotes.
+    pending: список (phrase, translation, context, audio_path)
+    Возвращает (состояние журнала, ошибка) в порядке pending.
+    """
+    if not pending:
+        return []
+    
+    try:
+        # Аудио едет в самом addNotes (по пути к файлу), поле определяем один раз на всю пачку
+        audio_field = anki_api.resolve_audio_field() if any(p[3] for p in pending) else None
+        notes = [anki_api.build_note(
+            phrase, translation, context, deck_name, audio_path=audio_path,
+            allow_duplicate=not app_state.check_duplicates, audio_field=audio_field
+        ) for phrase, translation, context, audio_path in pending]
+        results = anki_api.add_notes(notes)
+    except Exception as e:
+        if is_connection_error(e):
+            return _enqueue_pending_notes(q, pending, deck_name)
+        results = [e] * len(pending)
+    
+    added = 0
+    outcomes = []
+    for (phrase, _, _, audio_path), result in zip(pending, results):
+        if isinstance(result, Exception):
+            short_phrase = (phrase[:40] + '...') if len(phrase) > 40 else phrase
+            q.put(("batch_log", f"❌ {short_phrase}: {result}"))
+            outcomes.append((_journal_state(str(result)), str(result)))
+        else:
+            added += 1
+            outcomes.append((journal.ADDED, None))
+        _remove_audio(audio_path)
+    
+    q.put(("batch_log", f"📇 Добавлено в Anki: {added}/{len(pending)}"))
+    pending.clear()
+    return outcomes
+
+
+def _journal_state(error):
+    """Состояние фразы в журнале по итогу addNotes (error — None или текст ошибки)"""
+    if not error:
+        return journal.ADDED
+    # Заметка уже есть в Anki — повторять ее при "Повторить ошибки" бессмысленно
+    return journal.DUPLICATE if is_duplicate_error(error) else journal.FAILED
+
+
+def _enqueue_pending_notes(q, pending, deck_name):
+    """Anki недоступен: сохраняем готовые заметки в outbox вместо потери генерации (в журнале — QUEUED)"""
+    outcomes = []
+    for phrase, translation, context, audio_path in pending:
+        try:
+            anki_outbox.enqueue(phrase, translation, context, deck_name, audio_path,
+                                allow_duplicate=not app_state.check_duplicates)
+            outcomes.append((journal.QUEUED, None))
+        except Exception as e:
+            q.put(("batch_log", f"❌ {phrase[:40]}: не удалось сохранить в очередь: {e}"))
+            _remove_audio(audio_path)
+            outcomes.append((journal.FAILED, str(e)))
+    q.put(("batch_log", f"📥 Anki недоступен — заметки сохранены в очередь ({anki_outbox.count()})"))
+    pending.clear()
+    return outcomes
+
+
+def _export_pending_notes(q, pending, exporter):
+    """
+    Режим .apkg: заметки копятся в ApkgExporter вместо отправки в AnkiConnect.
+    Аудио не удаляется — оно нужно при записи пакета.
+    """
+    for phrase, translation, context, audio_path in pending:
+        exporter.add_note(phrase, translation, context, audio_path)
+    q.put(("batch_log", f"📦 В пакет .apkg: {len(exporter.notes)}"))
+    pending.clear()
+
+
+def _write_package(q, exporter, apkg_path, job_id, indexes):
+    """
+    Записывает пакет .apkg и только после этого отмечает его фразы в журнале как EXPORTED.
+    При ошибке записи фразы остаются GENERATED/AUDIO — задание можно продолжить.
+    Аудио удаляется, когда задание завершено: до этого оно нужно для перезаписи пакета.
+    """
+    try:
+        exporter.write(apkg_path)
+    except OSError as e:
+        q.put(("batch_log", f"❌ Не удалось записать {apkg_path}: {e}"))
+        return False
+    batch_journal.record(job_id, [{"idx": i, "state": journal.EXPORTED} for i in indexes])
+    q.put(("batch_apkg", (apkg_path, len(exporter.notes))))
+    counts = (batch_journal.get_job(job_id) or {}).get("counts", {})
+    if not any(n for state, n in counts.items() if state not in journal.DONE_STATES):
+        for note in exporter.notes:
+            _remove_audio(note.audio_path)
+    return True
+
+
+def _translate_pack(q, provider, model, phrases, context_enabled, pacer):
+    """
+    Переводит группу фраз одним пакетным запросом.
+    Возвращает {фраза: (перевод, контекст)} для успешно разобранных фраз.
+    """
+    prompt = app_state.context_prompt if context_enabled else app_state.translate_prompt
+    try:
+        results = _call_ai(q, pacer, lambda: provider.translate_batch(
+            phrases, prompt, model,
+            with_context=context_enabled, delimiter=app_state.context_delimiter
+        ))
+        if results is STOPPED:
+            return {}
+    except Exception as e:
+        q.put(("batch_log", f"⚠️ Пакетный запрос не удался ({e}), фразы будут переведены по одной"))
+        return {}
+    packed = {phrase: result for phrase, result in zip(phrases, results) if result}
+    if len(packed) < len(phrases):
+        q.put(("batch_log", f"⚠️ Пакет: разобрано {len(packed)}/{len(phrases)}, остальные — по одной"))
+    return packed
+
+
+STOPPED = object()  # Фраза не обработана из-за остановки
+DUPLICATE = object()  # Фраза пропущена как дубликат
+
+
+def _wait_while_paused():
+    """Ждет снятия паузы. Возвращает False, если обработку остановили"""
+    while app_state.batch_paused and app_state.batch_running:
+        time.sleep(0.2)
+    return app_state.batch_running
+
+
+class _AdaptivePacer:
+    """
+    Адаптивный темп запросов к AI для всех потоков пула (AIMD):
+    каждый успешный запрос увеличивает частоту на PACER_RATE_STEP (аддитивно),
+    ответ 429/5xx делит ее пополам (мультипликативно) и выдерживает
+    Retry-After / X-RateLimit-Reset. Рост задержки ответа в LATENCY_SPIKE раз
+    относительно обычной слегка снижает частоту.
+    """
+    
+    def __init__(self, provider=None):
+        self.rate = float("inf")  # Запросов в секунду
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+        self._latency = None  # Скользящее среднее задержки успешных запросов
+    
+    def wait(self):
+        """Ждет своей очереди на запрос. Возвращает False, если обработку остановили"""
+        with self._lock:
+            reset = getattr(self.provider, "rate_limit_reset", 0.0)
+            start = max(time.time(), self._next_time, reset)
+            self._next_time = start + self.interval
+        while time.time() < start:
+            if not app_state.batch_running:
+                return False
+            time.sleep(min(0.1, start - time.time()))
+        return _wait_while_paused()
+    
+    @property
+    def interval(self):
+        return 0.0 if self.rate == float("inf") else 1 / self.rate
+    
+    def on_success(self, latency):
+        with self._lock:
+            if self._latency is not None and latency > self._latency * LATENCY_SPIKE:
+                self.rate = max(PACER_MIN_RATE, min(self.rate, PACER_MAX_RATE) - PACER_RATE_STEP)
+            elif self.rate != float("inf"):
+                self.rate += PACER_RATE_STEP
+                if self.rate >= PACER_MAX_RATE:
+                    self.rate = float("inf")
+            if latency >= MIN_MEASURED_LATENCY:
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+    
+    def on_busy(self, retry_after=None):
+        """Замедление после 429/5xx. Возвращает паузу перед следующим запросом (сек)"""
+        with self._lock:
+            self.rate = max(PACER_MIN_RATE, min(self.rate, PACER_MAX_RATE) / 2)
+            pause = retry_after if retry_after is not None else self.interval
+            self._next_time = max(self._next_time, time.time() + pause)
+            return pause
+
+
+def _wait_between_requests(pacer):
+    """Пауза перед запросом к AI (с учетом паузы и остановки пакета)"""
+    return _wait_while_paused() and pacer.wait()
+
+
+def _call_ai(q, pacer, request):
+    """
+    Выполняет запрос к AI в темпе pacer. При 429/5xx замедляется и повторяет запрос.
+    Возвращает результат request() или STOPPED, если обработку остановили.
+    """
+    for attempt in range(MAX_BUSY_RETRIES + 1):
+        if not _wait_between_requests(pacer):
+            return STOPPED
+        started = time.time()
+        try:
+            result = request()
+        except ProviderBusyError as e:
+            if attempt == MAX_BUSY_RETRIES:
+                raise
+            pause = pacer.on_busy(e.retry_after)
+            q.put(("batch_log", f"⏳ Провайдер занят ({e.status}), пауза {pause:.1f} сек"))
+            continue
+        pacer.on_success(time.time() - started)
+        return result
+
+
+def _make_chunks(phrase_list, duplicates, selected=None, known=None):
+    """
+    Делит список на порции работы для пула: подряд идущие короткие фразы — пакетом
+    до AI_PACK_SIZE, длинная фраза, уже переведенная фраза (known) или дубликат — отдельно.
+    selected: номера фраз для обработки (None — все).
+    Элемент порции: (номер фразы, фраза).
+    """
+    known = known or {}
+    chunks, group = [], []
+    for i, phrase in enumerate(phrase_list):
+        phrase = phrase.strip()
+        if not phrase or (selected is not None and i not in selected):
+            continue
+        if phrase in duplicates or i in known or len(phrase) > PACK_MAX_PHRASE_LEN:
+            if group:
+                chunks.append(group)
+                group = []
+            chunks.append([(i, phrase)])
+            continue
+        group.append((i, phrase))
+        if len(group) >= AI_PACK_SIZE:
+            chunks.append(group)
+            group = []
+    if group:
+        chunks.append(group)
+    return chunks
+
+
+def _generate_chunk(q, chunk, duplicates, provider, model, pacer, context_enabled, known=None):
+    """
+    Стадия генерации: перевод порции фраз (пакетом или по одной).
+    known: {номер фразы: (перевод, контекст)} из журнала — такие фразы AI не переводит.
+    Возвращает список результатов в порядке фраз: (перевод, контекст),
+    Exception, STOPPED или DUPLICATE.
+    """
+    phrases = [phrase for _, phrase in chunk]
+    if len(phrases) == 1 and phrases[0] in duplicates:
+        return [DUPLICATE]
+    if len(chunk) == 1 and known and chunk[0][0] in known:
+        return [known[chunk[0][0]]]
+    
+    packed = {}
+    if len(phrases) > 1:
+        packed = _translate_pack(q, provider, model, phrases, context_enabled, pacer)
+    
+    outcomes = []
+    for phrase in phrases:
+        if phrase in packed:
+            outcomes.append(packed[phrase])
+            continue
+        try:
+            if context_enabled:
+                outcomes.append(_call_ai(q, pacer, lambda: provider.translate_with_context(
+                    phrase, app_state.context_prompt, model,
+                    delimiter=app_state.context_delimiter
+                )))
+            else:
+                outcomes.append(_call_ai(q, pacer, lambda: provider.translate(
+                    phrase, app_state.translate_prompt, model
+                )))
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+class _StageCounters:
+    """Счетчики готовых фраз по стадиям конвейера (для прогресса в UI)"""
+    
+    def __init__(self, total):
+        self.total = total
+        self._lock = threading.Lock()
+        self.counts = {"ai": 0, "tts": 0, "anki": 0}
+    
+    def add(self, stage, n=1):
+        with self._lock:
+            self.counts[stage] += n
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts, total=self.total)
+
+
+def batch_processing_worker(q, phrase_list, deck_name, audio_enabled, context_enabled, get_current_ai_provider_func, audio_utils_module,
+                            job_id=None, retry_failed=False, exporter=None, apkg_path=None):
     """
     Чистая логика пакетной обработки.
     Не зависит от UI напрямую, общается через очередь q.
+    
+    Конвейер из стадий с ограниченными очередями между ними:
+    дубликаты (один запрос заранее) -> генерация AI (пул app_state.batch_parallel потоков)
+    -> озвучка (отдельный поток) -> добавление в Anki (этот поток, пачками addNotes).
+    Пока фраза i озвучивается и добавляется, фраза i+1 уже генерируется;
+    лог и добавление в Anki идут строго в исходном порядке.
+    
+    Состояние каждой фразы пишется в журнал задания (batch_journal).
+    job_id: продолжить существующее задание (phrase_list — его фразы по порядку);
+    готовые фразы пропускаются, переведенные не отправляются в AI повторно.
+    retry_failed: обработать только фразы, завершившиеся ошибкой.
+    exporter: ApkgExporter — заметки собираются в него, а не отправляются в Anki;
+    в конце пакет записывается в apkg_path. Фразы, записанные в пакет прошлыми
+    запусками задания, попадают в него снова, чтобы файл не потерял их при перезаписи.
     """
     app_state.batch_running = True
     total = len(phrase_list)
     
-    q.put(("batch_log", f"🚀 Начало обработки {total} фраз..."))
+    if job_id is None:
+        job_id = batch_journal.create_job([p.strip() for p in phrase_list], deck_name, audio_enabled, context_enabled)
+    selected = set(batch_journal.reset_failed(job_id)) if retry_failed else None
+    job = batch_journal.get_job(job_id)
+    items = batch_journal.items(job_id)
+    if selected is None:
+        selected = {item["idx"] for item in items
+                    if item["state"] not in journal.DONE_STATES and item["state"] != journal.FAILED}
+    # Результаты прошлых запусков: перевод и озвучка не повторяются
+    known = {
+        item["idx"]: (item["translation"], item["context"] or "") for item in items
+        if item["idx"] in selected and item["state"] in (journal.GENERATED, journal.AUDIO)
+    }
+    known_audio = {
+        item["idx"]: item["audio_path"] for item in items
+        if item["idx"] in known and item["state"] == journal.AUDIO
+        and item["audio_path"] and os.path.exists(item["audio_path"])
+    }
     
-    for i, phrase in enumerate(phrase_list):
-        if not app_state.batch_running:
-            q.put(("batch_log", "🛑 Обработка прервана."))
-            break
-        
-        # Проверка паузы
-        if app_state.batch_paused:
-            q.put(("batch_log", f"⏸ Пауза перед фразой: {phrase[:30]}..."))
-            while app_state.batch_paused:
-                time.sleep(0.2)
-                if not app_state.batch_running:
-                    break
-            if app_state.batch_running:
-                q.put(("batch_log", "▶ Продолжение работы..."))
+    exported = []  # Номера фраз, собранных в пакет .apkg этим запуском
+    if exporter is not None:
+        for item in items:
+            if item["state"] == journal.EXPORTED:
+                audio_path = item["audio_path"] if item["audio_path"] and os.path.exists(item["audio_path"]) else None
+                exporter.add_note(item["phrase"], item["translation"] or "", item["context"] or "", audio_path)
+        if exporter.notes:
+            q.put(("batch_log", f"📦 Из прошлых запусков в пакете: {len(exporter.notes)}"))
+    
+    q.put(("batch_log", f"🚀 Начало обработки {len(selected)} фраз..."))
+    if len(selected) < total:
+        q.put(("batch_log", f"⏭ Задание #{job_id}: пропущено уже обработанных фраз: {total - len(selected)}"))
+    
+    # Стадия 1. Проверка дубликатов сразу для всего списка (один запрос multi вместо N).
+    # Результат сохраняется в журнале: при продолжении задания AnkiConnect не опрашивается
+    # Затем почти-дубликаты по эмбеддингам среди оставшихся фраз (если индекс включен):
+    # пропускаются только при NEAR_DUPLICATE_SKIP, иначе обрабатываются с пометкой в журнале
+    duplicates = {}
+    similar = {}
+    if app_state.check_duplicates and not job["duplicates_checked"]:
+        duplicates = anki_api.find_notes_bulk([phrase_list[i].strip() for i in sorted(selected)])
+        if embedding_index.ready:
+            similar = embedding_index.find_similar_bulk(
+                [phrase_list[i].strip() for i in sorted(selected) if phrase_list[i].strip() not in duplicates]
+            )
+            if app_state.near_duplicate_skip:
+                duplicates.update({phrase: [m[0] for m in matches] for phrase, matches in similar.items()})
+        batch_journal.mark_duplicates_checked(
+            job_id, [i for i in selected if phrase_list[i].strip() in duplicates]
+        )
+    
+    provider = get_current_ai_provider_func()
+    
+    # Определяем модель в зависимости от провайдера
+    if provider.name == "Ollama":
+        model = app_state.ollama_model
+    elif provider.name == "OpenRouter":
+        model = app_state.openrouter_model
+    else:
+        model = None  # Провайдер сам определит модель
+    
+    workers = app_state.batch_parallel.get(provider.name, 1)
+    pacer = _AdaptivePacer(provider)
+    if workers > 1:
+        q.put(("batch_log", f"⚙️ Параллельных запросов: {workers}"))
+    
+    chunks = _make_chunks(phrase_list, duplicates, selected, known)
+    counters = _StageCounters(sum(len(c) for c in chunks))
+    
+    chunk_queue = queue.Queue(maxsize=workers * 2)
+    tts_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    done_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    
+    def feed_stage():
+        # Порции нумеруются подряд: seq задает исходный порядок фраз
+        seq = 0
+        for chunk in chunks:
+            if not app_state.batch_running:
+                break
+            chunk_queue.put((seq, chunk))
+            seq += len(chunk)
+        for _ in range(workers):
+            chunk_queue.put(None)
+    
+    generation_left = [workers]
+    generation_lock = threading.Lock()
+    
+    def generation_stage():
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                break
+            seq, chunk = item
+            try:
+                outcomes = _generate_chunk(q, chunk, duplicates, provider, model, pacer, context_enabled, known)
+            except Exception as e:
+                outcomes = [e] * len(chunk)
+            entries = []
+            for (i, _), outcome in zip(chunk, outcomes):
+                if i in known:
+                    continue
+                if isinstance(outcome, tuple):
+                    entries.append({"idx": i, "state": journal.GENERATED,
+                                    "translation": outcome[0], "context": outcome[1]})
+                elif isinstance(outcome, Exception):
+                    entries.append({"idx": i, "state": journal.FAILED, "error": str(outcome)})
+            batch_journal.record(job_id, entries)
+            for offset, ((i, phrase), outcome) in enumerate(zip(chunk, outcomes)):
+                if isinstance(outcome, tuple):
+                    counters.add("ai")
+                tts_queue.put((seq + offset, i, phrase, outcome))
+        with generation_lock:
+            generation_left[0] -= 1
+            if generation_left[0] == 0:
+                tts_queue.put(None)
+    
+    def tts_stage():
+        while True:
+            item = tts_queue.get()
+            if item is None:
+                done_queue.put(None)
+                break
+            seq, i, phrase, outcome = item
+            if isinstance(outcome, tuple):
+                translation, context = outcome
+                audio_path = known_audio.get(i) if audio_enabled else None
+                if audio_enabled and not audio_path and not _wait_while_paused():
+                    # Остановлено до озвучки: без аудио в Anki не отправляем,
+                    # в журнале фраза остается GENERATED и озвучится при продолжении
+                    done_queue.put((seq, i, phrase, STOPPED))
+                    continue
+                if audio_enabled and not audio_path:
+                    try:
+                        audio_path = audio_utils_module.generate_audio(
+                            phrase, 
+                            app_state.tts.lang, 
+                            app_state.tts.speed_level, 
+                            app_state.tts.tld
+                        )
+                    except Exception as e:
+                        outcome = e
+                if isinstance(outcome, tuple):
+                    outcome = (translation, context, audio_path)
+                    counters.add("tts")
+                    if audio_path and i not in known_audio:
+                        batch_journal.record(job_id, [{"idx": i, "state": journal.AUDIO, "audio_path": audio_path}])
+                else:
+                    batch_journal.record(job_id, [{"idx": i, "state": journal.FAILED, "error": str(outcome)}])
+            done_queue.put((seq, i, phrase, outcome))
+    
+    threads = [threading.Thread(target=feed_stage, daemon=True), threading.Thread(target=tts_stage, daemon=True)]
+    threads += [threading.Thread(target=generation_stage, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    
+    # Стадия 4. Добавление в Anki и лог в исходном порядке
+    pending = []
+    pending_indexes = []
+    reorder = {}
+    next_seq = 0
+    stopped_logged = False
+    paused_logged = False
+    last_report = 0.0
+    finished = False
+    
+    def flush():
+        counters.add("anki", len(pending))
+        indexes = list(pending_indexes)
+        pending_indexes.clear()
+        if exporter is not None:
+            # В журнал — только после записи пакета (см. _write_package)
+            if pending:
+                _export_pending_notes(q, pending, exporter)
+                exported.extend(indexes)
+            return
+        outcomes = _flush_pending_notes(q, pending, deck_name)
+        batch_journal.record(job_id, [
+            {"idx": i, "state": state, "error": error}
+            for i, (state, error) in zip(indexes, outcomes)
+        ])
+    
+    def emit(seq_item):
+        nonlocal stopped_logged
+        _, i, phrase, outcome = seq_item
+        if outcome is STOPPED:
+            if not stopped_logged:
+                q.put(("batch_log", "🛑 Обработка прервана."))
+                stopped_logged = True
+            return
         
-        if not app_state.batch_running:
-            q.put(("batch_log", "🛑 Обработка прервана."))
-            break
-            
-        phrase = phrase.strip()
-        if not phrase:
-            continue
-            
         q.put(("batch_progress", (i + 1, total, phrase)))
         
-        # Начало логирования фразы (одна строка на фразу)
+        # Одна строка на фразу
         short_phrase = (phrase[:40] + '...') if len(phrase) > 40 else phrase
         q.put(("batch_log", f"{short_phrase}:"))
         
+        if outcome is DUPLICATE and phrase in similar:
+            _, similar_text, score = similar[phrase][0]
+            short_similar = (similar_text[:40] + '...') if len(similar_text) > 40 else similar_text
+            q.put(("batch_log_append", f"≈ Похоже на «{short_similar}» ({score:.2f}) — пропущено"))
+        elif outcome is DUPLICATE:
+            q.put(("batch_log_append", "⚠️ Дубликат (пропущено)"))
+        elif isinstance(outcome, Exception):
+            q.put(("batch_log_append", f"❌ Ошибка: {str(outcome)}"))
+        else:
+            translation, context, audio_path = outcome
+            # Заметка ждет пакетной отправки в Anki (addNotes)
+            pending.append((phrase, translation, context, audio_path))
+            pending_indexes.append(i)
+            q.put(("batch_log_append", "🤖" + ("🔊" if audio_path else "") + " 📥 Готово"))
+            if phrase in similar:
+                _, similar_text, score = similar[phrase][0]
+                short_similar = (similar_text[:40] + '...') if len(similar_text) > 40 else similar_text
+                q.put(("batch_log_append", f"≈ похоже на «{short_similar}» ({score:.2f})"))
+        
+        if len(pending) >= ANKI_FLUSH_SIZE:
+            flush()
+    
+    while not finished:
+        # Проверка паузы
+        if app_state.batch_paused and app_state.batch_running and not paused_logged:
+            q.put(("batch_log", "⏸ Пауза..."))
+            paused_logged = True
+        elif paused_logged and not app_state.batch_paused:
+            if app_state.batch_running:
+                q.put(("batch_log", "▶ Продолжение работы..."))
+            paused_logged = False
+        
         try:
-            # 1. Проверка дубликата
-            if app_state.check_duplicates:
-                existing = anki_api.find_notes(phrase)
-                if existing:
-                    q.put(("batch_log_append", "⚠️ Дубликат (пропущено)"))
-                    continue
-            
-            # 2. Генерация через AI
-            q.put(("batch_log_append", "🤖"))
-            provider = get_current_ai_provider_func()
-            
-            # Определяем модель в зависимости от провайдера
-            if provider.name == "Ollama":
-                model = app_state.ollama_model
-            elif provider.name == "OpenRouter":
-                model = app_state.openrouter_model
-            else:
-                model = None  # Провайдер сам определит модель
-            
-            if context_enabled:
-                translation, context = provider.translate_with_context(
-                    phrase, app_state.context_prompt, model,
-                    delimiter=app_state.context_delimiter
-                )
-            else:
-                translation, context = provider.translate(
-                    phrase, app_state.translate_prompt, model
-                )
-            
-            # 3. Озвучка
-            audio_path = None
-            if audio_enabled:
-                q.put(("batch_log_append", "🔊"))
-                audio_path = audio_utils_module.generate_audio(
-                    phrase, 
-                    app_state.tts.lang, 
-                    app_state.tts.speed_level, 
-                    app_state.tts.tld
-                )
-            
-            # 4. Добавление в Anki
-            q.put(("batch_log_append", "📇"))
-            anki_api.add_note(phrase, translation, context, deck_name, audio_path, allow_duplicate=not app_state.check_duplicates)
-            
-            # Очистка аудио
-            if audio_path and os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                except OSError:
-                    pass
-                
-            q.put(("batch_log_append", "✅ Готово"))
-            
-        except Exception as e:
-            q.put(("batch_log_append", f"❌ Ошибка: {str(e)}"))
-            
-        # Пауза 3 секунды между фразами
-        if i < total - 1 and app_state.batch_running:
-            # q.put(("batch_log", "⏳ Ожидание 3 сек..."))
-            for _ in range(30): 
-                if not app_state.batch_running: break
-                # Если во время ожидания нажали паузу - заходим в цикл ожидания паузы
-                if app_state.batch_paused:
-                    while app_state.batch_paused:
-                        time.sleep(0.2)
-                        if not app_state.batch_running: break
-                time.sleep(0.1)
+            item = done_queue.get(timeout=STAGE_REPORT_INTERVAL)
+        except queue.Empty:
+            item = False
+        
+        if item is None:
+            finished = True
+        elif item:
+            reorder[item[0]] = item
+            while next_seq in reorder:
+                emit(reorder.pop(next_seq))
+                next_seq += 1
+        
+        now = time.time()
+        if finished or now - last_report >= STAGE_REPORT_INTERVAL:
+            q.put(("batch_stage", counters.snapshot()))
+            last_report = now
+    
+    # После остановки часть номеров могла не прийти — выводим оставшееся по порядку
+    for seq in sorted(reorder):
+        emit(reorder[seq])
+    
+    stopped = not app_state.batch_running
+    if stopped and not stopped_logged:
+        q.put(("batch_log", "🛑 Обработка прервана."))
+    
+    # Отправляем остаток (в т.ч. после остановки — сгенерированное не теряем)
+    flush()
+    q.put(("batch_stage", counters.snapshot()))
+    if exporter is not None and (exported or exporter.notes):
+        _write_package(q, exporter, apkg_path, job_id, exported)
+    
+    batch_journal.finish(job_id, "stopped" if stopped else "done")
+    counts = (batch_journal.get_job(job_id) or {}).get("counts", {})
+    failed = counts.get(journal.FAILED, 0)
+    unfinished = sum(n for state, n in counts.items() if state not in journal.DONE_STATES) - failed
+    if failed or unfinished:
+        q.put(("batch_log", f"💾 Задание #{job_id}: не завершено {unfinished}, с ошибкой {failed} — "
+                            f"его можно продолжить или повторить ошибки"))
                 
     app_state.batch_running = False
     app_state.batch_paused = False
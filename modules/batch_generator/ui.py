@@ -7,7 +7,7 @@ from core.clipboard_manager import setup_text_widget_context_menu
 from core.localization import localization_manager
 
 class BatchSidebarPanel(ctk.CTkFrame):
-    def __init__(self, parent, start_callback, stop_callback):
+    def __init__(self, parent, start_callback, stop_callback, resume_callback=None):
         # Инициализируем как полноценный фрейм (не прозрачный), чтобы он выглядел как левая панель
         super().__init__(parent)
         self.parent = parent
@@ -131,13 +131,7 @@ class BatchSidebarPanel(ctk.CTkFrame):
                 if not text.strip() or text.strip() == self.placeholder_text:
                     return
                 
-                self.button_state = "pause"
-                self.start_btn.configure(
-                    text=localization_manager.get_text("batch_pause"),
-                    fg_color="#F59E0B",
-                    hover_color="#D97706"
-                )
-                self.stop_btn.configure(state="normal")
+                self._set_running_state()
                 app_state.batch_paused = False
                 start_callback(text)
                 
@@ -199,6 +193,38 @@ class BatchSidebarPanel(ctk.CTkFrame):
             command=on_stop_click
         )
         self.stop_btn.pack(side="left")
+        
+        # Продолжение прерванного задания из журнала
+        def on_resume_click(retry_failed):
+            from core.app_state import app_state
+            if self.button_state != "start" or not resume_callback:
+                return
+            app_state.batch_paused = False
+            if resume_callback(retry_failed):
+                self._set_running_state()
+        
+        resume_frame = ctk.CTkFrame(self, fg_color="transparent")
+        resume_frame.pack(fill="x", padx=5)
+        self.resume_btn = ctk.CTkButton(
+            resume_frame,
+            text=localization_manager.get_text("batch_resume"),
+            height=28,
+            fg_color="transparent",
+            border_width=1,
+            text_color=("gray10", "gray90"),
+            command=lambda: on_resume_click(False)
+        )
+        self.resume_btn.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.retry_failed_btn = ctk.CTkButton(
+            resume_frame,
+            text=localization_manager.get_text("batch_retry_failed"),
+            height=28,
+            fg_color="transparent",
+            border_width=1,
+            text_color=("gray10", "gray90"),
+            command=lambda: on_resume_click(True)
+        )
+        self.retry_failed_btn.pack(side="left", fill="x", expand=True)
 
         # 4. Прогресс
         progress_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -207,6 +233,10 @@ class BatchSidebarPanel(ctk.CTkFrame):
         self.progress_bar = ctk.CTkProgressBar(progress_frame)
         self.progress_bar.pack(fill="x", side="top", pady=(0, 5))
         self.progress_bar.set(0)
+        
+        # Прогресс по стадиям конвейера (AI / озвучка / Anki)
+        self.stage_label = ctk.CTkLabel(progress_frame, text="", font=("Roboto", 11), anchor="w")
+        self.stage_label.pack(fill="x", side="top")
 
         # 5. Лог
         self.log_title_label = ctk.CTkLabel(self, text=localization_manager.get_text("batch_log_title"), font=("Roboto", 12, "bold"))
@@ -223,6 +253,7 @@ class BatchSidebarPanel(ctk.CTkFrame):
             "batch_start_btn": self.start_btn,
             "batch_stop_btn": self.stop_btn,
             "batch_progress_bar": self.progress_bar,
+            "batch_stage_label": self.stage_label,
             "batch_log": self.batch_log
         })
 
@@ -245,6 +276,8 @@ class BatchSidebarPanel(ctk.CTkFrame):
             elif self.button_state == "continue":
                 self.start_btn.configure(text=localization_manager.get_text("batch_continue"))
             self.stop_btn.configure(text=localization_manager.get_text("batch_stop"))
+            self.resume_btn.configure(text=localization_manager.get_text("batch_resume"))
+            self.retry_failed_btn.configure(text=localization_manager.get_text("batch_retry_failed"))
             # Обновляем кнопку собирателя
             col_var = tvars.get("collector_mode_var")
             if col_var and col_var.get():
@@ -254,6 +287,16 @@ class BatchSidebarPanel(ctk.CTkFrame):
         
         localization_manager.add_observer(_on_language_change)
         
+    def _set_running_state(self):
+        """Переводит кнопки в состояние выполнения (Пауза / Стоп)"""
+        self.button_state = "pause"
+        self.start_btn.configure(
+            text=localization_manager.get_text("batch_pause"),
+            fg_color="#F59E0B",
+            hover_color="#D97706"
+        )
+        self.stop_btn.configure(state="normal")
+
     def reset_state(self):
         """Сбрасывает состояние кнопок к исходному"""
         self.button_state = "start"
@@ -427,6 +470,6 @@ class BatchSidebarPanel(ctk.CTkFrame):
         # Запускаем в отдельном потоке
         threading.Thread(target=worker, daemon=True).start()
 
-def create_batch_panel(parent, start_callback, stop_callback):
+def create_batch_panel(parent, start_callback, stop_callback, resume_callback=None):
     """Создает и возвращает панель пакетной обработки"""
-    return BatchSidebarPanel(parent, start_callback, stop_callback)
+    return BatchSidebarPanel(parent, start_callback, stop_callback, resume_callback)
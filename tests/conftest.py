@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов.
+Тесты не требуют запущенных Anki, Ollama и GUI: пользовательские файлы
+(кэши, очереди, журнал, логи) пишутся во временную папку теста.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Синглтоны (prompts_manager и др.) обращаются к папке данных уже при импорте —
+# до фикстуры user_dir. Без APPDATA (Linux/macOS) она создавалась бы в корне проекта
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="lerne-tests-")
+atexit.register(shutil.rmtree, os.environ["APPDATA"], True)
+
+from api.ai.base_provider import BaseAIProvider  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def user_dir(tmp_path, monkeypatch):
+    """Папка данных приложения во временной директории теста"""
+    from core import settings_manager
+    from core.anki_outbox import anki_outbox
+    from api.ai.translation_cache import translation_cache
+    from api.embedding_index import embedding_index
+    from modules.batch_generator.journal import batch_journal
+
+    data_dir = tmp_path / "data_dir"
+    data_dir.mkdir()
+    monkeypatch.setattr(settings_manager, "get_base_data_dir", lambda: str(data_dir))
+    # Глобальные хранилища запоминают путь к БД при первом обращении — сбрасываем
+    for store in (anki_outbox, translation_cache, embedding_index.cache, batch_journal):
+        monkeypatch.setattr(store, "_db_path", None)
+        monkeypatch.setattr(store, "_initialized", False)
+    return data_dir
+
+
+class FakeProvider(BaseAIProvider):
+    """
+    Провайдер AI без сети: generate отвечает функцией respond(prompt).
+    Разбор ответов, кэш и пакетные промпты — настоящие из BaseAIProvider.
+    """
+
+    def __init__(self, respond, name="Fake", local=True):
+        self.respond = respond
+        self._name = name
+        self._local = local
+        self.prompts = []
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def is_local(self):
+        return self._local
+
+    def is_available(self):
+        return True
+
+    def get_models(self):
+        return ["fake"]
+
+    def generate(self, prompt, model=None, timeout=45, cancel=None, json_schema=None):
+        self.prompts.append(prompt)
+        return self.respond(prompt)
+
+
+@pytest.fixture
+def fake_provider():
+    """Класс FakeProvider для тестов, которым нужен AI"""
+    return FakeProvider
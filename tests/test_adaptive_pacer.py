@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Тесты адаптивного темпа запросов пакетного режима (AIMD)"""
+import queue
+import time
+
+import pytest
+
+from api.ai.base_provider import ProviderBusyError
+from core.app_state import app_state
+from modules.batch_generator.logic import (
+    LATENCY_SPIKE, PACER_MAX_RATE, PACER_MIN_RATE, PACER_RATE_STEP, STOPPED, _AdaptivePacer, _call_ai,
+)
+
+
+@pytest.fixture(autouse=True)
+def running_batch(monkeypatch):
+    monkeypatch.setattr(app_state, "batch_running", True)
+    monkeypatch.setattr(app_state, "batch_paused", False)
+
+
+def test_unlimited_until_first_busy():
+    pacer = _AdaptivePacer()
+
+    pacer.on_success(0.5)
+    assert pacer.interval == 0.0
+
+    pause = pacer.on_busy()
+    assert pacer.rate == PACER_MAX_RATE / 2
+    assert pause == pytest.approx(1 / pacer.rate)
+
+
+def test_additive_increase_multiplicative_decrease():
+    pacer = _AdaptivePacer()
+    pacer.on_busy()
+    pacer.on_busy()
+    assert pacer.rate == PACER_MAX_RATE / 4
+
+    pacer.on_success(0.5)
+    assert pacer.rate == PACER_MAX_RATE / 4 + PACER_RATE_STEP
+
+    # Достаточно успехов — ограничение снимается полностью
+    for _ in range(int(PACER_MAX_RATE / PACER_RATE_STEP)):
+        pacer.on_success(0.5)
+    assert pacer.rate == float("inf")
+
+
+def test_rate_never_drops_below_minimum():
+    pacer = _AdaptivePacer()
+    for _ in range(20):
+        pacer.on_busy()
+    assert pacer.rate == PACER_MIN_RATE
+
+
+def test_retry_after_sets_pause():
+    pacer = _AdaptivePacer()
+
+    assert pacer.on_busy(retry_after=7) == 7
+    assert pacer._next_time >= time.time() + 6
+
+
+def test_latency_spike_slows_down():
+    pacer = _AdaptivePacer()
+    pacer.on_success(0.2)
+    rate = pacer.rate
+
+    pacer.on_success(0.2 * LATENCY_SPIKE * 2)
+
+    assert pacer.rate < min(rate, PACER_MAX_RATE)
+
+
+def test_cache_hits_do_not_set_baseline_latency():
+    pacer = _AdaptivePacer()
+    pacer.on_success(0.001)  # Ответ из кэша переводов
+    pacer.on_success(0.5)
+
+    assert pacer.rate == float("inf")
+
+
+def test_call_ai_retries_busy_provider():
+    pacer = _AdaptivePacer()
+    q = queue.Queue()
+    answers = [ProviderBusyError("busy", status=429, retry_after=0), "Доброе утро"]
+
+    def request():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert _call_ai(q, pacer, request) == "Доброе утро"
+    assert pacer.rate == PACER_MAX_RATE / 2 + PACER_RATE_STEP
+    assert "429" in q.get_nowait()[1]
+
+
+def test_wait_returns_false_when_stopped(monkeypatch):
+    pacer = _AdaptivePacer()
+    pacer.on_busy(retry_after=30)
+    monkeypatch.setattr(app_state, "batch_running", False)
+
+    assert pacer.wait() is False
+    assert _call_ai(queue.Queue(), pacer, lambda: "не вызывается") is STOPPED
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Тесты запросов AnkiAPI без Anki: какие действия уходят в AnkiConnect, кэш колод и настройка модели"""
+import os
+import threading
+
+import pytest
+
+from api.anki_api import AnkiAPI, DECK_STATS_TTL, MODEL_CSS, MODEL_FIELDS, MODEL_TEMPLATES
+
+
+class RecordingAnkiAPI(AnkiAPI):
+    """AnkiAPI, который записывает запросы и отвечает как пустая коллекция"""
+
+    def __init__(self):
+        super().__init__("http://127.0.0.1:9")
+        self.calls = []
+        self.cards_outside_deck = []
+        self.deck_total = 7
+        self.stats_gate = threading.Event()  # getDeckStats отвечает, когда тест его откроет
+        self.stats_gate.set()
+
+    def _request(self, action, params=None, timeout=None):
+        self.calls.append((action, params))
+        if action == "modelFieldNames":
+            return ["Phrase", "Translation", "Context", "Audio"]
+        if action == "addNote":
+            return 1001
+        if action == "addNotes":
+            return list(range(2001, 2001 + len(params["notes"])))
+        if action == "storeMediaFile":
+            return params["filename"]
+        if action == "findCards":
+            return self.cards_outside_deck
+        if action == "deckNames":
+            return ["Deutsch", "Default"]
+        if action == "getDeckStats":
+            self.stats_gate.wait(5)
+            return {"1": {"name": "Deutsch", "total_in_deck": self.deck_total}}
+        if action == "multi":
+            return [{"result": self._request(a["action"], a.get("params")), "error": None}
+                    for a in params["actions"]]
+        return None
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "tts_guten_morgen.mp3"
+    path.write_bytes(b"ID3")
+    return str(path)
+
+
+def test_add_note_sends_audio_inside_add_note(audio):
+    api = RecordingAnkiAPI()
+
+    assert api.add_note("Guten Morgen", "Доброе утро", "", "Deutsch", audio_path=audio)
+
+    actions = [action for action, _ in api.calls]
+    assert "storeMediaFile" not in actions
+    note = dict(api.calls)["addNote"]["note"]
+    assert note["audio"] == [{
+        "path": os.path.abspath(audio),
+        "filename": "tts_guten_morgen.mp3",
+        "fields": ["Audio"],
+    }]
+
+
+def test_build_note_without_audio_file(tmp_path):
+    api = RecordingAnkiAPI()
+
+    note = api.build_note("Hallo", "Привет", "", "Deutsch", audio_path=str(tmp_path / "missing.mp3"))
+
+    assert "audio" not in note
+    assert api.calls == []
+
+
+def test_add_notes_batch_carries_audio(audio):
+    api = RecordingAnkiAPI()
+    notes = [
+        api.build_note("Hallo", "Привет", "", "Deutsch", audio_path=audio, audio_field="Audio"),
+        api.build_note("Tschüss", "Пока", "", "Deutsch"),
+    ]
+
+    assert api.add_notes(notes) == [2001, 2002]
+    assert [action for action, _ in api.calls] == ["addNotes"]
+    sent = api.calls[0][1]["notes"]
+    assert sent[0]["audio"][0]["fields"] == ["Audio"]
+    assert "audio" not in sent[1]
+
+
+def test_update_note_sends_audio_in_one_request(audio):
+    api = RecordingAnkiAPI()
+
+    assert api.update_note(42, "Guten Morgen", "Доброе утро", "", audio_path=audio)
+
+    assert [action for action, _ in api.calls] == ["modelFieldNames", "multi", "updateNoteFields"]
+    note = dict(api.calls)["updateNoteFields"]["note"]
+    assert note["fields"]["Audio"] == ""
+    assert note["audio"] == [{
+        "path": os.path.abspath(audio),
+        "filename": "tts_guten_morgen.mp3",
+        "fields": ["Audio"],
+    }]
+
+
+def test_update_note_moves_cards_to_chosen_deck():
+    api = RecordingAnkiAPI()
+    api.cards_outside_deck = [7, 8]
+
+    assert api.update_note(42, "Guten Morgen", "Доброе утро", "", deck_name="Deutsch::A1 (12)")
+
+    calls = dict(api.calls)
+    assert calls["findCards"]["query"] == 'nid:42 -deck:"Deutsch::A1"'
+    assert calls["changeDeck"] == {"cards": [7, 8], "deck": "Deutsch::A1"}
+
+
+def test_update_note_in_same_deck_is_one_request():
+    api = RecordingAnkiAPI()
+
+    assert api.update_note(42, "Guten Morgen", "Доброе утро", "", deck_name="Deutsch")
+
+    assert [action for action, _ in api.calls] == ["multi", "updateNoteFields", "findCards"]
+
+
+def test_deck_query_escapes_wildcards():
+    assert RecordingAnkiAPI().deck_query('My_"Deck"*') == 'deck:"My\\_\\"Deck\\"\\*"'
+
+
+@pytest.mark.parametrize("message, schema", [
+    ("model was not found: YouTube", True),
+    ("field Sound not found in model", True),
+    ("KeyError: 'Sound'", True),
+    ("cannot create note because it is empty: first field", False),
+    ("cannot create note because it is a duplicate", False),
+    ("deck was not found: Deutsch", False),
+])
+def test_schema_error_detection(message, schema):
+    assert AnkiAPI._is_schema_error(Exception(message)) == schema
+
+
+def _refresh_decks(api):
+    """get_deck_names, пока фоновое обновление статистики ждет ответа getDeckStats"""
+    updates = []
+    done = threading.Event()
+    api.stats_gate.clear()
+    decks = api.get_deck_names(on_update=lambda fresh: (updates.append(fresh), done.set()))
+    api.stats_gate.set()
+    return decks, updates, done
+
+
+def test_deck_counts_are_cached_within_ttl():
+    api = RecordingAnkiAPI()
+    decks, updates, done = _refresh_decks(api)
+    assert decks == ["Default", "Deutsch"]  # статистики еще нет — имена без количества
+    assert done.wait(5)
+    assert updates == [["Default", "Deutsch (7)"]]
+
+    api.calls.clear()
+    assert api.get_deck_names() == ["Default", "Deutsch (7)"]
+    assert api.calls == []
+
+
+def test_stale_counts_are_returned_and_refreshed_in_background():
+    api = RecordingAnkiAPI()
+    api.store_deck_stats(["Deutsch", "Default"], {"1": {"name": "Deutsch", "total_in_deck": 7}})
+    api._deck_stats_time -= DECK_STATS_TTL + 1
+    api.deck_total = 9
+
+    decks, updates, done = _refresh_decks(api)
+
+    assert decks == ["Default", "Deutsch (7)"]
+    assert done.wait(5)
+    assert updates == [["Default", "Deutsch (9)"]]
+
+
+def test_added_notes_update_count_locally():
+    api = RecordingAnkiAPI()
+    api.store_deck_stats(["Deutsch", "Default"], {"1": {"name": "Deutsch", "total_in_deck": 7}})
+
+    api.add_note("Guten Morgen", "Доброе утро", "", "Deutsch (7)")
+    api.calls.clear()
+
+    assert api.get_deck_names() == ["Default", "Deutsch (8)"]
+    assert api.calls == []
+
+
+def test_invalidated_stats_are_refreshed():
+    api = RecordingAnkiAPI()
+    api.store_deck_stats(["Deutsch", "Default"], {"1": {"name": "Deutsch", "total_in_deck": 7}})
+    api.invalidate_deck_stats()
+    api.deck_total = 5
+
+    decks, updates, done = _refresh_decks(api)
+
+    assert done.wait(5)
+    assert updates == [["Default", "Deutsch (5)"]]
+
+
+def test_one_background_refresh_at_a_time():
+    api = RecordingAnkiAPI()
+    api.stats_gate.clear()
+    for _ in range(3):
+        api.get_deck_names()
+    api.stats_gate.set()
+    api._executor.shutdown(wait=True)
+
+    assert [action for action, _ in api.calls].count("getDeckStats") == 1
+
+
+class ModelAnkiAPI(RecordingAnkiAPI):
+    """Anki с уже созданной моделью YouTube и заданными CSS/шаблонами"""
+
+    def __init__(self, css=MODEL_CSS, fail_update=False):
+        super().__init__()
+        self.css = css
+        self.fail_update = fail_update
+
+    def _request(self, action, params=None, timeout=None):
+        if action == "modelNames":
+            self.calls.append((action, params))
+            return ["YouTube"]
+        if action == "modelFieldNames":
+            self.calls.append((action, params))
+            return list(MODEL_FIELDS)
+        if action == "modelStyling":
+            self.calls.append((action, params))
+            return {"css": self.css}
+        if action == "modelTemplates":
+            self.calls.append((action, params))
+            return {t["name"]: {"Front": t["Front"], "Back": t["Back"]} for t in MODEL_TEMPLATES}
+        if action == "updateModelStyling" and self.fail_update:
+            self.calls.append((action, params))
+            raise Exception("collection is locked")
+        return super()._request(action, params, timeout)
+
+
+def _model_actions(api):
+    return [action for action, _ in api.calls if action.startswith(("model", "updateModel"))]
+
+
+def test_unchanged_model_is_not_pushed_again():
+    api = ModelAnkiAPI()
+    assert api.setup_model()
+    assert "updateModelStyling" not in _model_actions(api)
+
+    api = ModelAnkiAPI()
+    assert api.setup_model()
+    # Отпечаток совпал — стили и шаблоны даже не читаются
+    assert _model_actions(api) == ["modelNames", "modelFieldNames"]
+
+
+def test_changed_css_is_pushed_once():
+    api = ModelAnkiAPI(css=".card { color: red; }")
+    api.setup_model()
+    assert _model_actions(api).count("updateModelStyling") == 1
+
+    api = ModelAnkiAPI(css=".card { color: red; }")
+    api.setup_model()
+    assert "updateModelStyling" not in _model_actions(api)
+
+
+def test_failed_push_is_retried():
+    api = ModelAnkiAPI(css=".card { color: red; }", fail_update=True)
+    api.setup_model()
+
+    api = ModelAnkiAPI(css=".card { color: red; }")
+    api.setup_model()
+    assert _model_actions(api).count("updateModelStyling") == 1
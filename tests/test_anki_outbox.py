@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Тесты очереди заметок для Anki (outbox)"""
+import os
+import sqlite3
+
+import pytest
+
+from core import anki_outbox as outbox_module
+from core.anki_outbox import AnkiOutbox, MAX_ATTEMPTS
+
+
+class FakeAnki:
+    """Минимальный AnkiAPI для flush: addNotes и updateNoteFields без сети"""
+
+    def __init__(self, existing=None, add_error=None, update_error=None):
+        self.existing = existing or {}  # фраза -> [ID]
+        self.add_error = add_error
+        self.update_error = update_error
+        self.added, self.updated = [], []
+
+    def find_notes(self, phrase):
+        return self.existing.get(phrase, [])
+
+    def update_note(self, note_id, phrase, translation, context, audio_path=None, deck_name=None):
+        if self.update_error:
+            raise self.update_error
+        self.updated.append((note_id, phrase, deck_name))
+
+    def resolve_audio_field(self):
+        return "Sound"
+
+    def build_note(self, phrase, translation, context, deck_name, **kwargs):
+        return {"fields": {"Phrase": phrase}, "deckName": deck_name, **kwargs}
+
+    def add_notes(self, notes):
+        if self.add_error:
+            raise self.add_error
+        results = []
+        for note in notes:
+            phrase = note["fields"]["Phrase"]
+            if phrase in self.existing:
+                results.append(Exception("cannot create note because it is a duplicate"))
+            else:
+                self.added.append(phrase)
+                results.append(len(self.added))
+        return results
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return AnkiOutbox(str(tmp_path / "outbox.sqlite3"))
+
+
+def test_enqueue_and_flush(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    outbox.enqueue("Danke", "Спасибо", "", "Deutsch")
+    anki = FakeAnki()
+    assert outbox.flush(anki) == (2, 0)
+    assert anki.added == ["Guten Tag", "Danke"]
+    assert outbox.count() == 0
+
+
+def test_audio_is_kept_until_sent(outbox, tmp_path):
+    audio = tmp_path / "a.mp3"
+    audio.write_bytes(b"mp3")
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch", str(audio))
+    assert not audio.exists()  # перенесено в папку очереди
+    kept = outbox._pending(10)[0]["audio_path"]
+    assert os.path.exists(kept)
+    outbox.flush(FakeAnki())
+    assert not os.path.exists(kept)
+
+
+def test_connection_error_keeps_notes(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    assert outbox.flush(FakeAnki(add_error=Exception("ANKI_CONNECT_ERROR"))) == (0, 0)
+    assert outbox.count() == 1
+
+
+def test_existing_duplicate_counts_as_done(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    assert outbox.flush(FakeAnki(existing={"Guten Tag": [1]})) == (1, 0)
+    assert outbox.count() == 0
+
+
+def test_replace_updates_in_place(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch", replace_existing=True)
+    anki = FakeAnki(existing={"Guten Tag": [42]})
+    assert outbox.flush(anki) == (1, 0)
+    assert anki.updated == [(42, "Guten Tag", "Deutsch")] and anki.added == []
+    assert outbox.count() == 0
+
+
+def test_failed_replace_is_kept_not_sent_as_new_note(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch", replace_existing=True)
+    outbox.enqueue("Danke", "Спасибо", "", "Deutsch")
+    anki = FakeAnki(existing={"Guten Tag": [42]}, update_error=Exception("note was not found"))
+    assert outbox.flush(anki) == (1, 1)
+    assert anki.added == ["Danke"]
+    (row,) = outbox._pending(10, now=float("inf"))
+    assert row["phrase"] == "Guten Tag"
+    assert row["attempts"] == 1 and "not found" in row["last_error"]
+
+
+def test_replace_stops_when_anki_goes_away(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch", replace_existing=True)
+    anki = FakeAnki(existing={"Guten Tag": [42]}, update_error=Exception("ANKI_CONNECT_ERROR"))
+    assert outbox.flush(anki) == (0, 0)
+    assert outbox._pending(10)[0]["attempts"] == 0
+
+
+def test_rejected_note_waits_with_growing_delay(outbox, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(outbox_module.time, "time", lambda: now[0])
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    anki = FakeAnki(add_error=Exception("model was not found"))
+
+    assert outbox.flush(anki) == (0, 1)
+    assert outbox.flush(anki) == (0, 0)  # пауза еще не истекла
+    assert outbox.count() == 1 and outbox.count(due_only=True) == 0
+
+    first = outbox._pending(10, now=float("inf"))[0]["next_attempt"] - now[0]
+    now[0] += first
+    assert outbox.flush(anki) == (0, 1)
+    second = outbox._pending(10, now=float("inf"))[0]["next_attempt"] - now[0]
+    assert second == 2 * first
+
+
+def test_note_is_parked_after_max_attempts(outbox):
+    outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    outbox.enqueue("Danke", "Спасибо", "", "Deutsch")
+    anki = FakeAnki(add_error=Exception("model was not found"))
+    for _ in range(MAX_ATTEMPTS):
+        with sqlite3.connect(outbox.db_path) as conn:
+            conn.execute("UPDATE outbox SET next_attempt = 0")
+        outbox.flush(anki)
+
+    assert outbox.count() == 0
+    parked = outbox.parked()
+    assert [row["phrase"] for row in parked] == ["Guten Tag", "Danke"]
+    assert all(row["attempts"] == MAX_ATTEMPTS for row in parked)
+    assert outbox.flush(FakeAnki()) == (0, 0)  # отложенные больше не отправляются
+
+
+def test_same_audio_name_does_not_overwrite(outbox, tmp_path):
+    for n, folder in enumerate(("a", "b")):
+        audio = tmp_path / folder / "audio.mp3"
+        audio.parent.mkdir()
+        audio.write_bytes(f"mp3 {n}".encode())
+        outbox.enqueue(f"Satz {n}", "", "", "Deutsch", str(audio))
+    kept = [row["audio_path"] for row in outbox._pending(10)]
+    assert kept[0] != kept[1]
+    assert [open(path, "rb").read() for path in kept] == [b"mp3 0", b"mp3 1"]
+
+
+def test_queue_without_retry_columns_is_upgraded(outbox):
+    with sqlite3.connect(outbox.db_path) as conn:
+        conn.execute(
+            "CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, phrase TEXT NOT NULL, "
+            "translation TEXT NOT NULL DEFAULT '', context TEXT NOT NULL DEFAULT '', deck_name TEXT NOT NULL, "
+            "audio_path TEXT, allow_duplicate INTEGER NOT NULL DEFAULT 0, replace_existing INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+        )
+        conn.execute("INSERT INTO outbox (phrase, deck_name, created) VALUES ('Guten Tag', 'Deutsch', 0)")
+    assert outbox.count() == 1
+    assert outbox.flush(FakeAnki()) == (1, 0)
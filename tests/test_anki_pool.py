@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Тесты фонового пула запросов AnkiAPI против локального HTTP-сервера"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.anki_api import AnkiAPI, MAX_CONNECTIONS
+
+
+class _AnkiConnectStub(BaseHTTPRequestHandler):
+    """deckNames/getDeckStats — данные колод, findNotes — медленный ответ для проверки параллельности"""
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        cls = type(self)
+        cls.connections.add(self.client_address)
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        action = request["action"]
+        if action == "deckNames":
+            result = ["Deutsch", "Default"]
+        elif action == "getDeckStats":
+            result = {"1": {"name": "Deutsch", "total_in_deck": 7}}
+        else:
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            time.sleep(0.2)
+            with cls.lock:
+                cls.in_flight -= 1
+            result = [101, 202]
+        body = json.dumps({"result": result, "error": None}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _AnkiConnectStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _AnkiConnectStub.connections = set()
+    _AnkiConnectStub.max_in_flight = 0
+    yield AnkiAPI(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+def test_keep_alive_connection_is_reused(api):
+    for _ in range(3):
+        assert api.submit(api.get_deck_names, with_counts=False, refresh=True).result(5) == ["Default", "Deutsch"]
+    assert len(_AnkiConnectStub.connections) == 1
+
+
+def test_calls_overlap_up_to_pool_size(api):
+    futures = [api.submit(api.find_notes, f"Satz {n}") for n in range(MAX_CONNECTIONS * 2)]
+    assert [f.result(5) for f in futures] == [[101, 202]] * len(futures)
+    assert _AnkiConnectStub.max_in_flight == MAX_CONNECTIONS
+    assert len(_AnkiConnectStub.connections) <= MAX_CONNECTIONS
+
+
+def test_callback_receives_future(api):
+    done = threading.Event()
+    results = []
+    api.submit(api.get_deck_names, with_counts=False, callback=lambda f: (results.append(f.result()), done.set()))
+    assert done.wait(5)
+    assert results == [["Default", "Deutsch"]]
+
+
+def test_deck_stats_refresh_runs_on_pool(api):
+    updates = []
+    done = threading.Event()
+
+    def on_update(decks):
+        updates.append((decks, threading.current_thread().name))
+        done.set()
+
+    assert api.get_deck_names(on_update=on_update) == ["Default", "Deutsch"]
+    assert done.wait(5)
+    decks, thread_name = updates[0]
+    assert decks == ["Default", "Deutsch (7)"]
+    assert thread_name.startswith("anki")
+
+
+def test_local_phrase_index_answers_without_request(api):
+    api.phrase_index.loaded = True
+    api.phrase_index.add(5, "Guten Tag")
+    api.phrase_index._last_sync = float("inf")
+    assert api.submit(api.find_notes, "guten  tag").result(5) == [5]
+    assert not _AnkiConnectStub.connections
+
+
+def test_connection_refused():
+    api = AnkiAPI("http://127.0.0.1:1")
+    assert api.submit(api.get_deck_names).result(5) == "ANKI_CONNECT_ERROR"
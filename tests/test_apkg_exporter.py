@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Тесты экспорта в .apkg: пакет открывается как коллекция Anki"""
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from api.anki_api import MODEL_FIELDS, MODEL_TEMPLATES, AnkiAPI
+from api.apkg_exporter import ApkgExporter, ApkgNote, export_apkg
+
+
+def _open_collection(apkg_path, tmp_path):
+    with zipfile.ZipFile(apkg_path) as apkg:
+        apkg.extract("collection.anki2", tmp_path)
+        media = json.loads(apkg.read("media"))
+        files = {name: apkg.read(name) for name in media}
+    return sqlite3.connect(tmp_path / "collection.anki2"), media, files
+
+
+def test_notes_cards_and_media(tmp_path):
+    audio = tmp_path / "guten_tag.mp3"
+    audio.write_bytes(b"ID3-fake-mp3")
+    path = export_apkg([
+        ApkgNote("Guten Tag", "Добрый день", "Приветствие", str(audio)),
+        ApkgNote("Zeile eins\nZeile zwei", "Две строки"),
+    ], "Deutsch (12)", str(tmp_path / "out.apkg"))
+
+    conn, media, files = _open_collection(path, tmp_path)
+    try:
+        models = json.loads(conn.execute("SELECT models FROM col").fetchone()[0])
+        decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+        (model,) = models.values()
+        assert [f["name"] for f in model["flds"]] == MODEL_FIELDS
+        assert "Deutsch" in [d["name"] for d in decks.values()]
+
+        notes = conn.execute("SELECT id, mid, flds, sfld FROM notes ORDER BY sfld").fetchall()
+        assert len(notes) == 2
+        fields = dict(zip(MODEL_FIELDS, notes[0][2].split("\x1f")))
+        assert fields["Phrase"] == "Guten Tag"
+        assert fields["Translation"] == "Добрый день"
+        assert fields["Sound"] == "[sound:guten_tag.mp3]"
+        assert notes[1][2].split("\x1f")[0] == "Zeile eins<br>Zeile zwei"
+        assert all(mid == model["id"] for _, mid, _, _ in notes)
+
+        deck_id = next(int(i) for i, d in decks.items() if d["name"] == "Deutsch")
+        cards = conn.execute("SELECT nid, did FROM cards").fetchall()
+        assert len(cards) == len(notes) * len(MODEL_TEMPLATES)
+        assert {nid for nid, _ in cards} == {n[0] for n in notes}
+        assert {did for _, did in cards} == {deck_id}
+    finally:
+        conn.close()
+
+    assert media == {"0": "guten_tag.mp3"}
+    assert files["0"] == b"ID3-fake-mp3"
+
+
+def test_model_id_is_explicit(monkeypatch):
+    # Экспорт не обращается к AnkiConnect: ID модели передается явно
+    monkeypatch.setattr(AnkiAPI, "_request", lambda *args, **kwargs: pytest.fail("запрос к AnkiConnect"))
+    assert ApkgExporter("Deutsch", model_id=1700000000123).model_id == 1700000000123
+
+
+def test_stable_ids_without_anki():
+    first, second = ApkgExporter("Deutsch"), ApkgExporter("Deutsch")
+    assert first.model_id == second.model_id
+    assert first.deck_id == second.deck_id
+
+
+def test_failed_write_keeps_previous_package(tmp_path, monkeypatch):
+    path = tmp_path / "out.apkg"
+    exporter = ApkgExporter("Deutsch")
+    exporter.add_note("Hallo", "Привет")
+    exporter.write(str(path))
+    before = path.read_bytes()
+
+    def disk_full(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    exporter.add_note("Tschüss", "Пока")
+    monkeypatch.setattr(zipfile.ZipFile, "writestr", disk_full)
+    with pytest.raises(OSError):
+        exporter.write(str(path))
+
+    assert path.read_bytes() == before
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Тесты пакетного CLI: запуск без GUI и запись .apkg"""
+import json
+import re
+import sqlite3
+import zipfile
+
+import pytest
+
+from api.anki_api import AnkiAPI, anki_api
+from core import workers
+from core.app_state import app_state
+from modules.batch_generator import cli, journal, logic
+from modules.batch_generator.journal import batch_journal
+
+
+@pytest.fixture
+def offline_anki(monkeypatch):
+    """Anki не запущен: дубликатов нет, экспорт .apkg не должен обращаться к AnkiConnect"""
+    monkeypatch.setattr(anki_api, "find_notes_bulk", lambda phrases: {})
+    monkeypatch.setattr(AnkiAPI, "_request", lambda *args, **kwargs: pytest.fail("запрос к AnkiConnect"))
+
+
+def _translate_packed(prompt):
+    numbers = re.findall(r"^(\d+)\. ", prompt, flags=re.MULTILINE)
+    return json.dumps([{"id": int(n), "translation": f"перевод {n}"} for n in numbers])
+
+
+def test_apkg_option_writes_package(tmp_path, monkeypatch, capsys, offline_anki, fake_provider):
+    provider = fake_provider(_translate_packed)
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: provider)
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("Guten Tag\nDanke schön\n\nBis morgen\n", encoding="utf-8")
+    out = tmp_path / "deutsch.apkg"
+
+    code = cli.run([str(phrases), "--deck", "Deutsch", "--no-audio", "--no-context", "--apkg", str(out)])
+
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert code == 0
+    assert events[0]["event"] == "start" and events[0]["total"] == 3
+    assert {"event": "apkg", "path": str(out), "notes": 3} in events
+    assert events[-1]["counts"] == {"exported": 3}
+
+    with zipfile.ZipFile(out) as apkg:
+        apkg.extract("collection.anki2", tmp_path)
+        assert json.loads(apkg.read("media")) == {}
+    conn = sqlite3.connect(tmp_path / "collection.anki2")
+    try:
+        phrases_in_db = sorted(row[0] for row in conn.execute("SELECT sfld FROM notes"))
+    finally:
+        conn.close()
+    assert phrases_in_db == ["Bis morgen", "Danke schön", "Guten Tag"]
+
+
+def _package_phrases(path, tmp_path):
+    with zipfile.ZipFile(path) as apkg:
+        apkg.extract("collection.anki2", tmp_path)
+    conn = sqlite3.connect(tmp_path / "collection.anki2")
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT sfld FROM notes"))
+    finally:
+        conn.close()
+
+
+def test_resume_rewrites_package_with_earlier_notes(tmp_path, monkeypatch, capsys, offline_anki, fake_provider):
+    """Остановка после первой фразы, затем --resume: пакет содержит все фразы, а не только оставшиеся"""
+    monkeypatch.setattr(logic, "AI_PACK_SIZE", 1)
+
+    def stop_after_first(prompt):
+        app_state.batch_running = False
+        return "перевод"
+
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: fake_provider(stop_after_first))
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("Guten Tag\nDanke schön\nBis morgen\n", encoding="utf-8")
+    out = tmp_path / "deutsch.apkg"
+
+    assert cli.run([str(phrases), "--deck", "Deutsch", "--no-audio", "--no-context", "--apkg", str(out)]) == 1
+    assert _package_phrases(out, tmp_path) == ["Guten Tag"]
+    job_id = batch_journal.latest_unfinished()["id"]
+    assert batch_journal.get_job(job_id)["counts"][journal.EXPORTED] == 1
+
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: fake_provider(lambda prompt: "перевод"))
+    assert cli.run(["--resume", "--apkg", str(out)]) == 0
+    assert _package_phrases(out, tmp_path) == ["Bis morgen", "Danke schön", "Guten Tag"]
+    assert batch_journal.get_job(job_id)["counts"] == {journal.EXPORTED: 3}
+    capsys.readouterr()
+
+
+def test_failed_write_leaves_phrases_resumable(tmp_path, monkeypatch, capsys, offline_anki, fake_provider):
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: fake_provider(_translate_packed))
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("Guten Tag\nDanke schön\n", encoding="utf-8")
+
+    code = cli.run([str(phrases), "--no-audio", "--no-context", "--apkg", str(tmp_path / "missing" / "out.apkg")])
+
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert code == 1
+    assert not any(e["event"] == "apkg" for e in events)
+    assert events[-1]["counts"] == {journal.GENERATED: 2}
+
+
+@pytest.fixture
+def online_anki(monkeypatch):
+    """Anki запущен: setup_model и addNotes записываются"""
+    calls = []
+    monkeypatch.setattr(anki_api, "find_notes_bulk", lambda phrases: {})
+    monkeypatch.setattr(anki_api, "setup_model", lambda: calls.append("setup_model") or True)
+
+    def add_notes(notes):
+        calls.append("addNotes")
+        return list(range(1, len(notes) + 1))
+
+    monkeypatch.setattr(anki_api, "add_notes", add_notes)
+    return calls
+
+
+def test_model_is_set_up_before_adding(tmp_path, monkeypatch, capsys, online_anki, fake_provider):
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: fake_provider(_translate_packed))
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("Guten Tag\nDanke schön\n", encoding="utf-8")
+
+    assert cli.run([str(phrases), "--no-audio", "--no-context"]) == 0
+    assert online_anki == ["setup_model", "addNotes"]
+    capsys.readouterr()
+
+
+def test_ctrl_c_while_printing_stops_worker(tmp_path, monkeypatch, capsys, online_anki, fake_provider):
+    """Ctrl-C вне ожидания очереди тоже останавливает воркер, и готовое отправляется в Anki"""
+    monkeypatch.setattr(logic, "AI_PACK_SIZE", 1)
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: fake_provider(lambda prompt: "перевод"))
+    to_event = cli._to_event
+    interrupts = []
+
+    def interrupt_once(message, data):
+        if message == "batch_progress" and not interrupts:
+            interrupts.append(message)
+            raise KeyboardInterrupt
+        return to_event(message, data)
+
+    monkeypatch.setattr(cli, "_to_event", interrupt_once)
+    phrases = tmp_path / "phrases.txt"
+    phrases.write_text("\n".join(f"Satz {n}" for n in range(30)), encoding="utf-8")
+
+    code = cli.run([str(phrases), "--no-audio", "--no-context"])
+
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {"event": "interrupted"} in events
+    assert events[-1]["event"] == "done"
+    assert not app_state.batch_running
+    assert "addNotes" in online_anki
+    counts = events[-1]["counts"]
+    assert counts[journal.ADDED] >= 1
+    assert code == (1 if sum(counts.values()) > counts[journal.ADDED] else 0)
+
+
+def test_missing_source_is_usage_error(capsys):
+    with pytest.raises(SystemExit) as exc:
+        cli.run([])
+    assert exc.value.code == 2
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Тесты журнала пакетных заданий и записи итогов конвейера в него"""
+import queue
+
+import pytest
+
+from api.anki_api import anki_api
+from core.app_state import app_state
+from modules.batch_generator import journal, logic
+from modules.batch_generator.journal import BatchJournal, batch_journal
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return BatchJournal(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_create_and_record(jobs):
+    job_id = jobs.create_job(["a", "b", "c"], "Deutsch", False, True)
+    jobs.record(job_id, [
+        {"idx": 0, "state": journal.ADDED},
+        {"idx": 1, "state": journal.GENERATED, "translation": "б"},
+        {"idx": 2, "state": journal.FAILED, "error": "boom"},
+    ])
+    job = jobs.get_job(job_id)
+    assert job["deck_name"] == "Deutsch" and job["context_enabled"] == 1
+    assert job["counts"] == {journal.ADDED: 1, journal.GENERATED: 1, journal.FAILED: 1}
+    assert [i["phrase"] for i in jobs.items(job_id)] == ["a", "b", "c"]
+    assert jobs.latest_unfinished()["id"] == job_id
+
+
+def test_reset_failed_keeps_translation(jobs):
+    job_id = jobs.create_job(["a", "b"], "Deutsch", False, False)
+    jobs.record(job_id, [
+        {"idx": 0, "state": journal.FAILED, "translation": "а", "error": "anki"},
+        {"idx": 1, "state": journal.FAILED, "error": "ai"},
+    ])
+    assert sorted(jobs.reset_failed(job_id)) == [0, 1]
+    states = {i["idx"]: (i["state"], i["translation"], i["error"]) for i in jobs.items(job_id)}
+    assert states == {0: (journal.GENERATED, "а", None), 1: (journal.PENDING, None, None)}
+
+
+def test_finished_job_is_not_resumable(jobs):
+    job_id = jobs.create_job(["a", "b"], "Deutsch", False, False)
+    jobs.mark_duplicates_checked(job_id, [1])
+    jobs.record(job_id, [{"idx": 0, "state": journal.ADDED}])
+    assert jobs.get_job(job_id)["duplicates_checked"] == 1
+    assert jobs.latest_unfinished() is None
+
+
+def test_old_jobs_are_pruned(jobs, monkeypatch):
+    monkeypatch.setattr(journal, "MAX_JOBS", 2)
+    ids = [jobs.create_job(["a"], "Deutsch", False, False) for _ in range(3)]
+    assert jobs.get_job(ids[0]) is None
+    assert jobs.get_job(ids[2]) is not None
+
+
+@pytest.mark.parametrize("error, state", [
+    (None, journal.ADDED),
+    ("cannot create note because it is a duplicate", journal.DUPLICATE),
+    ("model was not found", journal.FAILED),
+])
+def test_journal_state(error, state):
+    assert logic._journal_state(error) == state
+
+
+def test_rejected_duplicate_is_not_retried(monkeypatch, fake_provider):
+    """addNotes отклонил заметку как дубликат — в журнале DUPLICATE, а не FAILED"""
+    monkeypatch.setattr(app_state, "check_duplicates", False)
+    monkeypatch.setattr(anki_api, "add_notes", lambda notes: [
+        Exception("cannot create note because it is a duplicate") if n["fields"]["Phrase"] == "Danke" else 1
+        for n in notes
+    ])
+    provider = fake_provider(lambda prompt: "перевод")
+    phrases = ["Guten Tag", "Danke"]
+    job_id = batch_journal.create_job(phrases, "Deutsch", False, False)
+
+    logic.batch_processing_worker(queue.Queue(), phrases, "Deutsch", False, False,
+                                  lambda: provider, None, job_id)
+
+    states = [item["state"] for item in batch_journal.items(job_id)]
+    assert states == [journal.ADDED, journal.DUPLICATE]
+    assert batch_journal.latest_unfinished() is None
+
+
+def test_notes_queued_while_anki_is_down(monkeypatch, fake_provider):
+    """Anki недоступен: заметки уходят в outbox, в журнале QUEUED, задание не ждет продолжения"""
+    from core.anki_outbox import anki_outbox
+    def anki_is_down(*args, **kwargs):
+        raise Exception("ANKI_CONNECT_ERROR")
+
+    monkeypatch.setattr(anki_api, "_request", anki_is_down)
+    provider = fake_provider(lambda prompt: "перевод")
+    phrases = ["Guten Tag", "Danke"]
+    job_id = batch_journal.create_job(phrases, "Deutsch", False, False)
+
+    logic.batch_processing_worker(queue.Queue(), phrases, "Deutsch", False, False,
+                                  lambda: provider, None, job_id)
+
+    states = [item["state"] for item in batch_journal.items(job_id)]
+    assert states == [journal.QUEUED, journal.QUEUED]
+    assert anki_outbox.count() == 2
+    assert batch_journal.latest_unfinished() is None
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Тесты конвейера пакетного режима: пул генерации, остановка и пауза стадий генерации и озвучки"""
+import json
+import queue
+import re
+import threading
+import time
+
+import pytest
+
+from api.anki_api import anki_api
+from core.app_state import app_state
+from modules.batch_generator import journal, logic
+from modules.batch_generator.journal import batch_journal
+
+PHRASES = ["Guten Tag", "Danke", "Bis morgen"]
+
+
+class FakeTTS:
+    """Модуль озвучки: пишет пустой mp3 на каждую фразу"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.calls = []
+
+    def generate_audio(self, phrase, lang, speed_level, tld):
+        self.calls.append(phrase)
+        path = self.folder / f"{len(self.calls)}.mp3"
+        path.write_bytes(b"ID3")
+        return str(path)
+
+
+def translate_packed(prompt):
+    numbers = re.findall(r"^(\d+)\. ", prompt, flags=re.MULTILINE)
+    return json.dumps([{"id": int(n), "translation": f"перевод {n}"} for n in numbers])
+
+
+@pytest.fixture
+def anki(monkeypatch):
+    """Anki принимает все заметки; отправленные пачки addNotes копятся в списке"""
+    sent = []
+    monkeypatch.setattr(app_state, "check_duplicates", False)
+    monkeypatch.setattr(anki_api, "resolve_audio_field", lambda: "Sound")
+
+    def add_notes(notes):
+        sent.extend(notes)
+        return list(range(1, len(notes) + 1))
+
+    monkeypatch.setattr(anki_api, "add_notes", add_notes)
+    return sent
+
+
+def run(provider, tts=None, job_id=None):
+    q = queue.Queue()
+    logic.batch_processing_worker(q, PHRASES, "Deutsch", tts is not None, False,
+                                  lambda: provider, tts, job_id)
+    return [message for kind, message in iter_queue(q) if kind == "batch_log"]
+
+
+def iter_queue(q):
+    while not q.empty():
+        yield q.get_nowait()
+
+
+def states(job_id):
+    return [item["state"] for item in batch_journal.items(job_id)]
+
+
+def test_stop_during_generation_keeps_notes_for_resume(anki, fake_provider, tmp_path):
+    """Стоп во время запроса к AI: заметки без аудио не уходят в Anki, озвучка — при продолжении"""
+    def respond(prompt):
+        app_state.batch_running = False
+        return translate_packed(prompt)
+
+    tts = FakeTTS(tmp_path)
+    job_id = batch_journal.create_job(PHRASES, "Deutsch", True, False)
+
+    log = run(fake_provider(respond), tts, job_id)
+
+    assert anki == []
+    assert tts.calls == []
+    assert states(job_id) == [journal.GENERATED] * 3
+    assert "🛑 Обработка прервана." in log
+    assert batch_journal.latest_unfinished()["id"] == job_id
+
+    provider = fake_provider(lambda prompt: pytest.fail("переведенные фразы не отправляются в AI"))
+    run(provider, tts, job_id)
+
+    assert tts.calls == PHRASES
+    assert [note["fields"]["Phrase"] for note in anki] == PHRASES
+    assert all(note.get("audio") for note in anki)
+    assert states(job_id) == [journal.ADDED] * 3
+
+
+def test_stop_without_audio_sends_generated_notes(anki, fake_provider):
+    """Без озвучки сгенерированное до остановки не теряется"""
+    def respond(prompt):
+        app_state.batch_running = False
+        return translate_packed(prompt)
+
+    job_id = batch_journal.create_job(PHRASES, "Deutsch", False, False)
+    run(fake_provider(respond), job_id=job_id)
+
+    assert [note["fields"]["Phrase"] for note in anki] == PHRASES
+    assert states(job_id) == [journal.ADDED] * 3
+
+
+def test_pause_holds_generation_until_resumed(anki, fake_provider, monkeypatch):
+    monkeypatch.setattr(logic, "AI_PACK_SIZE", 1)
+    requested = []
+    first_done = threading.Event()
+
+    def respond(prompt):
+        requested.append(prompt)
+        if len(requested) == 1:
+            app_state.batch_paused = True
+            first_done.set()
+        return "перевод"
+
+    worker = threading.Thread(target=run, args=(fake_provider(respond),))
+    worker.start()
+    assert first_done.wait(5)
+    worker.join(0.5)
+    # На паузе следующая фраза не запрашивается
+    assert worker.is_alive() and len(requested) == 1
+
+    app_state.batch_paused = False
+    worker.join(5)
+    assert not worker.is_alive()
+    assert len(requested) == 3
+    assert [note["fields"]["Phrase"] for note in anki] == PHRASES
+
+
+def test_stop_while_paused_finishes_worker(anki, fake_provider, monkeypatch):
+    monkeypatch.setattr(logic, "AI_PACK_SIZE", 1)
+    paused = threading.Event()
+
+    def respond(prompt):
+        app_state.batch_paused = True
+        paused.set()
+        return "перевод"
+
+    worker = threading.Thread(target=run, args=(fake_provider(respond),))
+    worker.start()
+    assert paused.wait(5)
+    app_state.batch_running = False
+    worker.join(5)
+
+    assert not worker.is_alive()
+    assert not app_state.batch_paused
+    assert [note["fields"]["Phrase"] for note in anki] == PHRASES[:1]
+
+
+def test_generation_pool_is_bounded_and_keeps_order(anki, fake_provider, monkeypatch):
+    """Запросы к AI идут параллельно не больше batch_parallel, а в Anki фразы уходят в исходном порядке"""
+    phrases = [f"Satz {n}" for n in range(9)]
+    monkeypatch.setattr(logic, "AI_PACK_SIZE", 1)
+    monkeypatch.setitem(app_state.batch_parallel, "Fake", 3)
+    monkeypatch.setattr(app_state, "translate_prompt", "Übersetze: {phrase}")
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def respond(prompt):
+        n = phrases.index(prompt.split(": ", 1)[1])
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        # Первые фразы отвечают дольше последних — результаты приходят не по порядку
+        time.sleep(0.02 * (len(phrases) - n))
+        with lock:
+            in_flight[0] -= 1
+        return f"перевод {n}"
+
+    q = queue.Queue()
+    logic.batch_processing_worker(q, phrases, "Deutsch", False, False, lambda: fake_provider(respond), None)
+
+    assert peak[0] == 3
+    assert [note["fields"]["Phrase"] for note in anki] == phrases
+    assert [note["fields"]["Translation"] for note in anki] == [f"перевод {n}" for n in range(9)]
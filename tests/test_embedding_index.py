@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Тесты индекса эмбеддингов: кэш векторов и инкрементальное обновление по событиям PhraseIndex"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from api.embedding_index import EmbeddingCache, EmbeddingIndex  # noqa: E402
+from api.phrase_index import PhraseIndex  # noqa: E402
+
+
+class FakeEmbedder:
+    """Эмбеддинги без Ollama: вектор частот букв, похожие фразы — близкие векторы"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def embed(self, texts, model, timeout=60):
+        if self.fail:
+            raise ConnectionError("Ollama недоступна")
+        self.calls.append(list(texts))
+        return [[text.count(ch) + 0.01 for ch in "abcdefghijklmnopqrstuvwxyzäöüß "] for text in texts]
+
+
+class EmptyCollection:
+    model_name = "Lerne"
+
+    def _request(self, action, params=None, timeout=None):
+        return []
+
+
+def wait_sync(index):
+    thread = index._sync_thread
+    if thread:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+@pytest.fixture
+def indexes():
+    phrases = PhraseIndex(EmptyCollection())
+    phrases.load()
+    phrases.add(1, "Guten Morgen")
+    phrases.add(2, "Danke schön")
+    embedder = FakeEmbedder()
+    index = EmbeddingIndex(phrases, embedder)
+    index.configure(True, "fake-embed")
+    wait_sync(index)
+    yield phrases, index, embedder
+    index.configure(False, "fake-embed")
+
+
+def test_cache_round_trip_per_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    vector = np.array([0.6, 0.8], dtype=np.float32)
+
+    cache.put_many("m1", {"hallo": vector})
+
+    assert np.array_equal(cache.get_many("m1", ["hallo", "tschüss"])["hallo"], vector)
+    assert cache.get_many("m2", ["hallo"]) == {}
+    # Новый экземпляр читает тот же файл
+    assert "hallo" in EmbeddingCache(cache.db_path).get_many("m1", ["hallo"])
+
+
+def test_initial_sync_embeds_whole_index(indexes):
+    phrases, index, embedder = indexes
+
+    assert index.ready
+    assert sorted(embedder.calls[0]) == ["danke schön", "guten morgen"]
+    assert index.find_similar("Guten Morgen!")[0][0] == 1
+
+
+def test_add_and_remove_update_single_rows(indexes, monkeypatch):
+    phrases, index, embedder = indexes
+    embedder.calls.clear()
+    # Одна новая заметка не должна сверять весь снимок индекса
+    monkeypatch.setattr(phrases, "snapshot", lambda: pytest.fail("snapshot при add()"))
+
+    phrases.add(3, "Gute Nacht")
+    wait_sync(index)
+    assert embedder.calls == [["gute nacht"]]
+    assert index.find_similar("gute nacht")[0][0] == 3
+
+    phrases.remove([1])
+    wait_sync(index)
+    assert embedder.calls == [["gute nacht"]]
+    assert [m[0] for m in index.find_similar("Guten Morgen", threshold=0.999)] == []
+    assert index._size == 2
+
+
+def test_changed_phrase_replaces_row_and_uses_cache(indexes):
+    phrases, index, embedder = indexes
+    embedder.calls.clear()
+
+    phrases.add(2, "Guten Morgen")  # Та же фраза, что у заметки 1 — вектор уже в кэше
+    wait_sync(index)
+
+    assert embedder.calls == []
+    assert index._size == 2
+    assert sorted(m[0] for m in index.find_similar("guten morgen")) == [1, 2]
+
+
+def test_changes_survive_embedding_failure(indexes):
+    phrases, index, embedder = indexes
+    embedder.fail = True
+
+    phrases.add(3, "Gute Nacht")
+    wait_sync(index)
+    assert index._size == 2
+
+    embedder.fail = False
+    phrases.add(4, "Bis bald")
+    wait_sync(index)
+    assert index._size == 4
+
+
+def test_coexists_with_other_listeners(indexes):
+    phrases, index, embedder = indexes
+    seen = []
+    phrases.add_listener(lambda changed, removed: seen.append(changed))
+
+    phrases.add(3, "Gute Nacht")
+    wait_sync(index)
+
+    assert seen == [{3: "gute nacht"}]
+    assert index.find_similar("gute nacht")[0][0] == 3
+
+    index.configure(False, "fake-embed")
+    phrases.add(4, "Bis bald")
+    assert seen[-1] == {4: "bis bald"}
+    assert index._size == 3
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""Тесты провайдера Ollama без сервера: кэш списка моделей /api/tags и поток NDJSON"""
+import json
+
+import pytest
+import requests
+
+from api.ai.base_provider import CancelToken, GenerationCancelled
+from api.ai.ollama_provider import OllamaProvider
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeStreamResponse:
+    """Потоковый ответ /api/generate: строки NDJSON, как их отдает iter_lines"""
+
+    def __init__(self, lines, status_code=200, on_line=None):
+        self.lines = lines
+        self.status_code = status_code
+        self.on_line = on_line
+        self.read = []
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.closed = True
+
+    def iter_lines(self):
+        for line in self.lines:
+            if self.closed:
+                raise requests.exceptions.ChunkedEncodingError("connection closed")
+            self.read.append(line)
+            if self.on_line:
+                self.on_line(line)
+            yield line
+
+
+class FakeSession:
+    """Отвечает на GET по очереди из responses (исключение — недоступный сервер), на POST — stream"""
+
+    def __init__(self, responses, stream=None):
+        self.responses = list(responses)
+        self.stream = stream
+        self.payloads = []
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.payloads.append(json)
+        return self.stream
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_provider(*responses):
+    provider = OllamaProvider()
+    provider.session = FakeSession(responses)
+    return provider
+
+
+def test_successful_tags_are_cached():
+    provider = make_provider(FakeResponse(200, {"models": [{"name": "qwen"}, {"name": "gemma"}]}))
+
+    assert provider.get_models() == ["gemma", "qwen"]
+    assert provider.is_available()
+    assert provider.session.calls == 1
+
+
+def test_unavailable_server_is_not_cached():
+    provider = make_provider(
+        requests.exceptions.ConnectionError("refused"),
+        FakeResponse(503),
+        FakeResponse(200, {"models": [{"name": "qwen"}]}),
+    )
+
+    assert not provider.is_available()
+    assert not provider.is_available()
+    # Ollama запустили — следующая проверка видит его без ожидания TTL
+    assert provider.is_available()
+    assert provider.get_models() == ["qwen"]
+    assert provider.session.calls == 3
+
+
+def _line(**data) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def make_streaming_provider(lines, **kwargs):
+    provider = OllamaProvider()
+    provider.session = FakeSession([], FakeStreamResponse(lines, **kwargs))
+    return provider
+
+
+def test_stream_yields_chunks_until_done():
+    provider = make_streaming_provider([
+        _line(response="Доброе", done=False),
+        b"",
+        _line(response="", done=False),
+        _line(response=" утро", done=False),
+        _line(response="", done=True, total_duration=1),
+        _line(response="после done", done=False),
+    ])
+
+    assert list(provider.generate_stream("Guten Morgen", "qwen")) == ["Доброе", " утро"]
+    assert provider.session.payloads[0]["stream"] is True
+    assert provider.session.stream.closed
+    assert provider.last_used > 0
+
+
+def test_stream_error_line_is_raised():
+    provider = make_streaming_provider([_line(response="Gu", done=False), _line(error="model not found")])
+
+    with pytest.raises(Exception, match="model not found"):
+        list(provider.generate_stream("Guten Morgen", "qwen"))
+
+
+def test_translate_stream_parses_partial_results():
+    provider = make_streaming_provider([
+        _line(response="Добр", done=False),
+        _line(response="ое утро\nКОНТЕКСТ\nУтреннее", done=False),
+        _line(response=" приветствие", done=True),
+    ])
+
+    results = list(provider.translate_stream("Guten Morgen", "{phrase}", "qwen", with_context=True, use_cache=False))
+
+    assert results[-1] == ("Доброе утро", "Утреннее приветствие")
+
+
+def test_cancel_closes_stream_mid_generation():
+    cancel = CancelToken()
+    lines = [_line(response=word, done=False) for word in ("Доброе", " утро", " вам")]
+    provider = make_streaming_provider(lines, on_line=lambda line: cancel.cancel())
+
+    with pytest.raises(GenerationCancelled):
+        provider.generate("Guten Morgen", "qwen", cancel=cancel)
+
+    assert provider.session.stream.closed
+    assert provider.session.stream.read == lines[:1]
+
+
+def test_cancelled_token_sends_no_request():
+    cancel = CancelToken()
+    cancel.cancel()
+    provider = make_streaming_provider([_line(response="Доброе утро", done=True)])
+
+    with pytest.raises(GenerationCancelled):
+        provider.generate("Guten Morgen", "qwen", cancel=cancel)
+    assert provider.session.payloads == []
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Тесты потоковой генерации OpenRouter против локального SSE-сервера"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.ai.base_provider import ProviderBusyError
+from api.ai.openrouter_provider import OpenRouterProvider
+
+
+def _event(data) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _delta(text) -> str:
+    return _event({"choices": [{"delta": {"content": text}}]})
+
+
+class _SSEStub(BaseHTTPRequestHandler):
+    """
+    /chat/completions отвечает заранее заданным потоком SSE (stream),
+    нарезанным на chunked-куски по 5 байт: строки и UTF-8 символы рвутся посередине.
+    """
+    protocol_version = "HTTP/1.1"
+    stream = ""
+    status = 200
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append((self.path, self.headers.get("Authorization"), body))
+        if self.status != 200:
+            payload = json.dumps({"error": {"message": "rate limited"}}).encode()
+            self.send_response(self.status)
+            self.send_header("Retry-After", "3")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        data = self.stream.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(data), 5):
+            chunk = data[start:start + 5]
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SSEStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _SSEStub.requests, _SSEStub.status = [], 200
+    yield OpenRouterProvider("sk-test", "test/model", api_url=f"http://127.0.0.1:{server.server_address[1]}/v1/")
+    server.shutdown()
+    server.server_close()
+
+
+def test_stream_skips_comments_and_stops_at_done(provider):
+    _SSEStub.stream = (
+        ": OPENROUTER PROCESSING\n\n"
+        + _delta("Доброе")
+        + ": OPENROUTER PROCESSING\n\n"
+        + _event({"choices": [{"delta": {"role": "assistant"}}]})
+        + _delta(" утро — «Grüß Gott»")
+        + "data: [DONE]\n\n"
+        + _delta("после DONE")
+    )
+
+    chunks = list(provider.generate_stream("Guten Morgen"))
+
+    assert chunks == ["Доброе", " утро — «Grüß Gott»"]
+    path, auth, body = _SSEStub.requests[0]
+    assert path == "/v1/chat/completions"
+    assert auth == "Bearer sk-test"
+    assert body["stream"] is True and body["model"] == "test/model"
+
+
+def test_error_event_is_raised(provider):
+    _SSEStub.stream = _delta("Guten") + _event({"error": {"message": "model overloaded"}})
+
+    with pytest.raises(Exception, match="model overloaded"):
+        list(provider.generate_stream("Guten Morgen"))
+
+
+def test_rate_limit_raises_busy(provider):
+    _SSEStub.status = 429
+
+    with pytest.raises(ProviderBusyError) as error:
+        list(provider.generate_stream("Guten Morgen"))
+    assert error.value.status == 429
+    assert error.value.retry_after == 3
+
+
+def test_translate_stream_parses_partial_results(provider):
+    _SSEStub.stream = _delta("Добр") + _delta("ое утро\nКОНТЕКСТ\nУтреннее") + _delta(" приветствие") + "data: [DONE]\n\n"
+
+    results = list(provider.translate_stream("Guten Morgen", "{phrase}", with_context=True, use_cache=False))
+
+    assert results[-1] == ("Доброе утро", "Утреннее приветствие")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Тесты пакетного перевода коротких фраз одним промптом (translate_batch)"""
+import json
+
+PROMPT = "Переведи на русский: {phrase}"
+
+
+def test_json_array_answers_every_phrase(fake_provider):
+    answer = "```json\n" + json.dumps([
+        {"id": 2, "translation": "Пока"},
+        {"id": 1, "translation": "**Привет**"},
+    ], ensure_ascii=False) + "\n```"
+    provider = fake_provider(lambda prompt: answer)
+
+    assert provider.translate_batch(["Hallo", "Tschüss"], PROMPT) == [("Привет", ""), ("Пока", "")]
+    assert len(provider.prompts) == 1
+    assert "1. Hallo\n2. Tschüss" in provider.prompts[0]
+    assert "(см. список фраз ниже)" in provider.prompts[0]
+
+
+def test_numbered_list_fallback_without_context(fake_provider):
+    provider = fake_provider(lambda prompt: "Вот переводы:\n1. Привет\n2) Пока\n")
+
+    assert provider.translate_batch(["Hallo", "Tschüss"], PROMPT) == [("Привет", ""), ("Пока", "")]
+
+
+def test_context_requires_both_fields(fake_provider):
+    answer = json.dumps([
+        {"id": 1, "translation": "Привет", "context": "Приветствие"},
+        {"id": 2, "translation": "Пока"},  # Нет контекста — фразу переводят по одной
+        {"id": "x", "translation": "мусор"},
+    ], ensure_ascii=False)
+    provider = fake_provider(lambda prompt: answer)
+
+    results = provider.translate_batch(["Hallo", "Tschüss"], PROMPT, with_context=True)
+
+    assert results == [("Привет", "Приветствие"), None]
+
+
+def test_unparsable_answer_returns_none(fake_provider):
+    provider = fake_provider(lambda prompt: "[не JSON")
+
+    assert provider.translate_batch(["Hallo", "Tschüss"], PROMPT, with_context=True) == [None, None]
+
+
+def test_cached_phrases_are_not_packed_again(fake_provider):
+    provider = fake_provider(lambda prompt: json.dumps(
+        [{"id": 1, "translation": "Привет"}, {"id": 2, "translation": "Пока"}], ensure_ascii=False
+    ))
+    provider.translate_batch(["Hallo", "Tschüss"], PROMPT)
+
+    # Одна новая фраза из трех — обычный промпт вместо пакетного
+    provider.respond = lambda prompt: "Спасибо"
+    results = provider.translate_batch(["Hallo", "Danke", "Tschüss"], PROMPT)
+
+    assert results == [("Привет", ""), ("Спасибо", ""), ("Пока", "")]
+    assert provider.prompts[-1] == PROMPT.format(phrase="Danke")
+    assert len(provider.prompts) == 2
+    assert provider.translate_batch(["Hallo", "Danke"], PROMPT) == [("Привет", ""), ("Спасибо", "")]
+    assert len(provider.prompts) == 2
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Тесты локального индекса фраз: загрузка, инкрементальная синхронизация, подписчики"""
+from api.phrase_index import PhraseIndex
+
+
+class FakeCollection:
+    """Коллекция Anki в памяти: findNotes, edited:N и notesInfo без сети"""
+
+    model_name = "Lerne"
+
+    def __init__(self, notes):
+        self.notes = dict(notes)  # ID -> (фраза, mod)
+        self.edited = set()
+        self.info_requests = []
+
+    def _request(self, action, params=None, timeout=None):
+        if action == "findNotes":
+            return sorted(self.notes)
+        if action == "notesInfo":
+            self.info_requests.append(list(params["notes"]))
+            return [{"noteId": n, "mod": self.notes[n][1],
+                     "fields": {"Phrase": {"value": self.notes[n][0]}}}
+                    for n in params["notes"] if n in self.notes]
+        raise AssertionError(action)
+
+    def multi(self, actions):
+        return [sorted(self.notes), sorted(self.edited & set(self.notes))]
+
+
+def make_index(notes):
+    api = FakeCollection(notes)
+    index = PhraseIndex(api)
+    events = []
+    index.add_listener(lambda changed, removed: events.append((changed, removed)))
+    return api, index, events
+
+
+def test_load_normalizes_phrases_and_notifies_full_reload():
+    api, index, events = make_index({1: ("Guten <b>Morgen</b>", 10), 2: ("Danke&nbsp;schön", 10)})
+
+    assert index.load()
+
+    assert index.find("guten   morgen") == [1]
+    assert index.find("DANKE\xa0SCHÖN") == [2]
+    assert events == [(None, [])]
+
+
+def test_sync_reports_only_changed_notes():
+    api, index, events = make_index({1: ("Hallo", 10), 2: ("Tschüss", 10), 3: ("Bitte", 10)})
+    index.load()
+    events.clear()
+    api.info_requests.clear()
+
+    del api.notes[2]
+    api.notes[3] = ("Bitte schön", 20)
+    api.notes[4] = ("Neu", 20)
+    api.edited = {3, 4}
+    assert index.sync()
+
+    # notesInfo только для новых и измененных, не для всей коллекции
+    assert sorted(api.info_requests[0]) == [3, 4]
+    assert events == [({3: "bitte schön", 4: "neu"}, [2])]
+    assert index.snapshot() == {1: "hallo", 3: "bitte schön", 4: "neu"}
+
+
+def test_sync_without_changes_is_silent():
+    api, index, events = make_index({1: ("Hallo", 10)})
+    index.load()
+    events.clear()
+
+    assert index.sync()
+    assert events == []
+
+
+def test_sync_treats_emptied_phrase_as_removal():
+    api, index, events = make_index({1: ("Hallo", 10)})
+    index.load()
+    events.clear()
+
+    api.notes[1] = ("", 20)
+    api.edited = {1}
+    index.sync()
+
+    assert events == [({}, [1])]
+    assert index.find("hallo") == []
+
+
+def test_add_remove_notify_every_listener():
+    api, index, events = make_index({})
+    index.load()
+    other = []
+    index.add_listener(lambda changed, removed: other.append((changed, removed)))
+    events.clear()
+
+    index.add(7, "Servus")
+    index.remove([7])
+
+    assert events == other == [({7: "servus"}, []), ({}, [7])]
+
+
+def test_failing_listener_does_not_break_others():
+    api, index, events = make_index({})
+
+    def broken(changed, removed):
+        raise RuntimeError("boom")
+
+    index.add_listener(broken)
+    index.add(1, "Ja")
+    index.remove_listener(broken)
+    index.add(2, "Nein")
+
+    assert events == [({1: "ja"}, []), ({2: "nein"}, [])]
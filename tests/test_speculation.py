@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Тесты спекулятивной генерации: кто может забрать идущий перевод"""
+import threading
+
+import pytest
+
+from core.speculation import SpeculativeGenerator
+
+PROMPT = "Переведи: {phrase}"
+
+
+@pytest.fixture
+def blocked_provider(fake_provider):
+    """Провайдер, который отвечает только после release.set()"""
+    release = threading.Event()
+
+    def respond(prompt):
+        release.wait(5)
+        return "Доброе утро"
+
+    provider = fake_provider(respond)
+    provider.release = release
+    yield provider
+    release.set()
+    # Фоновая генерация дописывает кэш переводов — дожидаемся ее до удаления папки теста
+    for thread in threading.enumerate():
+        if thread.name == "speculative-generation":
+            thread.join(5)
+
+
+def test_adopt_same_phrase_and_prompt(blocked_provider):
+    generator = SpeculativeGenerator()
+    started = generator.start(blocked_provider, "m", "Guten Morgen", False, PROMPT, "КОНТЕКСТ")
+
+    adopted = generator.adopt(blocked_provider, "m", "Guten Morgen", False, PROMPT, "КОНТЕКСТ")
+    blocked_provider.release.set()
+
+    assert adopted is started
+    assert adopted.done.wait(5)
+    assert adopted.result == ("Доброе утро", "")
+
+
+@pytest.mark.parametrize("prompt, delimiter", [
+    ("Translate: {phrase}", "КОНТЕКСТ"),
+    (PROMPT, "CONTEXT"),
+])
+def test_changed_prompt_or_delimiter_is_not_adopted(blocked_provider, prompt, delimiter):
+    generator = SpeculativeGenerator()
+    started = generator.start(blocked_provider, "m", "Guten Morgen", False, PROMPT, "КОНТЕКСТ")
+
+    assert generator.adopt(blocked_provider, "m", "Guten Morgen", False, prompt, delimiter) is None
+    # Устаревшая спекуляция уступает место настоящему запросу
+    assert started.cancel.cancelled
+
+
+def test_cancel_keeps_speculation_for_same_text(blocked_provider):
+    generator = SpeculativeGenerator()
+    started = generator.start(blocked_provider, "m", "Guten Morgen", False, PROMPT, "КОНТЕКСТ")
+
+    generator.cancel(" Guten Morgen ")
+    assert not started.cancel.cancelled
+
+    generator.cancel("Gute Nacht")
+    assert started.cancel.cancelled
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Тесты общей основы SQLite-хранилищ"""
+import os
+
+from core.sqlite_store import SQLiteStore
+
+
+class NotesStore(SQLiteStore):
+    DB_NAME = "notes.sqlite3"
+    SCHEMA = "CREATE TABLE IF NOT EXISTS notes (text TEXT NOT NULL);"
+
+
+def test_db_lives_in_user_files(user_dir):
+    store = NotesStore()
+    with store._db() as conn:
+        conn.execute("INSERT INTO notes VALUES ('Guten Tag')")
+    assert store.db_path == os.path.join(str(user_dir), "user_files", "notes.sqlite3")
+    with store._db() as conn:
+        assert conn.execute("SELECT text FROM notes").fetchall() == [("Guten Tag",)]
+
+
+def test_reading_missing_store_does_not_create_it(tmp_path):
+    store = NotesStore(str(tmp_path / "notes.sqlite3"))
+    assert not store._exists()
+    assert not os.path.exists(store.db_path)
+
+
+def test_failed_transaction_is_rolled_back(tmp_path):
+    store = NotesStore(str(tmp_path / "notes.sqlite3"))
+    try:
+        with store._db() as conn:
+            conn.execute("INSERT INTO notes VALUES ('Danke')")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    with store._db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
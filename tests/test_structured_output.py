@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Тесты структурированного ответа AI (JSON по схеме) и его разбора"""
+import json
+
+import pytest
+
+from api.ai.base_provider import BaseAIProvider, CONTEXT_SCHEMA, TRANSLATION_SCHEMA
+
+PROMPT = "Переведи: {phrase}"
+
+
+@pytest.fixture
+def structured(fake_provider):
+    """FakeProvider со включенным структурированным режимом; generate запоминает схему"""
+    class StructuredProvider(fake_provider):
+        supports_structured_output = True
+        structured_output = True
+
+        def generate(self, prompt, model=None, timeout=45, cancel=None, json_schema=None):
+            self.schemas.append(json_schema)
+            return super().generate(prompt, model, timeout, cancel, json_schema)
+
+    def make(respond):
+        provider = StructuredProvider(respond)
+        provider.schemas = []
+        return provider
+    return make
+
+
+def test_json_answer_with_context(structured):
+    provider = structured(lambda prompt: json.dumps(
+        {"translation": " Доброе утро ", "context": "Утреннее приветствие"}, ensure_ascii=False
+    ))
+
+    result = provider.translate_with_context("Guten Morgen", PROMPT, delimiter="КОНТЕКСТ")
+
+    assert result == ("Доброе утро", "Утреннее приветствие")
+    assert provider.schemas == [CONTEXT_SCHEMA]
+    assert provider.prompts[0].endswith('{"translation": "...", "context": "..."}')
+
+
+def test_broken_json_falls_back_to_text(structured):
+    provider = structured(lambda prompt: "Доброе утро\nКОНТЕКСТ\nПриветствие")
+
+    assert provider.translate_with_context("Guten Morgen", PROMPT, delimiter="КОНТЕКСТ") == (
+        "Доброе утро", "Приветствие"
+    )
+
+
+def test_translation_only_schema(structured):
+    provider = structured(lambda prompt: '{"translation": "Спасибо"}')
+
+    assert provider.translate("Danke", PROMPT) == ("Спасибо", "")
+    assert provider.schemas == [TRANSLATION_SCHEMA]
+
+
+def test_disabled_mode_sends_no_schema(fake_provider):
+    provider = fake_provider(lambda prompt: "Спасибо")
+
+    assert provider._build_prompt(PROMPT, "Danke", False) == ("Переведи: Danke", None)
+
+
+def test_parse_response_rejects_empty_translation(fake_provider):
+    provider = fake_provider(lambda prompt: "")
+
+    assert provider._parse_response('{"translation": ""}', False, "", TRANSLATION_SCHEMA) == (
+        '{"translation": ""}', ""
+    )
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"transl', ("", "")),
+    ('{"translation": "Guten T', ("Guten T", "")),
+    ('{"translation": "Sag \\"Hallo\\', ('Sag "Hallo', "")),
+    ('{"translation": "Gr\\u00f', ("Gr", "")),
+    ('{"translation": "Gr\\u00fcß", "context": "Bayr', ("Grüß", "Bayr")),
+])
+def test_partial_structured(text, expected):
+    assert BaseAIProvider._parse_partial_structured(text, True) == expected
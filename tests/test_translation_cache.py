@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Тесты постоянного кэша переводов"""
+import time
+
+from api.ai.translation_cache import TranslationCache, make_key, translation_cache
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    key = make_key("Ollama", "qwen", "Переведи: {phrase}", "", "Guten Morgen")
+
+    assert cache.get(key) is None
+    cache.put(key, "Доброе утро", "Приветствие")
+
+    assert cache.get(key) == ("Доброе утро", "Приветствие")
+    # Запись переживает перезапуск (новый экземпляр с тем же файлом)
+    assert TranslationCache(cache.db_path).get(key) == ("Доброе утро", "Приветствие")
+
+
+def test_key_depends_on_prompt_model_and_delimiter():
+    base = make_key("Ollama", "qwen", "prompt", "КОНТЕКСТ", "Hallo")
+
+    assert make_key("Ollama", "qwen", "prompt", "КОНТЕКСТ", "  Hallo ") == base
+    assert make_key("Ollama", "qwen", "prompt 2", "КОНТЕКСТ", "Hallo") != base
+    assert make_key("Ollama", "llama", "prompt", "КОНТЕКСТ", "Hallo") != base
+    assert make_key("Ollama", "qwen", "prompt", "", "Hallo") != base
+    assert make_key("OpenRouter", "qwen", "prompt", "КОНТЕКСТ", "Hallo") != base
+
+
+def test_lru_eviction_by_entries(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", "A")
+    time.sleep(0.01)
+    cache.put("b", "B")
+    time.sleep(0.01)
+    cache.get("a")  # "a" использована позже "b"
+    time.sleep(0.01)
+    cache.put("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", "")
+    assert cache.get("c") == ("C", "")
+
+
+def test_eviction_by_size(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"), max_bytes=10)
+    cache.put("old", "123456")
+    time.sleep(0.01)
+    cache.put("new", "abcdef")
+
+    assert cache.get("old") is None
+    assert cache.get("new") == ("abcdef", "")
+
+
+def test_disabled_and_empty_values_are_not_stored(tmp_path):
+    cache = TranslationCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("empty", "")
+    cache.enabled = False
+    cache.put("off", "value")
+    cache.enabled = True
+
+    assert cache.get("empty") is None
+    assert cache.get("off") is None
+
+
+def test_global_cache_lives_in_user_files(user_dir):
+    translation_cache.put("k", "v")
+
+    assert translation_cache.db_path.startswith(str(user_dir))
+    assert translation_cache.get("k") == ("v", "")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Тесты фоновых воркеров: прогрев модели Ollama, отмена генерации и отправка очереди outbox"""
+import queue
+
+import pytest
+
+from core import processing, workers
+from core.app_state import app_state
+from core import anki_outbox as outbox_module
+from core.anki_outbox import anki_outbox
+from api.ai.ollama_provider import ollama_provider
+
+
+class Var:
+    """Замена tk.Variable без Tk"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+@pytest.fixture
+def main_window(monkeypatch):
+    """Главное окно с моделью, выбранной в выпадающем списке, и включенным мониторингом"""
+    monkeypatch.setattr(app_state, "main_window_components", {
+        "vars": {"ollama_var": Var("qwen2.5:7b"), "pause_monitoring_var": Var(True)}
+    })
+    monkeypatch.setattr(app_state, "ollama_model", "llama3:8b")
+    monkeypatch.setattr(app_state, "ai_provider", "ollama")
+    monkeypatch.setattr(app_state, "ollama_keep_alive", 30)
+    monkeypatch.setattr(ollama_provider, "keep_alive", None)
+    warmed = []
+    monkeypatch.setattr(ollama_provider, "warm_up_async", warmed.append)
+    return warmed
+
+
+def test_keep_alive_warms_main_window_model(main_window, monkeypatch):
+    monkeypatch.setattr(ollama_provider, "last_used", 0.0)
+    monkeypatch.setattr(app_state, "clipboard_running", True)
+    # Один проход цикла: после прогрева воркер завершается
+    monkeypatch.setattr(ollama_provider, "warm_up_async",
+                        lambda model: (main_window.append(model), setattr(app_state, "clipboard_running", False)))
+
+    workers.ollama_keep_alive_worker(interval=0.5)
+
+    assert main_window == ["qwen2.5:7b"]
+    assert ollama_provider.keep_alive == "30m"
+
+
+def test_generation_and_warm_up_use_same_model(main_window):
+    assert workers.get_generation_model(ollama_provider) == "qwen2.5:7b"
+
+    app_state.main_window_components["vars"]["ollama_var"] = Var("")
+    assert workers.get_generation_model(ollama_provider) == "llama3:8b"
+
+
+def test_outbox_flush_runs_without_clipboard_monitoring(monkeypatch):
+    """Очередь отправляется и при выключенном мониторинге; отложенные заметки сообщаются в UI"""
+    monkeypatch.setattr(app_state, "clipboard_running", False)
+    monkeypatch.setattr(app_state, "outbox_running", True)
+    monkeypatch.setattr(outbox_module, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(workers.anki_api, "is_available", lambda: True)
+    anki_outbox.enqueue("Guten Tag", "Добрый день", "", "Deutsch")
+    flush = anki_outbox.flush
+
+    class RejectingAnki:
+        def add_notes(self, notes):
+            return [Exception("model was not found")] * len(notes)
+
+        def build_note(self, phrase, *args, **kwargs):
+            return {"fields": {"Phrase": phrase}}
+
+    def flush_once(api):
+        app_state.stop_outbox_flush()
+        return flush(RejectingAnki())
+
+    monkeypatch.setattr(anki_outbox, "flush", flush_once)
+    q = queue.Queue()
+
+    workers.outbox_flush_worker(q, interval=0.5)
+
+    assert q.get_nowait() == ("outbox_parked", ["Guten Tag"])
+    assert not app_state.outbox_running
+
+
+def test_new_generation_cancels_previous(monkeypatch):
+    monkeypatch.setattr(app_state, "generation_id", 0)
+    monkeypatch.setattr(app_state, "generation_cancel", None)
+    first_id, first = app_state.start_generation()
+    second_id, second = app_state.start_generation()
+
+    assert first.cancelled and not second.cancelled
+    assert second_id == first_id + 1
+    # Ответы отмененного запроса UI отбрасывает
+    assert processing._is_stale_generation(("перевод", "", first_id))
+    assert not processing._is_stale_generation(("перевод", "", second_id))
+
+    app_state.stop_generation()
+    assert second.cancelled and not app_state.generation_running
+
+
+def test_cancelled_generation_sends_no_result(monkeypatch, fake_provider):
+    monkeypatch.setattr(app_state, "generation_cancel", None)
+    request_id, cancel = app_state.start_generation()
+
+    def respond(prompt):
+        app_state.stop_generation()
+        cancel.raise_if_cancelled()
+
+    provider = fake_provider(respond)
+    monkeypatch.setattr(workers, "get_current_ai_provider", lambda: provider)
+    q = queue.Queue()
+
+    workers.ask_ai_worker(q, "Guten Tag", False, request_id=request_id, cancel=cancel, use_cache=False)
+
+    assert q.empty()
@@ -186,7 +186,8 @@ def populate_main_window(dependencies, root, settings, main_frame, widgets, tvar
                 right_panel[0] = create_batch_panel(
                     master_container,
                     dependencies.start_batch_processing,
-                    dependencies.stop_batch_processing
+                    dependencies.stop_batch_processing,
+                    dependencies.resume_batch_processing
                 )
             right_panel[0].grid(row=0, column=1, sticky="nsew", padx=(5, 10), pady=10)
             root.geometry("1000x750")
@@ -87,6 +87,7 @@ def build_bottom_actions(root, main_frame, widgets, tvars, settings, dependencie
     def on_close():
         from core.settings_manager import load_settings, save_settings
         dependencies.stop_clipboard_monitoring()
+        dependencies.stop_outbox_flush()
         current_settings = load_settings(update_app_state=False)
 
         raw_deck = tvars["deck_var"].get()
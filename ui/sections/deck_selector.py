@@ -27,12 +27,11 @@ def build_deck_selector(root, main_frame, widgets, tvars, settings, dependencies
     widgets["deck_combo"].pack(side="left", fill="x", expand=True, padx=5, pady=5)
     ToolTip(widgets["deck_combo"], localization_manager.get_text("deck_selection_tooltip"))
 
-    def refresh_decks_button():
+    def apply_decks(decks):
         try:
             current_full = tvars["deck_var"].get()
             current_clean = dependencies.clean_deck_name(current_full) if hasattr(dependencies, 'clean_deck_name') else current_full
 
-            decks = dependencies.get_deck_names()
             if isinstance(decks, list) and decks:
                 cached_decks[:] = decks
                 widgets["deck_combo"].configure(values=decks, state="normal")
@@ -74,6 +73,30 @@ def build_deck_selector(root, main_frame, widgets, tvars, settings, dependencies
         except Exception as e:
             print(f"Ошибка обновления колод: {e}")
 
+    def refresh_decks_button():
+        if not hasattr(dependencies, 'get_deck_names_async'):
+            apply_decks(dependencies.get_deck_names())
+            return
+        # Запрос идет в фоне, UI не блокируется на время ответа AnkiConnect
+        widgets["refresh_decks_btn"].configure(state="disabled")
+
+        def on_done(future):
+            try:
+                decks = future.result()
+            except Exception as e:
+                print(f"Ошибка обновления колод: {e}")
+                decks = []
+
+            def finish():
+                widgets["refresh_decks_btn"].configure(state="normal")
+                apply_decks(decks)
+            root.after(0, finish)
+
+        def on_counts(decks):
+            root.after(0, lambda: apply_decks(decks))
+
+        dependencies.get_deck_names_async(on_done, on_update=on_counts)
+
     widgets["refresh_decks_btn"] = ctk.CTkButton(deck_frame, text="🔄", width=30, command=refresh_decks_button)
     widgets["refresh_decks_btn"].pack(side="left", padx=5)
     ToolTip(widgets["refresh_decks_btn"], localization_manager.get_text("refresh_decks"))
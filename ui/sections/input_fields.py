@@ -6,6 +6,7 @@ import customtkinter as ctk
 
 from core.localization import localization_manager
 from core.clipboard_manager import setup_text_widget_context_menu
+from core.speculation import speculative_generator
 
 
 def build_input_fields(main_frame, widgets, tvars):
@@ -53,6 +54,14 @@ def build_input_fields(main_frame, widgets, tvars):
     setup_placeholder(widgets["translation_text"], placeholders["translation"])
     setup_placeholder(widgets["context_widget"], placeholders["context"])
 
+    # Правка фразы отменяет ее спекулятивный перевод
+    def _cancel_speculation(event=None):
+        german_text = widgets["german_text"]
+        german_text.after_idle(lambda: speculative_generator.cancel(german_text.get("1.0", "end-1c")))
+
+    for sequence in ("<KeyRelease>", "<<Paste>>", "<<Cut>>"):
+        widgets["german_text"].bind(sequence, _cancel_speculation, add="+")
+
     # === PLACEHOLDER LANGUAGE UPDATE ===
     def _update_placeholders(new_lang):
         """Обновляет placeholder-тексты при смене языка."""
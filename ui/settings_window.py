@@ -110,9 +110,16 @@ def open_settings_window(parent, dependencies=None, settings=None, initial_tab=N
         settings["AI_PROVIDER"] = ai_vars["provider_var"].get()
         settings["OLLAMA_URL"] = ai_vars["ollama_url_var"].get()
         settings["OLLAMA_MODEL"] = ai_vars["ollama_model_var"].get()
+        keep_alive = ai_vars["ollama_keep_alive_var"].get().strip()
+        settings["OLLAMA_KEEP_ALIVE"] = int(keep_alive) if keep_alive.isdigit() else settings.get("OLLAMA_KEEP_ALIVE", 30)
         settings["OPENROUTER_API_KEY"] = ai_vars["openrouter_key_var"].get()
         settings["OPENROUTER_MODEL"] = ai_vars["openrouter_model_var"].get()
+        settings["OPENROUTER_API_URL"] = ai_vars["openrouter_url_var"].get().strip()
         settings["GOOGLE_API_KEY"] = ai_vars["google_key_var"].get()
+        settings["STRUCTURED_OUTPUT"] = ai_vars["structured_var"].get()
+        settings["NEAR_DUPLICATE_CHECK"] = ai_vars["near_duplicate_var"].get()
+        settings["NEAR_DUPLICATE_SKIP"] = ai_vars["near_duplicate_skip_var"].get()
+        settings["SPECULATIVE_GENERATION"] = ai_vars["speculative_var"].get()
         
         # Промпты
         settings["TRANSLATE_PROMPT"] = prompts_vars["translate_editor"].get("1.0", "end-1c")
@@ -137,9 +144,20 @@ def open_settings_window(parent, dependencies=None, settings=None, initial_tab=N
         app_state.tts.lang = settings["TTS_LANG"]
         
         # Обновляем AI настройки в app_state
+        previous_ollama_model = app_state.ollama_model
+        app_state.ollama_model = settings["OLLAMA_MODEL"]
         app_state.ai_provider = settings.get("AI_PROVIDER", "ollama")
+        app_state.ollama_keep_alive = settings["OLLAMA_KEEP_ALIVE"]
+        app_state.structured_output = settings["STRUCTURED_OUTPUT"]
+        app_state.speculative_generation = settings["SPECULATIVE_GENERATION"]
+        app_state.near_duplicate_skip = settings["NEAR_DUPLICATE_SKIP"]
+        if settings["NEAR_DUPLICATE_CHECK"] != app_state.near_duplicate_check:
+            from api.embedding_index import embedding_index
+            app_state.near_duplicate_check = settings["NEAR_DUPLICATE_CHECK"]
+            embedding_index.configure(app_state.near_duplicate_check, app_state.embedding_model)
         app_state.openrouter_api_key = settings.get("OPENROUTER_API_KEY", "")
         app_state.openrouter_model = settings.get("OPENROUTER_MODEL", "")
+        app_state.openrouter_api_url = settings.get("OPENROUTER_API_URL", "")
         app_state.google_api_key = settings.get("GOOGLE_API_KEY", "")
         
         
@@ -151,6 +169,11 @@ def open_settings_window(parent, dependencies=None, settings=None, initial_tab=N
         # Обновляем индикатор модели в главном окне
         _update_main_window_model_indicator(settings)
         
+        # Новую модель Ollama загружаем в память заранее, чтобы первая генерация не ждала
+        if settings["AI_PROVIDER"] == "ollama" and settings["OLLAMA_MODEL"] != previous_ollama_model:
+            from api.ai.ollama_provider import ollama_provider
+            ollama_provider.warm_up_async(settings["OLLAMA_MODEL"])
+        
         # Сохраняем в файл
         save_settings(settings)
         
@@ -218,6 +241,11 @@ def _create_ai_tab(tab_ai, settings, win):
     ollama_refresh_btn = ctk.CTkButton(model_row, text=localization_manager.get_text("refresh_decks"), command=refresh_ollama_models, width=100)
     ollama_refresh_btn.pack(side="left", padx=10)
     
+    ctk.CTkLabel(ollama_frame, text=localization_manager.get_text("ollama_keep_alive")).pack(anchor="w", padx=10, pady=(15, 0))
+    ollama_keep_alive_var = tk.StringVar(value=str(settings.get("OLLAMA_KEEP_ALIVE", 30)))
+    ollama_keep_alive_entry = ctk.CTkEntry(ollama_frame, textvariable=ollama_keep_alive_var, width=80)
+    ollama_keep_alive_entry.pack(anchor="w", padx=10, pady=(0, 15))
+    
     # === OpenRouter настройки ===
     openrouter_frame = ctk.CTkFrame(provider_settings_container)
     
@@ -237,6 +265,13 @@ def _create_ai_tab(tab_ai, settings, win):
     
     ctk.CTkLabel(openrouter_frame, text=localization_manager.get_text("select_or_enter_manually"), text_color="#888888", font=("Roboto", 11)).pack(anchor="w", padx=10, pady=(0, 10))
     
+    ctk.CTkLabel(openrouter_frame, text=localization_manager.get_text("server_url")).pack(anchor="w", padx=10)
+    openrouter_url_var = tk.StringVar(value=settings.get("OPENROUTER_API_URL", ""))
+    openrouter_url_entry = ctk.CTkEntry(openrouter_frame, textvariable=openrouter_url_var, width=400)
+    openrouter_url_entry.pack(anchor="w", padx=10)
+    setup_text_widget_context_menu(openrouter_url_entry)
+    ctk.CTkLabel(openrouter_frame, text=localization_manager.get_text("openrouter_url_hint"), text_color="#888888", font=("Roboto", 11)).pack(anchor="w", padx=10, pady=(0, 10))
+    
     # === Google AI настройки ===
     google_frame = ctk.CTkFrame(provider_settings_container)
     
@@ -292,14 +327,29 @@ def _create_ai_tab(tab_ai, settings, win):
             else:
                 messagebox.showwarning(localization_manager.get_text("warning"), localization_manager.get_text("enter_api_key_warning"), parent=win)
     
+    structured_var = tk.BooleanVar(value=settings.get("STRUCTURED_OUTPUT", False))
+    ctk.CTkCheckBox(tab_ai, text=localization_manager.get_text("structured_output"), variable=structured_var).pack(anchor="w", padx=10, pady=(10, 0))
+    speculative_var = tk.BooleanVar(value=settings.get("SPECULATIVE_GENERATION", False))
+    ctk.CTkCheckBox(tab_ai, text=localization_manager.get_text("speculative_generation"), variable=speculative_var).pack(anchor="w", padx=10, pady=(10, 0))
+    near_duplicate_var = tk.BooleanVar(value=settings.get("NEAR_DUPLICATE_CHECK", False))
+    ctk.CTkCheckBox(tab_ai, text=localization_manager.get_text("near_duplicate_check"), variable=near_duplicate_var).pack(anchor="w", padx=10, pady=(10, 0))
+    near_duplicate_skip_var = tk.BooleanVar(value=settings.get("NEAR_DUPLICATE_SKIP", False))
+    ctk.CTkCheckBox(tab_ai, text=localization_manager.get_text("near_duplicate_skip"), variable=near_duplicate_skip_var).pack(anchor="w", padx=30, pady=(5, 0))
+    
     ctk.CTkButton(tab_ai, text="🔗 " + localization_manager.get_text("check_connection"), command=test_connection, width=200, height=35, fg_color="#1f538d").pack(pady=15)
     
     return {
         "provider_var": provider_var,
         "ollama_url_var": ollama_url_var,
         "ollama_model_var": ollama_model_var,
+        "ollama_keep_alive_var": ollama_keep_alive_var,
+        "structured_var": structured_var,
+        "near_duplicate_var": near_duplicate_var,
+        "near_duplicate_skip_var": near_duplicate_skip_var,
+        "speculative_var": speculative_var,
         "openrouter_key_var": openrouter_key_var,
         "openrouter_model_var": openrouter_model_var,
+        "openrouter_url_var": openrouter_url_var,
         "google_key_var": google_key_var
     }
 